@@ -0,0 +1,213 @@
+"""
+Materialized per-user adaptation documents.
+
+A UserAdaptation keeps the latest value of every signal seen for a user and
+the rules that fire on that snapshot, with their modifiers merged into one
+document such as ``{"animations": "off", "font_type": "OpenDyslexic"}``.
+The document is recomputed when new signals arrive, when the user's
+NeuroProfile preferences change, or lazily on read when the rule set version
+has moved on, and is never recomputed just because it was requested.
+
+Many rules fire purely because of a profile tag (``learner_profile.contains(
+'autistic_profile') || ...``), so every learner with the same tags shares the
+same base set of rules and modifiers. ``profile_plan`` partially evaluates the
+rule set for a tag set once, caches the result per tag set and rule set
+version, and leaves only the signal-dependent rules to evaluate per user.
+"""
+import functools
+import hashlib
+import json
+from collections import namedtuple
+
+from django.db import transaction
+
+from core.models import NeuroProfile
+from .firings import jsonable_signals
+from .conditions import Literal, SignalFrame
+from .models import UserAdaptation
+from .registry import CompiledRule, rule_registry
+from .streams import adaptation_broker
+
+# Signal holding the learner's profile tags
+PROFILE_SIGNAL = 'learner_profile'
+
+# NeuroProfile.sensory_preferences flags and the signals they stand for
+PREFERENCE_SIGNALS = {
+    'reduce_animations': 'animation_sensitivity_flag',
+    'dyslexic_font': 'dyslexia_support_needed',
+    'low_audio': 'noise_sensitivity_detected',
+}
+
+
+def preference_signals(neuro_profile):
+    """
+    Translate a NeuroProfile's saved preferences into signals, plus its
+    profile tags as the ``learner_profile`` bitmask.
+    """
+    preferences = neuro_profile.sensory_preferences or {}
+    signals = {
+        signal: bool(preferences.get(preference, False))
+        for preference, signal in PREFERENCE_SIGNALS.items()
+    }
+    signals[PROFILE_SIGNAL] = neuro_profile.profile_tags
+    return signals
+
+
+def merge_modifiers(rules, base=None):
+    """
+    Merge the modifiers of several rules into one dict, on top of ``base``.
+    Rules are applied in name order, so when two rules set the same key the
+    rule whose name sorts last wins, independent of evaluation order.
+    """
+    modifiers = dict(base or {})
+    for rule in sorted(rules, key=lambda rule: rule.name):
+        modifiers.update(rule.action_payload.get('modifiers') or {})
+    return modifiers
+
+
+ProfilePlan = namedtuple('ProfilePlan', ['base_rules', 'base_modifiers', 'residual_rules'])
+
+
+@functools.lru_cache(maxsize=256)
+def profile_plan(profile_key, version):
+    """
+    Specialize the active rule set for one combination of profile tags.
+
+    Rules that are true for these tags whatever the signals form the base,
+    whose merged modifiers are computed once. Rules that are false for these
+    tags are dropped. The rest are kept as residual rules, with the profile
+    part of their condition already folded away.
+    ``version`` is only part of the cache key; the caller reads it from the
+    registry right after refreshing it.
+    """
+    known = {PROFILE_SIGNAL: profile_key}
+    base_rules, residual_rules = [], []
+    for compiled in rule_registry.rules():
+        tree = compiled.tree.partial(known)
+        if isinstance(tree, Literal):
+            if tree.value:
+                base_rules.append(compiled.rule)
+            continue
+        evaluate = tree.compile()
+        residual_rules.append(CompiledRule(
+            compiled.rule,
+            lambda signals, evaluate=evaluate: bool(evaluate(signals)),
+            frozenset(tree.references()),
+            tree
+        ))
+    return ProfilePlan(tuple(base_rules), merge_modifiers(base_rules), tuple(residual_rules))
+
+
+def profile_key(value):
+    """Return a hashable cache key for a learner_profile signal value."""
+    if isinstance(value, (list, set, tuple)):
+        return frozenset(value)
+    return value
+
+
+def compute_etag(document):
+    """Return a strong ETag for an adaptation document."""
+    canonical = json.dumps(document, sort_keys=True, separators=(',', ':'))
+    return '"' + hashlib.sha256(canonical.encode()).hexdigest()[:32] + '"'
+
+
+def refresh_adaptation(user, signals=None):
+    """
+    Recompute a user's adaptation document, first folding ``signals`` (the
+    latest values of some signals) into the stored snapshot.
+    The row is locked while it is recomputed so concurrent updates for the
+    same user do not overwrite each other's signals. It is only written when
+    the snapshot or the document changed, and a changed document is
+    published to the user's open streams on commit.
+    """
+    with transaction.atomic():
+        adaptation, created = UserAdaptation.objects.select_for_update().get_or_create(user=user)
+
+        snapshot = dict(adaptation.signals)
+        if adaptation.rule_set_version == 0 and not snapshot:
+            # First computation: seed the snapshot with the saved preferences
+            neuro_profile = NeuroProfile.objects.filter(user=user).first()
+            if neuro_profile is not None:
+                snapshot.update(preference_signals(neuro_profile))
+        if signals:
+            snapshot.update(jsonable_signals(signals))
+
+        rule_registry.index()
+        version = rule_registry.version or 0
+        plan = profile_plan(profile_key(snapshot.get(PROFILE_SIGNAL)), version)
+
+        # Signal-driven rules are layered over the cached profile base and win conflicts
+        signal_rules = [compiled.rule for compiled in plan.residual_rules if compiled.predicate(snapshot)]
+        fired_rules = sorted(rule.name for rule in plan.base_rules + tuple(signal_rules))
+        modifiers = merge_modifiers(signal_rules, base=plan.base_modifiers)
+        etag = compute_etag({'rules': fired_rules, 'modifiers': modifiers})
+
+        if (
+            snapshot != adaptation.signals
+            or etag != adaptation.etag
+            or version != adaptation.rule_set_version
+        ):
+            adaptation.signals = snapshot
+            adaptation.fired_rules = fired_rules
+            adaptation.modifiers = modifiers
+            changed = etag != adaptation.etag
+            adaptation.etag = etag
+            adaptation.rule_set_version = version
+            adaptation.save()
+            if changed:
+                transaction.on_commit(functools.partial(
+                    adaptation_broker.publish, user.pk, etag, adaptation.document()
+                ))
+    return adaptation
+
+
+def adaptation_documents(snapshots):
+    """
+    Compute the adaptation document ``{"rules": [...], "modifiers": {...}}``
+    that refresh_adaptation would produce for each of many signal snapshots,
+    without touching the database.
+
+    Snapshots are grouped by profile tags. Each group's residual rules are
+    evaluated column-wise over the whole group with a SignalFrame, and rows
+    that fire the same rules share one merged document.
+    """
+    rule_registry.index()
+    version = rule_registry.version or 0
+
+    groups = {}
+    for position, snapshot in enumerate(snapshots):
+        groups.setdefault(profile_key(snapshot.get(PROFILE_SIGNAL)), []).append(position)
+
+    documents = [None] * len(snapshots)
+    for key, positions in groups.items():
+        plan = profile_plan(key, version)
+        base_names = [rule.name for rule in plan.base_rules]
+        frame = SignalFrame([snapshots[position] for position in positions])
+        signal_rules = [[] for _ in positions]
+        for compiled in plan.residual_rules:
+            for row in frame.indices(compiled.tree.mask(frame)):
+                signal_rules[row].append(compiled.rule)
+
+        shared = {}
+        for position, rules in zip(positions, signal_rules):
+            names = tuple(rule.name for rule in rules)
+            document = shared.get(names)
+            if document is None:
+                document = shared[names] = {
+                    'rules': sorted(base_names + list(names)),
+                    'modifiers': merge_modifiers(rules, base=plan.base_modifiers),
+                }
+            documents[position] = document
+    return documents
+
+
+def get_adaptation(user):
+    """
+    Return the user's adaptation document, recomputing it only if it was never
+    computed or the rule set changed since it was.
+    """
+    adaptation = UserAdaptation.objects.filter(user=user).first()
+    rule_registry.index()
+    if adaptation is None or adaptation.rule_set_version != rule_registry.version:
+        adaptation = refresh_adaptation(user)
+    return adaptation
@@ -1,5 +1,20 @@
-from django.contrib import admin
-from .models import EngagementMetric, SensoryLog, AdaptiveRule
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.db.models import Exists, OuterRef
+from .models import (
+    EngagementMetric,
+    SensoryLog,
+    AdaptiveRule,
+    RuleSet,
+    RuleSetVersion,
+    UserSignalState,
+    EngagementRollup,
+    SensoryRollup,
+    TriggerEvent,
+    RuleEvaluationJob,
+    UserAdaptation,
+    RuleStats,
+)
 
 
 @admin.register(EngagementMetric)
@@ -57,14 +72,19 @@ class AdaptiveRuleAdmin(admin.ModelAdmin):
     """
     Admin interface for AdaptiveRule model.
     """
-    list_display = ['name', 'is_active', 'created_at', 'updated_at']
+    list_display = [
+        'name', 'is_active', 'cooldown_seconds', 'evaluation_count', 'fire_count',
+        'mean_evaluation_us', 'last_fired_at', 'updated_at'
+    ]
     list_filter = ['is_active', 'created_at', 'updated_at']
     search_fields = ['name', 'condition']
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['stats']
+    actions = ['publish_rule_set']
     
     fieldsets = (
         ('Rule Information', {
-            'fields': ('name', 'is_active')
+            'fields': ('name', 'is_active', 'cooldown_seconds')
         }),
         ('Rule Definition', {
             'fields': ('condition', 'action_payload')
@@ -74,3 +94,179 @@ class AdaptiveRuleAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    @admin.action(description='Publish all active rules as a new rule set')
+    def publish_rule_set(self, request, queryset):
+        try:
+            rule_set = RuleSet.publish(note=f'Published by {request.user.email}')
+        except ValidationError as e:
+            self.message_user(request, 'Cannot publish: ' + '; '.join(e.messages), messages.ERROR)
+            return
+        self.message_user(request, f'Published and now serving {rule_set}.', messages.SUCCESS)
+    
+    def get_deleted_objects(self, objs, request):
+        # Rules in the served rule set are listed as protected, so the delete
+        # page and the bulk delete action refuse them with Django's usual page
+        to_delete, model_count, perms_needed, protected = super().get_deleted_objects(objs, request)
+        served = RuleSetVersion.served_rule_ids()
+        protected = list(protected) + [
+            f'{rule.name} (part of the served rule set; deactivate and publish first)'
+            for rule in objs
+            if rule.pk in served
+        ]
+        return to_delete, model_count, perms_needed, protected
+    
+    @staticmethod
+    def _stats(rule):
+        try:
+            return rule.stats
+        except RuleStats.DoesNotExist:
+            return None
+    
+    @admin.display(description='Evaluations', ordering='stats__evaluation_count')
+    def evaluation_count(self, obj):
+        stats = self._stats(obj)
+        return stats.evaluation_count if stats else 0
+    
+    @admin.display(description='Fires', ordering='stats__fire_count')
+    def fire_count(self, obj):
+        stats = self._stats(obj)
+        return stats.fire_count if stats else 0
+    
+    @admin.display(description='Mean eval (µs)')
+    def mean_evaluation_us(self, obj):
+        stats = self._stats(obj)
+        return round(stats.mean_evaluation_seconds * 1e6, 2) if stats else None
+    
+    @admin.display(description='Last fired', ordering='stats__last_fired_at')
+    def last_fired_at(self, obj):
+        stats = self._stats(obj)
+        return stats.last_fired_at if stats else None
+
+
+@admin.register(RuleSet)
+class RuleSetAdmin(admin.ModelAdmin):
+    """
+    Admin interface for RuleSet model.
+    Rule sets are immutable snapshots; they are created by publishing rules
+    and served by activating them.
+    """
+    list_display = ['number', 'rule_count', 'note', 'is_current', 'created_at']
+    search_fields = ['note']
+    readonly_fields = ['number', 'rules', 'note', 'created_at']
+    actions = ['activate_rule_set']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    @admin.display(description='Rules')
+    def rule_count(self, obj):
+        return len(obj.rules)
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            serving=Exists(RuleSetVersion.objects.filter(rule_set=OuterRef('pk')))
+        )
+    
+    @admin.display(description='Serving', boolean=True)
+    def is_current(self, obj):
+        return obj.serving
+    
+    @admin.action(description='Serve the selected rule set (publish or roll back)')
+    def activate_rule_set(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, 'Select exactly one rule set to serve.', messages.ERROR)
+            return
+        rule_set = queryset.get()
+        rule_set.activate()
+        self.message_user(request, f'Now serving {rule_set}.', messages.SUCCESS)
+
+
+@admin.register(UserSignalState)
+class UserSignalStateAdmin(admin.ModelAdmin):
+    """
+    Admin interface for UserSignalState model.
+    Rolling aggregates are maintained by the ingestion path, so they are read-only here.
+    """
+    list_display = ['user', 'idle_ratio_ewma', 'mood_score_mean', 'recent_overload_count', 'last_overload_at', 'updated_at']
+    search_fields = ['user__email']
+    readonly_fields = [
+        'user', 'engagement_samples', 'idle_ratio_ewma', 'last_engagement_at',
+        'sensory_samples', 'mood_score_mean', 'recent_overload_count',
+        'last_overload_at', 'last_sensory_at', 'baseline_samples',
+        'time_on_task_mean', 'time_on_task_m2', 'completion_rate_mean',
+        'completion_rate_m2', 'idle_ratio_mean', 'idle_ratio_m2', 'updated_at'
+    ]
+
+
+@admin.register(EngagementRollup)
+class EngagementRollupAdmin(admin.ModelAdmin):
+    """
+    Admin interface for EngagementRollup model.
+    """
+    list_display = ['user', 'period', 'bucket_start', 'sample_count', 'completion_rate_mean', 'idle_ratio_mean']
+    list_filter = ['period', 'bucket_start']
+    search_fields = ['user__email']
+    date_hierarchy = 'bucket_start'
+
+
+@admin.register(SensoryRollup)
+class SensoryRollupAdmin(admin.ModelAdmin):
+    """
+    Admin interface for SensoryRollup model.
+    """
+    list_display = ['user', 'period', 'bucket_start', 'sample_count', 'mood_score_mean', 'overload_count']
+    list_filter = ['period', 'bucket_start']
+    search_fields = ['user__email']
+    date_hierarchy = 'bucket_start'
+
+
+@admin.register(TriggerEvent)
+class TriggerEventAdmin(admin.ModelAdmin):
+    """
+    Admin interface for TriggerEvent model.
+    """
+    list_display = ['rule', 'user', 'timestamp']
+    list_filter = ['rule', 'timestamp']
+    search_fields = ['user__email', 'rule__name']
+    readonly_fields = ['user', 'rule', 'inputs', 'timestamp']
+    list_select_related = ['rule', 'user']
+    date_hierarchy = 'timestamp'
+
+
+@admin.register(RuleEvaluationJob)
+class RuleEvaluationJobAdmin(admin.ModelAdmin):
+    """
+    Admin interface for RuleEvaluationJob model.
+    Processed jobs are deleted, so this mostly shows the backlog and failed jobs.
+    """
+    list_display = ['user', 'status', 'attempts', 'run_after', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__email', 'last_error']
+    readonly_fields = ['user', 'signals', 'attempts', 'last_error', 'run_after', 'created_at']
+
+
+@admin.register(UserAdaptation)
+class UserAdaptationAdmin(admin.ModelAdmin):
+    """
+    Admin interface for UserAdaptation model.
+    Adaptations are recomputed by the engine, so they are read-only here.
+    """
+    list_display = ['user', 'rule_set_version', 'etag', 'updated_at']
+    search_fields = ['user__email']
+    readonly_fields = ['user', 'signals', 'fired_rules', 'modifiers', 'rule_set_version', 'etag', 'updated_at']
+
+
+@admin.register(RuleStats)
+class RuleStatsAdmin(admin.ModelAdmin):
+    """
+    Admin interface for RuleStats model.
+    Counters are flushed by the engine, so they are read-only here.
+    """
+    list_display = ['rule', 'evaluation_count', 'fire_count', 'total_evaluation_seconds', 'max_evaluation_seconds', 'last_fired_at']
+    search_fields = ['rule__name']
+    readonly_fields = [
+        'rule', 'evaluation_count', 'fire_count', 'total_evaluation_seconds',
+        'max_evaluation_seconds', 'last_fired_at', 'updated_at'
+    ]
+    list_select_related = ['rule']
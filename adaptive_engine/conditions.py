@@ -0,0 +1,507 @@
+"""
+Compiler for AdaptiveRule trigger expressions.
+
+Rules loaded by ``load_neuro_rules`` carry a small boolean expression in
+``AdaptiveRule.condition``, for example::
+
+    learner_profile.contains('adhd_profile') || long_content_detected == true
+
+This module parses those expressions once into a tree of nodes and compiles
+the tree into a plain Python closure that takes a signal dict and returns
+True/False. Compiled predicates are cached per rule, keyed by the rule id and
+its ``updated_at`` timestamp, so a rule is only re-parsed after it changes.
+
+Supported syntax:
+    - literals: true, false, null, numbers and single/double quoted strings
+    - signal names: ``attention_drop_detected``
+    - comparisons: ==, !=, <, <=, >, >=
+    - membership: ``learner_profile.contains('tag')``
+    - boolean operators: !, &&, || and parentheses
+
+A signal that is missing from the dict evaluates to None, so
+``missing_signal == true`` is simply False. ``.contains()`` on an integer
+signal tests a tag bit (see core.models.PROFILE_TAGS), so the
+``learner_profile`` bitmask is checked with a single bitwise AND.
+
+The same tree can also be evaluated column-wise over many learners at once
+with ``Node.mask(frame)``, where ``frame`` is a SignalFrame. Boolean masks
+are Python integers with one bit per row, so ``&&``/``||``/``!`` become
+single big-integer operations over the whole frame.
+"""
+import operator
+import re
+
+from core.models import PROFILE_TAG_BITS
+
+
+class ConditionSyntaxError(ValueError):
+    """Raised when a rule condition cannot be parsed."""
+
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<string>'[^']*'|"[^"]*")
+      | (?P<op>\|\||&&|==|!=|<=|>=|<|>|!|\(|\)|\.|,)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )
+""", re.VERBOSE)
+
+_KEYWORDS = {'true': True, 'false': False, 'null': None}
+
+_COMPARISONS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# Operator to use when swapping operands, e.g. ``3 < x`` becomes ``x > 3``
+_FLIPPED = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+
+def tokenize(text):
+    """Split a condition into (kind, value) tokens."""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match:
+            raise ConditionSyntaxError(
+                f"Unexpected character {text[position:].strip()[:1]!r} at position {position}"
+            )
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        elif kind == 'string':
+            value = value[1:-1]
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+def _contains(container, value):
+    """
+    Membership test; a missing or non-collection signal contains nothing.
+    An integer signal is a profile tag bitmask.
+    """
+    if type(container) is int:
+        return bool(container & PROFILE_TAG_BITS.get(value, 0))
+    try:
+        return value in (container or ())
+    except TypeError:
+        return False
+
+
+def _ordered(compare, a, b):
+    """Apply an ordering comparison; ordering against a missing signal is never true."""
+    if a is None or b is None:
+        return False
+    try:
+        return compare(a, b)
+    except TypeError:
+        return False
+
+
+# --- Syntax tree ---
+
+class Node:
+    """Base class for condition syntax tree nodes."""
+
+    def compile(self):
+        """Return a closure ``fn(signals) -> value`` for this node."""
+        raise NotImplementedError
+
+    def references(self):
+        """
+        Return the inputs this node reads: signal names as strings and
+        ``.contains()`` checks as ``(name, value)`` tuples.
+        """
+        return set()
+
+    def mask(self, frame):
+        """Return a bitmask of the rows in ``frame`` for which this node is truthy."""
+        return frame.rowwise(self.compile())
+
+    def partial(self, known):
+        """
+        Specialize this node for inputs whose values are already known.
+        Returns a Literal when the result no longer depends on other inputs.
+        """
+        return self
+
+
+class Literal(Node):
+    def __init__(self, value):
+        self.value = value
+
+    def compile(self):
+        value = self.value
+        return lambda signals: value
+
+    def mask(self, frame):
+        return frame.full if self.value else 0
+
+
+class Name(Node):
+    def __init__(self, name):
+        self.name = name
+
+    def compile(self):
+        name = self.name
+        return lambda signals: signals.get(name)
+
+    def references(self):
+        return {self.name}
+
+    def mask(self, frame):
+        return frame.truthy(self.name)
+
+    def partial(self, known):
+        if self.name in known:
+            return Literal(known[self.name])
+        return self
+
+
+class Contains(Node):
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def compile(self):
+        name, value = self.name, self.value
+        bit = PROFILE_TAG_BITS.get(value, 0)
+
+        def evaluate(signals):
+            container = signals.get(name)
+            if type(container) is int:
+                return container & bit != 0
+            return _contains(container, value)
+        return evaluate
+
+    def references(self):
+        return {(self.name, self.value)}
+
+    def mask(self, frame):
+        return frame.contains(self.name, self.value)
+
+    def partial(self, known):
+        if self.name in known:
+            return Literal(_contains(known[self.name], self.value))
+        return self
+
+
+class Not(Node):
+    def __init__(self, operand):
+        self.operand = operand
+
+    def compile(self):
+        operand = self.operand.compile()
+        return lambda signals: not operand(signals)
+
+    def references(self):
+        return self.operand.references()
+
+    def mask(self, frame):
+        return frame.full ^ self.operand.mask(frame)
+
+    def partial(self, known):
+        operand = self.operand.partial(known)
+        if isinstance(operand, Literal):
+            return Literal(not operand.value)
+        return Not(operand)
+
+
+class And(Node):
+    def __init__(self, operands):
+        self.operands = operands
+
+    def compile(self):
+        operands = tuple(operand.compile() for operand in self.operands)
+        return lambda signals: all(operand(signals) for operand in operands)
+
+    def references(self):
+        return set().union(*(operand.references() for operand in self.operands))
+
+    def mask(self, frame):
+        result = frame.full
+        for operand in self.operands:
+            result &= operand.mask(frame)
+            if not result:
+                break
+        return result
+
+    def partial(self, known):
+        operands = []
+        for operand in self.operands:
+            operand = operand.partial(known)
+            if isinstance(operand, Literal):
+                if not operand.value:
+                    return Literal(False)
+                continue
+            operands.append(operand)
+        if not operands:
+            return Literal(True)
+        return operands[0] if len(operands) == 1 else And(operands)
+
+
+class Or(Node):
+    def __init__(self, operands):
+        self.operands = operands
+
+    def compile(self):
+        operands = tuple(operand.compile() for operand in self.operands)
+        return lambda signals: any(operand(signals) for operand in operands)
+
+    def references(self):
+        return set().union(*(operand.references() for operand in self.operands))
+
+    def mask(self, frame):
+        result = 0
+        for operand in self.operands:
+            result |= operand.mask(frame)
+        return result
+
+    def partial(self, known):
+        operands = []
+        for operand in self.operands:
+            operand = operand.partial(known)
+            if isinstance(operand, Literal):
+                if operand.value:
+                    return Literal(True)
+                continue
+            operands.append(operand)
+        if not operands:
+            return Literal(False)
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+
+class Compare(Node):
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def compile(self):
+        compare = _COMPARISONS[self.op]
+        left, right = self.left.compile(), self.right.compile()
+        if self.op in ('==', '!='):
+            return lambda signals: compare(left(signals), right(signals))
+
+        return lambda signals: _ordered(compare, left(signals), right(signals))
+
+    def references(self):
+        return self.left.references() | self.right.references()
+
+    def mask(self, frame):
+        left, right = self.left, self.right
+        if isinstance(left, Name) and isinstance(right, Literal):
+            return frame.compare(left.name, self.op, right.value)
+        if isinstance(left, Literal) and isinstance(right, Name):
+            return frame.compare(right.name, _FLIPPED[self.op], left.value)
+        return super().mask(frame)
+
+    def partial(self, known):
+        left, right = self.left.partial(known), self.right.partial(known)
+        node = Compare(self.op, left, right)
+        if isinstance(left, Literal) and isinstance(right, Literal):
+            return Literal(node.compile()({}))
+        return node
+
+
+# --- Parser ---
+
+class _Parser:
+    """Recursive-descent parser producing a Node tree."""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.index = 0
+
+    def peek(self):
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
+        return (None, None)
+
+    def advance(self):
+        token = self.peek()
+        self.index += 1
+        return token
+
+    def expect(self, value):
+        kind, actual = self.advance()
+        if kind != 'op' or actual != value:
+            raise ConditionSyntaxError(f"Expected {value!r} in condition {self.text!r}")
+
+    def parse(self):
+        if not self.tokens:
+            raise ConditionSyntaxError('Condition is empty')
+        node = self.parse_or()
+        if self.index != len(self.tokens):
+            raise ConditionSyntaxError(
+                f"Unexpected token {self.peek()[1]!r} in condition {self.text!r}"
+            )
+        return node
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.peek() == ('op', '||'):
+            self.advance()
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while self.peek() == ('op', '&&'):
+            self.advance()
+            operands.append(self.parse_not())
+        return operands[0] if len(operands) == 1 else And(operands)
+
+    def parse_not(self):
+        if self.peek() == ('op', '!'):
+            self.advance()
+            return Not(self.parse_not())
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        left = self.parse_primary()
+        kind, value = self.peek()
+        if kind == 'op' and value in _COMPARISONS:
+            self.advance()
+            return Compare(value, left, self.parse_primary())
+        return left
+
+    def parse_primary(self):
+        kind, value = self.advance()
+        if kind == 'op' and value == '(':
+            node = self.parse_or()
+            self.expect(')')
+            return node
+        if kind in ('number', 'string'):
+            return Literal(value)
+        if kind == 'name':
+            if value in _KEYWORDS:
+                return Literal(_KEYWORDS[value])
+            if self.peek() == ('op', '.'):
+                self.advance()
+                method = self.advance()
+                if method != ('name', 'contains'):
+                    raise ConditionSyntaxError(
+                        f"Unsupported method {method[1]!r} in condition {self.text!r}"
+                    )
+                self.expect('(')
+                arg_kind, arg = self.advance()
+                if arg_kind != 'string':
+                    raise ConditionSyntaxError(
+                        f"contains() expects a quoted string in condition {self.text!r}"
+                    )
+                self.expect(')')
+                return Contains(value, arg)
+            return Name(value)
+        if kind is None:
+            raise ConditionSyntaxError(f"Unexpected end of condition {self.text!r}")
+        raise ConditionSyntaxError(f"Unexpected token {value!r} in condition {self.text!r}")
+
+
+def parse_condition(text):
+    """Parse a condition string into a syntax tree."""
+    return _Parser(text).parse()
+
+
+def compile_condition(text):
+    """Parse and compile a condition string into a predicate ``fn(signals) -> bool``."""
+    evaluate = parse_condition(text).compile()
+    return lambda signals: bool(evaluate(signals))
+
+
+# --- Column-wise evaluation ---
+
+class SignalFrame:
+    """
+    Signals for many rows (e.g. one row per learner) stored column by column.
+
+    Column masks are computed once per frame and shared by every rule that
+    reads the same input, so evaluating the whole rule library costs one pass
+    per referenced column plus a few big-integer operations per rule.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.size = len(rows)
+        self.full = (1 << self.size) - 1
+        self._columns = {}
+        self._masks = {}
+
+    def column(self, name):
+        if name not in self._columns:
+            self._columns[name] = [row.get(name) for row in self.rows]
+        return self._columns[name]
+
+    def _build(self, key, test, values):
+        if key not in self._masks:
+            # Bit i of the mask corresponds to row i
+            bits = ''.join('1' if test(value) else '0' for value in reversed(values))
+            self._masks[key] = int(bits, 2) if bits else 0
+        return self._masks[key]
+
+    def truthy(self, name):
+        return self._build(('truthy', name), bool, self.column(name))
+
+    def contains(self, name, value):
+        return self._build(
+            ('contains', name, value),
+            lambda item: _contains(item, value),
+            self.column(name)
+        )
+
+    def compare(self, name, op, value):
+        compare = _COMPARISONS[op]
+        if op in ('==', '!='):
+            test = lambda item: compare(item, value)
+        else:
+            test = lambda item: _ordered(compare, item, value)
+        return self._build(('compare', name, op, value), test, self.column(name))
+
+    def rowwise(self, evaluate):
+        """Fallback for expressions without a column-wise form."""
+        bits = ''.join('1' if evaluate(row) else '0' for row in reversed(self.rows))
+        return int(bits, 2) if bits else 0
+
+    @staticmethod
+    def indices(mask):
+        """Return the row indices set in a mask."""
+        return [i for i, bit in enumerate(reversed(bin(mask)[2:])) if bit == '1']
+
+
+# Compiled conditions keyed by rule id: {rule_id: (updated_at, (predicate, references, tree))}
+_predicate_cache = {}
+
+
+def get_compiled(rule):
+    """
+    Return ``(predicate, references, tree)`` for an AdaptiveRule's condition.
+    The rule condition is only parsed again when its updated_at changes.
+    """
+    cached = _predicate_cache.get(rule.pk)
+    if cached is not None and cached[0] == rule.updated_at:
+        return cached[1]
+    tree = parse_condition(rule.condition)
+    evaluate = tree.compile()
+    compiled = (lambda signals: bool(evaluate(signals)), frozenset(tree.references()), tree)
+    _predicate_cache[rule.pk] = (rule.updated_at, compiled)
+    return compiled
+
+
+def get_predicate(rule):
+    """Return the compiled predicate for an AdaptiveRule."""
+    return get_compiled(rule)[0]
+
+
+def clear_predicate_cache():
+    """Drop every cached predicate (used when rules are reloaded in bulk)."""
+    _predicate_cache.clear()
@@ -0,0 +1,184 @@
+"""
+Rule evaluation for the adaptive engine.
+
+Incoming EngagementMetric and SensoryLog rows are turned into a signal dict
+(e.g. ``{"attention_drop_detected": True}``) and evaluated against every
+active AdaptiveRule, read from the process-local rule registry.
+"""
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .adaptations import preference_signals, refresh_adaptation
+from .conditions import SignalFrame
+from .firings import jsonable_signals, trigger_recorder
+from .metrics import rule_metrics
+from .models import RuleEvaluationJob, UserSignalState
+from .registry import rule_registry
+
+# Thresholds used to derive detector signals from raw metrics while the
+# user's baseline is still cold
+ATTENTION_IDLE_RATIO_THRESHOLD = 0.5
+ATTENTION_COMPLETION_RATE_THRESHOLD = 30.0
+LONG_CONTENT_TIME_ON_TASK_THRESHOLD = 10.0
+
+
+def engagement_signals(metric):
+    """
+    Derive detector signals from an EngagementMetric.
+
+    Once the user's baseline is warm (UserSignalState.add_engagement left
+    z-scores on the metric), detectors fire on deviation from the user's own
+    mean by more than ADAPTIVE_BASELINE_ZSCORE_THRESHOLD standard deviations,
+    and the z-scores are exposed as ``<field>_zscore`` signals. Before that
+    the fixed thresholds above apply.
+    """
+    zscores = getattr(metric, 'baseline_zscores', None)
+    if zscores is None:
+        return {
+            'attention_drop_detected': (
+                metric.idle_ratio > ATTENTION_IDLE_RATIO_THRESHOLD
+                or metric.completion_rate < ATTENTION_COMPLETION_RATE_THRESHOLD
+            ),
+            'long_content_detected': metric.time_on_task > LONG_CONTENT_TIME_ON_TASK_THRESHOLD,
+        }
+
+    limit = settings.ADAPTIVE_BASELINE_ZSCORE_THRESHOLD
+    signals = {
+        'attention_drop_detected': (
+            zscores['idle_ratio'] > limit
+            or zscores['completion_rate'] < -limit
+        ),
+        'long_content_detected': zscores['time_on_task'] > limit,
+    }
+    for field, zscore in zscores.items():
+        signals[f'{field}_zscore'] = zscore
+    return signals
+
+
+def sensory_signals(log):
+    """Derive detector signals from a SensoryLog."""
+    return {
+        'sensory_overload_detected': log.sensory_overload_flag,
+    }
+
+
+def merge_signals(signal_dicts):
+    """
+    Combine the signals of several samples into one dict.
+    A boolean detector is true if it fired for any sample; other values keep
+    the most recent sample's value.
+    """
+    merged = {}
+    for signals in signal_dicts:
+        for name, value in signals.items():
+            if isinstance(value, bool):
+                merged[name] = merged.get(name, False) or value
+            else:
+                merged[name] = value
+    return merged
+
+
+def user_signals(neuro_profile=None, state=None, metric=None, log=None):
+    """
+    Assemble the signals the live path holds for a user (see
+    UserAdaptation.signals) from their current records: the NeuroProfile's
+    preferences and profile tags, the detectors and baseline z-scores of the
+    latest EngagementMetric, the latest SensoryLog's detectors and the
+    UserSignalState trend signals as of the latest sample.
+    Offline tools use it so rules see the same inputs as in production.
+    """
+    signals = {}
+    if neuro_profile is not None:
+        signals.update(preference_signals(neuro_profile))
+    if metric is not None:
+        if state is not None:
+            metric.baseline_zscores = state.latest_baseline_zscores(metric)
+        signals.update(engagement_signals(metric))
+    if log is not None:
+        signals.update(sensory_signals(log))
+    if state is not None:
+        signals.update(state.trend_signals(state.latest_sample_at()))
+    return signals
+
+
+def evaluate_rules(signals, rules=None):
+    """
+    Evaluate compiled rules against a signal dict and return the AdaptiveRules
+    that fire. Defaults to the registry's active rules that read one of the
+    event's inputs, found through the registry's inverted index.
+    Each evaluation is counted in the per-rule metrics (see metrics.py).
+    """
+    if rules is None:
+        rules = rule_registry.candidates(signals)
+    fired = []
+    for compiled in rules:
+        started = time.perf_counter_ns()
+        result = compiled.predicate(signals)
+        rule_metrics.observe(compiled.rule.pk, time.perf_counter_ns() - started, result)
+        if result:
+            fired.append(compiled.rule)
+    return fired
+
+
+def evaluate_frame(rows, rules=None):
+    """
+    Evaluate rules column-wise over many signal dicts at once.
+    Returns ``(frame, fired)`` where ``fired`` maps each compiled rule that
+    fired for at least one row to its row bitmask (see SignalFrame.indices).
+    """
+    if rules is None:
+        rules = rule_registry.rules()
+    frame = SignalFrame(rows)
+    fired = {}
+    for compiled in rules:
+        mask = compiled.tree.mask(frame)
+        if mask:
+            fired[compiled] = mask
+    return frame, fired
+
+
+def apply_rules(user, signals):
+    """
+    Evaluate all active rules for a user's signals and apply the ones that fire.
+    Each firing is recorded as a TriggerEvent unless the rule is still in its
+    cooldown window for this user, and the user's materialized adaptation
+    document is refreshed with the new signals. Returns the list of fired rules.
+    """
+    fired = evaluate_rules(signals)
+    for rule in fired:
+        trigger_recorder.record(user, rule, signals)
+    refresh_adaptation(user, signals)
+    return fired
+
+
+def dispatch_rules(user, signals):
+    """
+    Apply the rules for a user's signals, either right away or, when
+    ADAPTIVE_ENGINE_QUEUE_EVALUATION is on, by queueing a RuleEvaluationJob
+    once the current transaction commits.
+    Returns the list of fired rules, or None when evaluation was queued.
+    """
+    if not settings.ADAPTIVE_ENGINE_QUEUE_EVALUATION:
+        return apply_rules(user, signals)
+
+    job = RuleEvaluationJob(user=user, signals=jsonable_signals(signals))
+    transaction.on_commit(job.save)
+    return None
+
+
+def apply_batch_rules(user, metrics=(), logs=()):
+    """
+    Evaluation hook for bulk ingestion, where post_save does not fire.
+    Folds the batch into the user's rolling signal state, merges the signals
+    of every sample and dispatches rule evaluation once for the user.
+    Returns the list of fired rules, or None when evaluation was queued.
+    """
+    state = UserSignalState.record(user, metrics=metrics, logs=logs)
+    signals = merge_signals(
+        [engagement_signals(metric) for metric in metrics]
+        + [sensory_signals(log) for log in logs]
+        + [state.trend_signals()]
+    )
+    return dispatch_rules(user, signals)
@@ -0,0 +1,133 @@
+"""
+Recording of adaptive rule firings.
+
+A rule that keeps firing for the same user (e.g. while ``idle_ratio`` stays
+high) is only recorded once per ``AdaptiveRule.cooldown_seconds``. The
+cooldown table lives in the Django cache, so it is per process with the
+default local-memory cache and shared when a shared cache is configured.
+
+Recorded firings are buffered in memory and written with one ``bulk_create``
+once ``ADAPTIVE_TRIGGER_FLUSH_SIZE`` are pending or the oldest pending firing
+is ``ADAPTIVE_TRIGGER_FLUSH_SECONDS`` old. That check also runs after each
+request, and whatever is still pending is written when the process exits.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.models import User
+from .models import AdaptiveRule, TriggerEvent
+
+logger = logging.getLogger(__name__)
+
+
+def jsonable_signals(signals):
+    """Return a copy of a signal dict that can be stored in a JSONField."""
+    return {
+        name: sorted(value) if isinstance(value, (set, frozenset)) else value
+        for name, value in signals.items()
+    }
+
+
+class TriggerRecorder:
+    """Cooldown-deduplicated, batched writer of TriggerEvent rows."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._oldest = None
+
+    def record(self, user, rule, signals):
+        """
+        Record that ``rule`` fired for ``user``.
+        Returns False when the firing falls inside the rule's cooldown window.
+        """
+        if rule.cooldown_seconds and not cache.add(
+            f'adaptive_engine:cooldown:{rule.pk}:{user.pk}',
+            True,
+            timeout=rule.cooldown_seconds
+        ):
+            return False
+
+        event = TriggerEvent(
+            user_id=user.pk,
+            rule_id=rule.pk,
+            inputs=jsonable_signals(signals),
+            timestamp=timezone.now()
+        )
+        with self._lock:
+            self._pending.append(event)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+        if self.is_due():
+            self.flush()
+        return True
+
+    def is_due(self):
+        """Whether the buffer is full or its oldest firing is old enough to flush."""
+        if not self._pending:
+            return False
+        return (
+            len(self._pending) >= settings.ADAPTIVE_TRIGGER_FLUSH_SIZE
+            or time.monotonic() - self._oldest >= settings.ADAPTIVE_TRIGGER_FLUSH_SECONDS
+        )
+
+    def flush(self):
+        """
+        Write every pending firing in one bulk insert. Returns the number written.
+        Firings of rules or users deleted since they were recorded are dropped;
+        if the write fails otherwise, the batch is kept for the next flush.
+        """
+        with self._lock:
+            pending, self._pending, self._oldest = self._pending, [], None
+        if not pending:
+            return 0
+        try:
+            try:
+                with transaction.atomic():
+                    TriggerEvent.objects.bulk_create(pending)
+            except IntegrityError:
+                pending = self._stored_references(pending)
+                with transaction.atomic():
+                    TriggerEvent.objects.bulk_create(pending)
+        except Exception:
+            with self._lock:
+                self._pending[:0] = pending
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+            raise
+        return len(pending)
+
+    def discard(self):
+        """Drop every pending firing without writing it. Returns the number dropped."""
+        with self._lock:
+            pending, self._pending, self._oldest = self._pending, [], None
+        return len(pending)
+
+    @staticmethod
+    def _stored_references(events):
+        """Return the events whose rule and user still exist."""
+        rule_ids = set(
+            AdaptiveRule.objects.filter(pk__in={event.rule_id for event in events}).values_list('pk', flat=True)
+        )
+        user_ids = set(
+            User.objects.filter(pk__in={event.user_id for event in events}).values_list('pk', flat=True)
+        )
+        return [event for event in events if event.rule_id in rule_ids and event.user_id in user_ids]
+
+
+trigger_recorder = TriggerRecorder()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        trigger_recorder.flush()
+    except Exception:
+        logger.exception('Could not flush %d trigger events on exit', len(trigger_recorder._pending))
@@ -0,0 +1,205 @@
+import contextlib
+import io
+import json
+import random
+import resource
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from adaptive_engine.firings import trigger_recorder
+from adaptive_engine.metrics import rule_metrics
+from adaptive_engine.models import EngagementMetric, SensoryLog
+from adaptive_engine.registry import rule_registry
+from adaptive_engine.signals import check_engagement_triggers, check_sensory_triggers
+from core.models import PROFILE_TAGS, NeuroProfile, User, profile_tag_mask
+
+
+class BenchmarkRollback(Exception):
+    """Raised to roll back every row the benchmark created."""
+
+
+class Command(BaseCommand):
+    help = 'Measure adaptive engine throughput on synthetic engagement and sensory streams'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=50,
+            help='Number of synthetic students (default: 50)'
+        )
+        parser.add_argument(
+            '--events-per-user',
+            type=int,
+            default=40,
+            help='Number of samples generated per student (default: 40)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed for the synthetic streams (default: 1)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results as JSON to this file'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Ingest a synthetic signal stream through the normal post_save path and
+        report throughput, latency percentiles, queries per event and peak memory.
+        Event latency covers the insert and its post_save handler; evaluation
+        latency covers the handler alone (signal state, rule evaluation,
+        firing record and adaptation refresh).
+
+        Everything runs inside one transaction that is rolled back at the end,
+        so the benchmark can be pointed at any database (SQLite by default, or
+        PostgreSQL through DATABASE_URL) without leaving rows behind.
+        Rule evaluation is always measured inline, even if queueing is enabled.
+        """
+        rng = random.Random(options['seed'])
+        results = {}
+
+        with override_settings(ADAPTIVE_ENGINE_QUEUE_EVALUATION=False):
+            try:
+                with transaction.atomic():
+                    results = self.run(rng, options['users'], options['events_per_user'])
+                    raise BenchmarkRollback
+            except BenchmarkRollback:
+                pass
+        # Firings and counters buffered during the run belong to the rolled-back cohort
+        trigger_recorder.discard()
+        rule_metrics.discard()
+
+        results.update({
+            'commit': self.git_commit(),
+            'database': connection.vendor,
+            'users': options['users'],
+            'events_per_user': options['events_per_user'],
+            'seed': options['seed'],
+            'recorded_at': timezone.now().isoformat(),
+        })
+
+        for key, value in results.items():
+            self.stdout.write(f'{key}: {value}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"\nResults written to {options['output']}"))
+
+    def run(self, rng, user_count, events_per_user):
+        """Create the synthetic cohort, stream the events and collect measurements."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('load_neuro_rules')
+
+        users = User.objects.bulk_create([
+            User(email=f'bench-{i}@bench.invalid', role='student')
+            for i in range(user_count)
+        ])
+        NeuroProfile.objects.bulk_create([
+            NeuroProfile(
+                user=user,
+                sensory_preferences={
+                    'reduce_animations': rng.random() < 0.3,
+                    'dyslexic_font': rng.random() < 0.2,
+                    'low_audio': rng.random() < 0.2,
+                },
+                profile_tags=profile_tag_mask(tag for tag in PROFILE_TAGS if rng.random() < 0.15)
+            )
+            for user in users
+        ])
+
+        # Interleave users so consecutive events rarely share a user
+        events = [
+            (user, rng.random() < 0.5)
+            for _ in range(events_per_user)
+            for user in users
+        ]
+
+        rule_registry.invalidate()
+        rule_registry.index()
+
+        # The post_save handlers are called by hand below, so that the insert
+        # and the evaluation path can be timed separately without running twice
+        handlers = (
+            (EngagementMetric, check_engagement_triggers),
+            (SensoryLog, check_sensory_triggers),
+        )
+        for sender, handler in handlers:
+            post_save.disconnect(handler, sender=sender)
+
+        event_latencies = []
+        evaluation_latencies = []
+        try:
+            with CaptureQueriesContext(connection) as queries, contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                for user, is_engagement in events:
+                    event_started = time.perf_counter()
+                    if is_engagement:
+                        sender, handler = EngagementMetric, check_engagement_triggers
+                        instance = EngagementMetric.objects.create(
+                            user=user,
+                            time_on_task=rng.uniform(0.0, 20.0),
+                            completion_rate=rng.uniform(0.0, 100.0),
+                            idle_ratio=rng.random()
+                        )
+                    else:
+                        sender, handler = SensoryLog, check_sensory_triggers
+                        instance = SensoryLog.objects.create(
+                            user=user,
+                            mood_score=rng.uniform(-1.0, 1.0),
+                            sensory_overload_flag=rng.random() < 0.1
+                        )
+                    evaluation_started = time.perf_counter()
+                    handler(sender=sender, instance=instance, created=True)
+                    finished = time.perf_counter()
+                    event_latencies.append(finished - event_started)
+                    evaluation_latencies.append(finished - evaluation_started)
+                elapsed = time.perf_counter() - started
+        finally:
+            for sender, handler in handlers:
+                post_save.connect(handler, sender=sender)
+
+        event_count = len(events)
+        return {
+            'rules': len(rule_registry.rules()),
+            'events': event_count,
+            'elapsed_seconds': round(elapsed, 4),
+            'events_per_second': round(event_count / elapsed, 1),
+            'event_p50_ms': round(self.percentile(event_latencies, 50) * 1e3, 3),
+            'event_p99_ms': round(self.percentile(event_latencies, 99) * 1e3, 3),
+            'evaluation_p50_ms': round(self.percentile(evaluation_latencies, 50) * 1e3, 3),
+            'evaluation_p99_ms': round(self.percentile(evaluation_latencies, 99) * 1e3, 3),
+            'queries_per_event': round(len(queries.captured_queries) / event_count, 2),
+            # ru_maxrss is reported in kilobytes on Linux
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    @staticmethod
+    def percentile(samples, pct):
+        if len(samples) < 2:
+            return samples[0] if samples else 0.0
+        return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from adaptive_engine.rollups import ROLLUP_SOURCES, compact, purge
+
+
+class Command(BaseCommand):
+    help = 'Fold raw engagement and sensory samples into hourly/daily rollups and purge expired raw rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of raw rows folded into rollups per transaction (default: 5000)'
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.ADAPTIVE_RAW_SIGNAL_RETENTION_DAYS,
+            help='Purge compacted raw rows older than this many days; 0 disables purging'
+        )
+        parser.add_argument(
+            '--purge-batch-size',
+            type=int,
+            default=5000,
+            help='Maximum number of raw rows deleted per DELETE statement (default: 5000)'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Compact every raw signal source from its high-water mark, then purge
+        raw rows that are both compacted and outside the retention window.
+        """
+        retention_days = options['retention_days']
+        cutoff = timezone.now() - timedelta(days=retention_days)
+
+        for raw_model, rollup_model, fields, count_overload in ROLLUP_SOURCES:
+            name = raw_model._meta.verbose_name_plural
+            compacted = compact(
+                raw_model,
+                rollup_model,
+                fields,
+                count_overload,
+                batch_size=options['batch_size']
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'Compacted {compacted} {name} into rollups.')
+            )
+
+            if retention_days > 0:
+                deleted = purge(raw_model, cutoff, batch_size=options['purge_batch_size'])
+                self.stdout.write(
+                    self.style.WARNING(f'Purged {deleted} {name} older than {retention_days} days.')
+                )
@@ -1,5 +1,10 @@
+import hashlib
+import json
+
 from django.core.management.base import BaseCommand
-from adaptive_engine.models import AdaptiveRule
+from django.db import transaction
+from django.utils import timezone
+from adaptive_engine.models import AdaptiveRule, RuleSet, RuleSetVersion
 
 
 class Command(BaseCommand):
@@ -228,12 +233,89 @@ class Command(BaseCommand):
         }
     }
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--deactivate-missing',
+            action='store_true',
+            help='Deactivate active rules that are not part of AI_RULES_DATA'
+        )
+        parser.add_argument(
+            '--publish',
+            action='store_true',
+            help='Publish the active rules as a new rule set if anything changed or none was '
+                 'published yet. Once a rule set has been published this happens without the flag '
+                 'whenever the library differs from the served rule set, so library changes shipped '
+                 'in a deploy are served'
+        )
+
     def handle(self, *args, **options):
         """
-        Load neuro rules into the database using update_or_create.
+        Sync AI_RULES_DATA into the database.
+
+        Existing rules are fetched in one query and compared by content hash;
+        new rules are inserted with one bulk_create and changed rules updated
+        with one bulk_update, all in one transaction. Unchanged rules are not
+        written, so their updated_at (and every cache keyed on it) survives
+        a reboot. The rule set version is only bumped if something changed.
+        
+        Once a rule set has been published, workers serve that snapshot, so
+        whenever the library differs from it a new rule set is published
+        (this also picks up changes loaded earlier but never published).
         """
-        created_count = 0
-        updated_count = 0
+        rule_set = None
+        with transaction.atomic():
+            created, updated, deactivated = self.load_rules(options['deactivate_missing'])
+            changed = bool(created or updated or deactivated)
+            served_id = RuleSetVersion.pointer()[1]
+            served = RuleSet.objects.filter(pk=served_id).first() if served_id else None
+            if served is not None or options['publish']:
+                if changed or served is None or self.differs_from(served):
+                    rule_set = RuleSet.publish(note='load_neuro_rules')
+            elif changed:
+                RuleSetVersion.rules_changed()
+        
+        unchanged = len(self.AI_RULES_DATA) - len(created) - len(updated)
+        
+        # Summary
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nNeuro rules loading complete: {len(created)} created, {len(updated)} updated, '
+                f'{unchanged} unchanged, {len(deactivated)} deactivated.'
+            )
+        )
+        if rule_set is not None:
+            self.stdout.write(self.style.SUCCESS(f'Published {rule_set}.'))
+    
+    @staticmethod
+    def content_hash(condition, action_payload, is_active):
+        """Hash the stored content of a rule so changes can be detected without comparing fields one by one."""
+        canonical = json.dumps(
+            [condition, action_payload, is_active],
+            sort_keys=True,
+            separators=(',', ':')
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+    
+    def differs_from(self, rule_set):
+        """Whether any rule of AI_RULES_DATA is missing from or different in a rule set."""
+        served = {
+            rule['name']: self.content_hash(rule['condition'], rule['action_payload'], True)
+            for rule in rule_set.rules
+        }
+        return any(
+            served.get(rule_name) != self.content_hash(rule_data.get("trigger", ""), rule_data, True)
+            for rule_name, rule_data in self.AI_RULES_DATA.items()
+        )
+    
+    def load_rules(self, deactivate_missing=False):
+        """
+        Create new rules and update changed ones.
+        Returns the lists of created, updated and deactivated rule names.
+        """
+        existing = {rule.name: rule for rule in AdaptiveRule.objects.all()}
+        now = timezone.now()
+        to_create = []
+        to_update = []
         
         for rule_name, rule_data in self.AI_RULES_DATA.items():
             # Extract trigger for condition field
@@ -242,35 +324,57 @@ class Command(BaseCommand):
             # Use the whole rule_data as action_payload (includes trigger, action, modifiers)
             action_payload = rule_data
             
-            # Use update_or_create to either create or update the rule
-            rule, created = AdaptiveRule.objects.update_or_create(
-                name=rule_name,
-                defaults={
-                    'condition': condition,
-                    'action_payload': action_payload,
-                    'is_active': True
-                }
-            )
-            
-            if created:
-                created_count += 1
+            rule = existing.get(rule_name)
+            if rule is None:
+                to_create.append(AdaptiveRule(
+                    name=rule_name,
+                    condition=condition,
+                    action_payload=action_payload,
+                    is_active=True
+                ))
                 self.stdout.write(
                     self.style.SUCCESS(
                         f'Successfully created rule: {rule_name}'
                     )
                 )
-            else:
-                updated_count += 1
+            elif (
+                self.content_hash(rule.condition, rule.action_payload, rule.is_active)
+                != self.content_hash(condition, action_payload, True)
+            ):
+                rule.condition = condition
+                rule.action_payload = action_payload
+                rule.is_active = True
+                # bulk_update does not apply auto_now
+                rule.updated_at = now
+                to_update.append(rule)
                 self.stdout.write(
                     self.style.WARNING(
                         f'Updated existing rule: {rule_name}'
                     )
                 )
         
-        # Summary
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'\nNeuro rules loading complete: {created_count} created, {updated_count} updated.'
-            )
+        to_deactivate = []
+        if deactivate_missing:
+            for rule_name, rule in existing.items():
+                if rule_name not in self.AI_RULES_DATA and rule.is_active:
+                    rule.is_active = False
+                    rule.updated_at = now
+                    to_deactivate.append(rule)
+                    self.stdout.write(
+                        self.style.WARNING(
+                            f'Deactivated rule missing from the library: {rule_name}'
+                        )
+                    )
+        
+        # Bulk operations skip post_save, so the caller bumps the rule set version
+        AdaptiveRule.objects.bulk_create(to_create)
+        AdaptiveRule.objects.bulk_update(
+            to_update + to_deactivate,
+            ['condition', 'action_payload', 'is_active', 'updated_at']
+        )
+        
+        return (
+            [rule.name for rule in to_create],
+            [rule.name for rule in to_update],
+            [rule.name for rule in to_deactivate],
         )
-
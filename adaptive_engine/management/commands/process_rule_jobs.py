@@ -0,0 +1,174 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from adaptive_engine.engine import apply_rules
+from adaptive_engine.firings import trigger_recorder
+from adaptive_engine.metrics import rule_metrics
+from adaptive_engine.models import RuleEvaluationJob
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = 'Drain queued adaptive rule evaluation jobs (see ADAPTIVE_ENGINE_QUEUE_EVALUATION)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of jobs claimed per transaction (default: 100)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of worker threads; forced to 1 on databases without SKIP LOCKED'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=3,
+            help='Mark a job as failed after this many errors (default: 3)'
+        )
+        parser.add_argument(
+            '--retry-delay',
+            type=float,
+            default=5.0,
+            help='Seconds before a failed job is retried, doubled after each further failure (default: 5.0)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait before polling again when the queue is empty (default: 1.0)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty instead of polling'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Claim pending jobs in batches and evaluate the rules for each one.
+
+        On databases with SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL),
+        several threads or processes can drain the queue side by side. Jobs
+        are claimed per user, so one user's jobs are only ever run by one
+        worker at a time and in the order they were queued. Elsewhere
+        (SQLite) a single worker claims batches with a plain SELECT inside
+        the write transaction.
+
+        A job that raises is retried after --retry-delay seconds, doubled
+        after each further failure, and marked failed after --max-attempts
+        errors. The user's later jobs wait for it.
+        """
+        self.skip_locked = connection.features.has_select_for_update_skip_locked
+        concurrency = max(options['concurrency'], 1)
+        if concurrency > 1 and not self.skip_locked:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'{connection.vendor} does not support SKIP LOCKED; running a single worker.'
+                )
+            )
+            concurrency = 1
+
+        self.stop = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self.counter_lock = threading.Lock()
+
+        workers = [
+            threading.Thread(target=self.work, args=(options,), daemon=True)
+            for _ in range(concurrency - 1)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            self.work(options)
+        except KeyboardInterrupt:
+            self.stop.set()
+        for worker in workers:
+            worker.join()
+        trigger_recorder.flush()
+        rule_metrics.flush()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nRule job worker stopped: {self.processed} processed, {self.failed} failed.'
+            )
+        )
+
+    def work(self, options):
+        """Worker loop: claim and process batches until stopped (or empty with --once)."""
+        try:
+            while not self.stop.is_set():
+                if self.process_batch(options['batch_size'], options['max_attempts'], options['retry_delay']):
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            connections.close_all()
+
+    def claim(self, batch_size):
+        """
+        Claim the jobs of the users queued first, in queue order.
+
+        A user with a job waiting for a retry is passed over, so their later
+        jobs do not overtake it. The users' rows are locked (FOR NO KEY
+        UPDATE, which does not block inserts referencing them) and users
+        locked by another worker are skipped, so only the lock holder runs a
+        user's jobs.
+        """
+        pending = RuleEvaluationJob.objects.filter(status=RuleEvaluationJob.STATUS_PENDING)
+        ready = pending.exclude(user_id__in=pending.filter(run_after__gt=timezone.now()).values('user_id'))
+        user_ids = list(dict.fromkeys(
+            ready.order_by('pk').values_list('user_id', flat=True)[:batch_size]
+        ))
+        if not user_ids:
+            return []
+        if self.skip_locked:
+            user_ids = list(
+                User.objects.filter(pk__in=user_ids)
+                .select_for_update(skip_locked=True, no_key=connection.features.has_select_for_no_key_update)
+                .values_list('pk', flat=True)
+            )
+        return list(pending.filter(user_id__in=user_ids).order_by('pk').select_related('user')[:batch_size])
+
+    def process_batch(self, batch_size, max_attempts, retry_delay):
+        """Process one batch of jobs. Returns the number of jobs claimed."""
+        with transaction.atomic():
+            jobs = self.claim(batch_size)
+            done, failed, retrying = [], [], set()
+            for job in jobs:
+                if job.user_id in retrying:
+                    continue  # Keep the user's jobs in order behind the one that failed
+                try:
+                    with transaction.atomic():
+                        apply_rules(job.user, job.signals)
+                    done.append(job.pk)
+                except Exception as e:
+                    job.attempts += 1
+                    job.last_error = str(e)
+                    if job.attempts >= max_attempts:
+                        job.status = RuleEvaluationJob.STATUS_FAILED
+                        failed.append(job.pk)
+                    else:
+                        job.run_after = timezone.now() + timedelta(seconds=retry_delay * 2 ** (job.attempts - 1))
+                        retrying.add(job.user_id)
+                    job.save(update_fields=['attempts', 'last_error', 'status', 'run_after'])
+            RuleEvaluationJob.objects.filter(pk__in=done).delete()
+
+        if trigger_recorder.is_due():
+            trigger_recorder.flush()
+        if rule_metrics.is_due():
+            rule_metrics.flush()
+        with self.counter_lock:
+            self.processed += len(done)
+            self.failed += len(failed)
+        return len(jobs)
@@ -0,0 +1,54 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from adaptive_engine.models import RuleSet, RuleSetVersion
+
+
+class Command(BaseCommand):
+    help = 'Publish the active adaptive rules as a new rule set, or switch to an existing one'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--note',
+            default='',
+            help='Describe what changed in the new rule set'
+        )
+        parser.add_argument(
+            '--activate',
+            type=int,
+            metavar='NUMBER',
+            help='Serve an existing rule set instead of publishing (e.g. to roll back)'
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List the published rule sets'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Snapshot the active AdaptiveRules as an immutable, numbered RuleSet
+        and point every worker at it with one update of RuleSetVersion.
+        Workers pick the new rule set up on their next request.
+        """
+        if options['list']:
+            current_id = RuleSetVersion.pointer()[1]
+            for rule_set in RuleSet.objects.all():
+                marker = '*' if rule_set.pk == current_id else ' '
+                note = f' - {rule_set.note}' if rule_set.note else ''
+                self.stdout.write(f'{marker} {rule_set} published {rule_set.created_at:%Y-%m-%d %H:%M}{note}')
+            return
+
+        if options['activate'] is not None:
+            try:
+                rule_set = RuleSet.objects.get(number=options['activate'])
+            except RuleSet.DoesNotExist:
+                raise CommandError(f"Rule set #{options['activate']} does not exist")
+            rule_set.activate()
+            self.stdout.write(self.style.SUCCESS(f'Now serving {rule_set}.'))
+            return
+
+        try:
+            rule_set = RuleSet.publish(note=options['note'])
+        except ValidationError as e:
+            raise CommandError('Cannot publish: ' + '; '.join(e.messages))
+        self.stdout.write(self.style.SUCCESS(f'Published and now serving {rule_set}.'))
@@ -0,0 +1,117 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from adaptive_engine.conditions import ConditionSyntaxError, parse_condition
+from adaptive_engine.management.commands.load_neuro_rules import Command as LoadNeuroRulesCommand
+from adaptive_engine.registry import rule_registry
+from adaptive_engine.replay import replay, rule_set_from_data, rule_set_from_rules
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = 'Replay historical signals against the active and a candidate rule set and diff the adaptations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Replay signals from the last N days (default: 7)'
+        )
+        parser.add_argument(
+            '--candidate',
+            help='JSON file with the candidate rules in the load_neuro_rules format '
+                 '(default: the library in load_neuro_rules)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes; users are sharded by id across them (default: 1)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of rows fetched per database round trip (default: 2000)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the per-user differences as JSON to this file'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Replay the last --days of EngagementMetric and SensoryLog rows against
+        the rules currently served and the candidate rules, and report which users would
+        gain or lose which adaptations, plus how often each rule fires.
+
+        Nothing is written to the database.
+        """
+        if options['candidate']:
+            try:
+                with open(options['candidate']) as f:
+                    candidate_data = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not read candidate rules: {e}')
+        else:
+            candidate_data = LoadNeuroRulesCommand.AI_RULES_DATA
+
+        # The rules workers serve: the published rule set, or the live active rules
+        current = rule_set_from_rules(compiled.rule for compiled in rule_registry.rules())
+        candidate = rule_set_from_data(candidate_data)
+        for name, condition in candidate.items():
+            try:
+                parse_condition(condition)
+            except ConditionSyntaxError as e:
+                raise CommandError(f'Candidate rule {name} has an invalid trigger: {e}')
+
+        since = timezone.now() - timedelta(days=options['days'])
+        result = replay(
+            since,
+            current,
+            candidate,
+            workers=max(options['workers'], 1),
+            chunk_size=options['chunk_size']
+        )
+
+        emails = dict(
+            User.objects.filter(pk__in=list(result['diffs'])).values_list('pk', 'email')
+        )
+
+        for name in sorted(set(current) | set(candidate)):
+            before = result['current_fires'][name]
+            after = result['candidate_fires'][name]
+            if before != after:
+                self.stdout.write(f'{name}: {before} -> {after} firings')
+
+        for user_id, diff in sorted(result['diffs'].items()):
+            user = emails.get(user_id, user_id)
+            for name in diff['gained']:
+                self.stdout.write(self.style.SUCCESS(f'+ {name}: {user}'))
+            for name in diff['lost']:
+                self.stdout.write(self.style.WARNING(f'- {name}: {user}'))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(
+                    {
+                        'since': since.isoformat(),
+                        'users': result['users'],
+                        'events': result['events'],
+                        'current_fires': dict(result['current_fires']),
+                        'candidate_fires': dict(result['candidate_fires']),
+                        'diffs': {str(user_id): diff for user_id, diff in result['diffs'].items()},
+                    },
+                    f,
+                    indent=2
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nRule replay complete: {result['events']} events for {result['users']} users, "
+                f"{len(result['diffs'])} users with different adaptations."
+            )
+        )
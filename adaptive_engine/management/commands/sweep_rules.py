@@ -0,0 +1,116 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from adaptive_engine.engine import evaluate_frame, user_signals
+from adaptive_engine.models import EngagementMetric, SensoryLog
+from adaptive_engine.registry import rule_registry
+from core.models import User
+
+
+def _related(user, name):
+    """Return a user's one-to-one related object, or None if there is none."""
+    try:
+        return getattr(user, name)
+    except ObjectDoesNotExist:
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Evaluate every active adaptive rule against the latest signals of every student'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of students loaded and evaluated per chunk (default: 2000)'
+        )
+        parser.add_argument(
+            '--all-roles',
+            action='store_true',
+            help='Sweep every active user, not only students'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Sweep the whole population in chunks of students.
+
+        For each chunk, the latest EngagementMetric and SensoryLog of every
+        student are fetched with two indexed subqueries and the NeuroProfile
+        and UserSignalState with a join. They are turned into the same
+        signals the live path evaluates (preferences, profile tags, detectors,
+        baseline z-scores and trends, see engine.user_signals), and every
+        rule is applied to the chunk at once as a bitmask (one bit per
+        student) instead of looping over students per rule.
+        """
+        chunk_size = options['chunk_size']
+        rule_registry.invalidate()
+        rules = rule_registry.rules()
+
+        users = User.objects.filter(is_active=True)
+        if not options['all_roles']:
+            users = users.filter(role='student')
+
+        fire_counts = {compiled.name: 0 for compiled in rules}
+        swept = 0
+        last_pk = 0
+
+        while True:
+            # Keyset pagination on pk keeps every chunk query equally cheap
+            chunk = list(
+                users.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .annotate(
+                    latest_metric_id=Subquery(
+                        EngagementMetric.objects.filter(user=OuterRef('pk'))
+                        .order_by('-timestamp')
+                        .values('pk')[:1]
+                    ),
+                    latest_log_id=Subquery(
+                        SensoryLog.objects.filter(user=OuterRef('pk'))
+                        .order_by('-timestamp')
+                        .values('pk')[:1]
+                    ),
+                )
+                .select_related('neuro_profile', 'signal_state')[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            metrics = EngagementMetric.objects.in_bulk(
+                [user.latest_metric_id for user in chunk if user.latest_metric_id]
+            )
+            logs = SensoryLog.objects.in_bulk(
+                [user.latest_log_id for user in chunk if user.latest_log_id]
+            )
+
+            rows = [
+                user_signals(
+                    neuro_profile=_related(user, 'neuro_profile'),
+                    state=_related(user, 'signal_state'),
+                    metric=metrics.get(user.latest_metric_id),
+                    log=logs.get(user.latest_log_id)
+                )
+                for user in chunk
+            ]
+
+            frame, fired = evaluate_frame(rows, rules)
+            for compiled, mask in fired.items():
+                fire_counts[compiled.name] += mask.bit_count()
+                if options['verbosity'] >= 2:
+                    for index in frame.indices(mask):
+                        self.stdout.write(f'{compiled.name}: {chunk[index].email}')
+
+            swept += len(chunk)
+            self.stdout.write(f'Swept {swept} users...')
+
+        for name, count in fire_counts.items():
+            if count:
+                self.stdout.write(f'{name}: {count} users')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nRule sweep complete: {len(rules)} rules evaluated for {swept} users.'
+            )
+        )
@@ -0,0 +1,131 @@
+"""
+Per-rule evaluation metrics.
+
+Every evaluation of a rule condition on the event path is counted in memory:
+evaluation count, fire count, cumulative and maximum evaluation time and the
+last time the rule fired. The counters are added to the RuleStats table at
+most every ``ADAPTIVE_RULE_METRICS_FLUSH_SECONDS`` (checked after each
+request and by the job worker) and when the process exits, so the cost per
+evaluation is a clock read and a few dict updates.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import AdaptiveRule, RuleStats
+
+logger = logging.getLogger(__name__)
+
+# Indexes into a rule's pending counter list
+_EVALUATIONS, _FIRES, _TOTAL_NS, _MAX_NS, _LAST_FIRED = range(5)
+
+
+class RuleMetrics:
+    """In-process per-rule counters with periodic flushing to RuleStats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def observe(self, rule_id, elapsed_ns, fired):
+        """Count one evaluation of a rule that took ``elapsed_ns`` nanoseconds."""
+        with self._lock:
+            counters = self._pending.get(rule_id)
+            if counters is None:
+                counters = self._pending[rule_id] = [0, 0, 0, 0, None]
+            counters[_EVALUATIONS] += 1
+            counters[_TOTAL_NS] += elapsed_ns
+            if elapsed_ns > counters[_MAX_NS]:
+                counters[_MAX_NS] = elapsed_ns
+            if fired:
+                counters[_FIRES] += 1
+                counters[_LAST_FIRED] = timezone.now()
+
+    def is_due(self):
+        """Whether counters are pending and the flush interval has passed."""
+        return bool(self._pending) and (
+            time.monotonic() - self._last_flush >= settings.ADAPTIVE_RULE_METRICS_FLUSH_SECONDS
+        )
+
+    def flush(self):
+        """Add the pending counters to RuleStats. Returns the number of rules flushed."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        try:
+            return self._write(pending)
+        except Exception:
+            # Keep the counters for the next flush
+            self._merge(pending)
+            raise
+
+    def discard(self):
+        """Drop the pending counters without writing them. Returns the number of rules dropped."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        return len(pending)
+
+    def _merge(self, pending):
+        with self._lock:
+            for rule_id, counters in pending.items():
+                current = self._pending.get(rule_id)
+                if current is None:
+                    self._pending[rule_id] = counters
+                    continue
+                current[_EVALUATIONS] += counters[_EVALUATIONS]
+                current[_FIRES] += counters[_FIRES]
+                current[_TOTAL_NS] += counters[_TOTAL_NS]
+                current[_MAX_NS] = max(current[_MAX_NS], counters[_MAX_NS])
+                if current[_LAST_FIRED] is None:
+                    current[_LAST_FIRED] = counters[_LAST_FIRED]
+
+    @staticmethod
+    def _write(pending):
+        with transaction.atomic():
+            # Counters of rules deleted since they were evaluated are dropped
+            rule_ids = set(AdaptiveRule.objects.filter(pk__in=pending).values_list('pk', flat=True))
+            existing = set(
+                RuleStats.objects.filter(rule_id__in=rule_ids).values_list('rule_id', flat=True)
+            )
+            RuleStats.objects.bulk_create(
+                [RuleStats(rule_id=rule_id) for rule_id in rule_ids if rule_id not in existing],
+                ignore_conflicts=True
+            )
+            now = timezone.now()
+            for rule_id, (evaluations, fires, total_ns, max_ns, last_fired) in pending.items():
+                if rule_id not in rule_ids:
+                    continue
+                changes = {
+                    'evaluation_count': F('evaluation_count') + evaluations,
+                    'fire_count': F('fire_count') + fires,
+                    'total_evaluation_seconds': F('total_evaluation_seconds') + total_ns / 1e9,
+                    'max_evaluation_seconds': Greatest('max_evaluation_seconds', max_ns / 1e9),
+                    'updated_at': now,
+                }
+                if last_fired is not None:
+                    changes['last_fired_at'] = Greatest(Coalesce('last_fired_at', last_fired), last_fired)
+                RuleStats.objects.filter(rule_id=rule_id).update(**changes)
+        return len(rule_ids)
+
+
+rule_metrics = RuleMetrics()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        rule_metrics.flush()
+    except Exception:
+        logger.exception('Could not flush rule metrics on exit')
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adaptive_engine', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RuleSetVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, help_text='Incremented on every change to the adaptive rule set')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Rule set version',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adaptive_engine', '0002_rulesetversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSignalState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('engagement_samples', models.PositiveIntegerField(default=0, help_text='Number of EngagementMetric samples folded into this state')),
+                ('idle_ratio_ewma', models.FloatField(default=0.0, help_text='Exponentially weighted moving average of idle_ratio')),
+                ('last_engagement_at', models.DateTimeField(blank=True, help_text='Timestamp of the latest EngagementMetric sample', null=True)),
+                ('sensory_samples', models.PositiveIntegerField(default=0, help_text='Number of SensoryLog samples folded into this state')),
+                ('mood_score_mean', models.FloatField(default=0.0, help_text='Exponentially weighted moving mean of mood_score')),
+                ('recent_overload_count', models.FloatField(default=0.0, help_text='Count of sensory overload flags, decayed with ADAPTIVE_OVERLOAD_HALF_LIFE_SECONDS')),
+                ('last_overload_at', models.DateTimeField(blank=True, help_text='When the user last reported sensory overload', null=True)),
+                ('last_sensory_at', models.DateTimeField(blank=True, help_text='Timestamp of the latest SensoryLog sample', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(help_text='The user these rolling aggregates belong to', on_delete=django.db.models.deletion.CASCADE, related_name='signal_state', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adaptive_engine', '0003_usersignalstate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Label of the raw model being compacted (e.g. "adaptive_engine.EngagementMetric")', max_length=100, unique=True)),
+                ('last_id', models.BigIntegerField(default=0, help_text='Highest raw row id included in the rollups')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EngagementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], help_text='Length of the rollup bucket', max_length=10)),
+                ('bucket_start', models.DateTimeField(help_text='Start of the hour or day this rollup covers')),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('time_on_task_mean', models.FloatField(default=0.0)),
+                ('time_on_task_min', models.FloatField(default=0.0)),
+                ('time_on_task_max', models.FloatField(default=0.0)),
+                ('completion_rate_mean', models.FloatField(default=0.0)),
+                ('completion_rate_min', models.FloatField(default=0.0)),
+                ('completion_rate_max', models.FloatField(default=0.0)),
+                ('idle_ratio_mean', models.FloatField(default=0.0)),
+                ('idle_ratio_min', models.FloatField(default=0.0)),
+                ('idle_ratio_max', models.FloatField(default=0.0)),
+                ('user', models.ForeignKey(help_text='The user whose engagement is summarized', on_delete=django.db.models.deletion.CASCADE, related_name='engagement_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'period', 'bucket_start'), name='unique_engagement_rollup_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SensoryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], help_text='Length of the rollup bucket', max_length=10)),
+                ('bucket_start', models.DateTimeField(help_text='Start of the hour or day this rollup covers')),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('mood_score_mean', models.FloatField(default=0.0)),
+                ('mood_score_min', models.FloatField(default=0.0)),
+                ('mood_score_max', models.FloatField(default=0.0)),
+                ('overload_count', models.PositiveIntegerField(default=0, help_text='Number of samples with sensory_overload_flag set')),
+                ('user', models.ForeignKey(help_text='The user whose sensory state is summarized', on_delete=django.db.models.deletion.CASCADE, related_name='sensory_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'period', 'bucket_start'), name='unique_sensory_rollup_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adaptive_engine', '0004_signal_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adaptiverule',
+            name='cooldown_seconds',
+            field=models.PositiveIntegerField(default=300, help_text='Minimum time between two recorded firings of this rule for the same user'),
+        ),
+        migrations.CreateModel(
+            name='TriggerEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inputs', models.JSONField(default=dict, help_text='Signals the rule was evaluated against')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now, help_text='When the rule fired')),
+                ('rule', models.ForeignKey(help_text='The rule that fired', on_delete=django.db.models.deletion.CASCADE, related_name='trigger_events', to='adaptive_engine.adaptiverule')),
+                ('user', models.ForeignKey(help_text='The user the rule fired for', on_delete=django.db.models.deletion.CASCADE, related_name='trigger_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['user', 'timestamp'], name='adaptive_en_user_id_bbc135_idx'), models.Index(fields=['rule', 'timestamp'], name='adaptive_en_rule_id_0f39eb_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adaptive_engine', '0005_triggerevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RuleEvaluationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signals', models.JSONField(default=dict, help_text='Signals captured at ingestion time')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('failed', 'Failed')], default='pending', help_text='Pending jobs are picked up by workers; failed jobs exhausted their attempts', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of failed processing attempts')),
+                ('last_error', models.TextField(blank=True, help_text='Error raised by the last failed attempt')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(help_text='The user whose signals should be evaluated', on_delete=django.db.models.deletion.CASCADE, related_name='rule_evaluation_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='adaptive_en_status_86a00d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adaptive_engine', '0006_ruleevaluationjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAdaptation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signals', models.JSONField(default=dict, help_text='Latest known value of every signal for the user')),
+                ('fired_rules', models.JSONField(default=list, help_text='Names of the rules currently in effect')),
+                ('modifiers', models.JSONField(default=dict, help_text='Merged modifiers of the rules currently in effect')),
+                ('rule_set_version', models.PositiveBigIntegerField(default=0, help_text='Rule set version the adaptations were computed with')),
+                ('etag', models.CharField(blank=True, help_text='Strong ETag of the served adaptation document', max_length=66)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(help_text='The user these adaptations apply to', on_delete=django.db.models.deletion.CASCADE, related_name='adaptation', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
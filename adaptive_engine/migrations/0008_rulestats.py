@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adaptive_engine', '0007_useradaptation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RuleStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('evaluation_count', models.PositiveBigIntegerField(default=0, help_text='Number of times the rule condition was evaluated')),
+                ('fire_count', models.PositiveBigIntegerField(default=0, help_text='Number of evaluations where the rule fired')),
+                ('total_evaluation_seconds', models.FloatField(default=0.0, help_text='Cumulative time spent evaluating the rule condition')),
+                ('max_evaluation_seconds', models.FloatField(default=0.0, help_text='Slowest single evaluation of the rule condition')),
+                ('last_fired_at', models.DateTimeField(blank=True, help_text='When the rule last fired', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('rule', models.OneToOneField(help_text='The rule these counters belong to', on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='adaptive_engine.adaptiverule')),
+            ],
+            options={
+                'verbose_name': 'Rule stats',
+                'verbose_name_plural': 'Rule stats',
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adaptive_engine', '0008_rulestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersignalstate',
+            name='baseline_samples',
+            field=models.PositiveIntegerField(default=0, help_text='Number of EngagementMetric samples in the engagement baseline'),
+        ),
+        migrations.AddField(
+            model_name='usersignalstate',
+            name='completion_rate_m2',
+            field=models.FloatField(default=0.0, help_text='Running sum of squared deviations of completion_rate'),
+        ),
+        migrations.AddField(
+            model_name='usersignalstate',
+            name='completion_rate_mean',
+            field=models.FloatField(default=0.0, help_text='Running mean of completion_rate'),
+        ),
+        migrations.AddField(
+            model_name='usersignalstate',
+            name='idle_ratio_m2',
+            field=models.FloatField(default=0.0, help_text='Running sum of squared deviations of idle_ratio'),
+        ),
+        migrations.AddField(
+            model_name='usersignalstate',
+            name='idle_ratio_mean',
+            field=models.FloatField(default=0.0, help_text='Running mean of idle_ratio'),
+        ),
+        migrations.AddField(
+            model_name='usersignalstate',
+            name='time_on_task_m2',
+            field=models.FloatField(default=0.0, help_text='Running sum of squared deviations of time_on_task'),
+        ),
+        migrations.AddField(
+            model_name='usersignalstate',
+            name='time_on_task_mean',
+            field=models.FloatField(default=0.0, help_text='Running mean of time_on_task'),
+        ),
+    ]
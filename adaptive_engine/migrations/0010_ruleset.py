@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adaptive_engine', '0009_usersignalstate_baseline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RuleSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(help_text='Sequential rule set number', unique=True)),
+                ('rules', models.JSONField(default=list, help_text='Snapshot of each rule: id, name, condition, action_payload, cooldown_seconds, updated_at')),
+                ('note', models.CharField(blank=True, help_text='What changed in this rule set', max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-number'],
+            },
+        ),
+        migrations.AddField(
+            model_name='rulesetversion',
+            name='rule_set',
+            field=models.ForeignKey(blank=True, help_text='Published rule set served by every worker (empty: serve the live rules)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='adaptive_engine.ruleset'),
+        ),
+    ]
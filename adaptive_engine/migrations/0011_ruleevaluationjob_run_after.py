@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adaptive_engine', '0010_ruleset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ruleevaluationjob',
+            name='run_after',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='The job is not picked up before this time (pushed back after each failed attempt)'),
+        ),
+    ]
@@ -1,6 +1,17 @@
-from django.db import models
+import logging
+import math
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from core.models import User
+from .conditions import ConditionSyntaxError, parse_condition
+
+logger = logging.getLogger(__name__)
 
 
 class EngagementMetric(models.Model):
@@ -112,12 +123,770 @@ class AdaptiveRule(models.Model):
         help_text='Whether this rule is currently active'
     )
     
+    cooldown_seconds = models.PositiveIntegerField(
+        default=300,
+        help_text='Minimum time between two recorded firings of this rule for the same user'
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['name']
     
+    def clean(self):
+        """Reject conditions the rule engine cannot parse."""
+        try:
+            parse_condition(self.condition)
+        except ConditionSyntaxError as e:
+            raise ValidationError({'condition': str(e)})
+    
     def __str__(self):
         status = "Active" if self.is_active else "Inactive"
         return f"{self.name} ({status})"
+
+
+class RuleSet(models.Model):
+    """
+    RuleSet is an immutable, numbered snapshot of the active adaptive rules.
+    
+    Once a rule set has been published, workers serve the rule set that
+    RuleSetVersion points to, so edits to AdaptiveRule rows only take effect
+    when a new rule set is published. Rolling back means pointing
+    RuleSetVersion at an earlier rule set.
+    """
+    number = models.PositiveIntegerField(
+        unique=True,
+        help_text='Sequential rule set number'
+    )
+    
+    rules = models.JSONField(
+        default=list,
+        help_text='Snapshot of each rule: id, name, condition, action_payload, cooldown_seconds, updated_at'
+    )
+    
+    note = models.CharField(
+        max_length=200,
+        blank=True,
+        help_text='What changed in this rule set'
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-number']
+    
+    def __str__(self):
+        return f"Rule set #{self.number} ({len(self.rules)} rules)"
+    
+    @classmethod
+    def publish(cls, note=''):
+        """
+        Snapshot the active AdaptiveRules as a new rule set and make it
+        current. Raises ValidationError if any active rule cannot be parsed.
+        """
+        with transaction.atomic():
+            # Locking the pointer row serializes concurrent publishers
+            RuleSetVersion.objects.select_for_update().filter(pk=RuleSetVersion.SINGLETON_ID).first()
+            rules = list(AdaptiveRule.objects.filter(is_active=True))
+            errors = []
+            for rule in rules:
+                try:
+                    parse_condition(rule.condition)
+                except ConditionSyntaxError as e:
+                    errors.append(f'{rule.name}: {e}')
+            if errors:
+                raise ValidationError(errors)
+            
+            number = (cls.objects.aggregate(number=Max('number'))['number'] or 0) + 1
+            rule_set = cls.objects.create(
+                number=number,
+                rules=[
+                    {
+                        'id': rule.pk,
+                        'name': rule.name,
+                        'condition': rule.condition,
+                        'action_payload': rule.action_payload,
+                        'cooldown_seconds': rule.cooldown_seconds,
+                        'updated_at': rule.updated_at.isoformat(),
+                    }
+                    for rule in rules
+                ],
+                note=note
+            )
+            rule_set.activate()
+        return rule_set
+    
+    def activate(self):
+        """Make this rule set the one every worker serves (publish or roll back)."""
+        RuleSetVersion.bump(rule_set=self)
+    
+    def build_rules(self):
+        """
+        Return in-memory AdaptiveRule instances for the snapshot. Rules that
+        were deleted since the snapshot (possible for rule sets that are not
+        being served) are left out, since firings must reference a stored rule.
+        """
+        existing = set(
+            AdaptiveRule.objects.filter(pk__in=[rule['id'] for rule in self.rules]).values_list('pk', flat=True)
+        )
+        for rule in self.rules:
+            if rule['id'] not in existing:
+                logger.warning('%s: skipping deleted rule %s', self, rule['name'])
+        return [
+            AdaptiveRule(
+                pk=rule['id'],
+                name=rule['name'],
+                condition=rule['condition'],
+                action_payload=rule['action_payload'],
+                cooldown_seconds=rule['cooldown_seconds'],
+                is_active=True,
+                updated_at=parse_datetime(rule['updated_at'])
+            )
+            for rule in self.rules
+            if rule['id'] in existing
+        ]
+
+
+class RuleSetVersion(models.Model):
+    """
+    Single-row counter identifying the current version of the adaptive rule set.
+    Bumped whenever the served rules change so that every worker's in-memory
+    rule registry can tell, with one cheap query, that it is stale.
+    
+    It is also the pointer to the published RuleSet workers serve. While no
+    rule set was ever published, workers serve the active AdaptiveRule rows
+    directly and every rule edit bumps the version.
+    """
+    version = models.PositiveBigIntegerField(
+        default=0,
+        help_text='Incremented on every change to the adaptive rule set'
+    )
+    
+    rule_set = models.ForeignKey(
+        RuleSet,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text='Published rule set served by every worker (empty: serve the live rules)'
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    SINGLETON_ID = 1
+    
+    class Meta:
+        verbose_name = 'Rule set version'
+    
+    def __str__(self):
+        return f"Rule set version {self.version}"
+    
+    @classmethod
+    def current(cls):
+        """Return the current rule set version (0 if rules were never changed)."""
+        return cls.pointer()[0]
+    
+    @classmethod
+    def pointer(cls):
+        """Return ``(version, rule_set_id)``; rule_set_id is None while serving live rules."""
+        row = cls.objects.filter(pk=cls.SINGLETON_ID).values_list('version', 'rule_set_id').first()
+        return row or (0, None)
+    
+    @classmethod
+    def bump(cls, **fields):
+        """
+        Increment the rule set version, creating the counter row if needed.
+        Extra ``fields`` (e.g. ``rule_set``) are updated in the same statement.
+        """
+        updated = cls.objects.filter(pk=cls.SINGLETON_ID).update(
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+            **fields
+        )
+        if not updated:
+            counter, created = cls.objects.get_or_create(
+                pk=cls.SINGLETON_ID,
+                defaults={'version': 1, **fields}
+            )
+            if not created:
+                cls.objects.filter(pk=cls.SINGLETON_ID).update(
+                    version=F('version') + 1,
+                    updated_at=timezone.now(),
+                    **fields
+                )
+    
+    @classmethod
+    def served_rule_ids(cls):
+        """Return the ids of the rules in the served RuleSet (empty while serving live rules)."""
+        rules = cls.objects.filter(pk=cls.SINGLETON_ID).values_list('rule_set__rules', flat=True).first()
+        return {rule['id'] for rule in rules or ()}
+    
+    @classmethod
+    def rules_changed(cls):
+        """
+        Record an edit to the AdaptiveRule rows. Bumps the version only while
+        workers serve the live rules; once a rule set is published, edits
+        wait for the next publish. Returns whether the version was bumped.
+        """
+        if cls.objects.filter(pk=cls.SINGLETON_ID, rule_set__isnull=False).exists():
+            return False
+        cls.bump()
+        return True
+
+
+class UserSignalState(models.Model):
+    """
+    UserSignalState keeps rolling aggregates of a user's engagement and sensory
+    signals, updated in O(1) as each sample is ingested so that triggers can
+    use trends without querying the user's history.
+    
+    It also holds the user's engagement baseline: a running mean and sum of
+    squared deviations (Welford's algorithm) of each BASELINE_FIELDS value,
+    so detectors can judge a sample against the learner's own history.
+    """
+    # EngagementMetric fields with a per-user baseline, and the smallest
+    # standard deviation used for their z-scores (so a very steady learner
+    # does not fire on tiny changes)
+    BASELINE_MIN_STDDEV = {
+        'time_on_task': 1.0,
+        'completion_rate': 5.0,
+        'idle_ratio': 0.05,
+    }
+    
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='signal_state',
+        help_text='The user these rolling aggregates belong to'
+    )
+    
+    engagement_samples = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of EngagementMetric samples folded into this state'
+    )
+    
+    idle_ratio_ewma = models.FloatField(
+        default=0.0,
+        help_text='Exponentially weighted moving average of idle_ratio'
+    )
+    
+    last_engagement_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Timestamp of the latest EngagementMetric sample'
+    )
+    
+    sensory_samples = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of SensoryLog samples folded into this state'
+    )
+    
+    mood_score_mean = models.FloatField(
+        default=0.0,
+        help_text='Exponentially weighted moving mean of mood_score'
+    )
+    
+    recent_overload_count = models.FloatField(
+        default=0.0,
+        help_text='Count of sensory overload flags, decayed with ADAPTIVE_OVERLOAD_HALF_LIFE_SECONDS'
+    )
+    
+    last_overload_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When the user last reported sensory overload'
+    )
+    
+    last_sensory_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Timestamp of the latest SensoryLog sample'
+    )
+    
+    baseline_samples = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of EngagementMetric samples in the engagement baseline'
+    )
+    
+    time_on_task_mean = models.FloatField(
+        default=0.0,
+        help_text='Running mean of time_on_task'
+    )
+    
+    time_on_task_m2 = models.FloatField(
+        default=0.0,
+        help_text='Running sum of squared deviations of time_on_task'
+    )
+    
+    completion_rate_mean = models.FloatField(
+        default=0.0,
+        help_text='Running mean of completion_rate'
+    )
+    
+    completion_rate_m2 = models.FloatField(
+        default=0.0,
+        help_text='Running sum of squared deviations of completion_rate'
+    )
+    
+    idle_ratio_mean = models.FloatField(
+        default=0.0,
+        help_text='Running mean of idle_ratio'
+    )
+    
+    idle_ratio_m2 = models.FloatField(
+        default=0.0,
+        help_text='Running sum of squared deviations of idle_ratio'
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Signal state for {self.user.email}"
+    
+    @classmethod
+    def record(cls, user, metrics=(), logs=()):
+        """
+        Fold new EngagementMetric and SensoryLog samples into the user's state.
+        The row is locked for the update so concurrent ingestion does not lose samples.
+        """
+        with transaction.atomic():
+            state, created = cls.objects.select_for_update().get_or_create(user=user)
+            for metric in sorted(metrics, key=lambda m: m.timestamp):
+                state.add_engagement(metric)
+            for log in sorted(logs, key=lambda l: l.timestamp):
+                state.add_sensory(log)
+            state.save()
+        return state
+    
+    def add_engagement(self, metric):
+        """
+        Update the engagement aggregates and baseline with one sample.
+        The sample's z-scores against the baseline *before* it was added are
+        left on ``metric.baseline_zscores`` for the detectors (see
+        engine.engagement_signals).
+        """
+        metric.baseline_zscores = self.baseline_zscores(metric)
+        
+        alpha = settings.ADAPTIVE_IDLE_RATIO_EWMA_ALPHA
+        if self.engagement_samples == 0:
+            self.idle_ratio_ewma = metric.idle_ratio
+        else:
+            self.idle_ratio_ewma += alpha * (metric.idle_ratio - self.idle_ratio_ewma)
+        self.engagement_samples += 1
+        self.last_engagement_at = metric.timestamp
+        
+        # Welford's update of the running mean and sum of squared deviations
+        self.baseline_samples += 1
+        for field in self.BASELINE_MIN_STDDEV:
+            value = getattr(metric, field)
+            mean = getattr(self, f'{field}_mean')
+            delta = value - mean
+            mean += delta / self.baseline_samples
+            setattr(self, f'{field}_mean', mean)
+            setattr(self, f'{field}_m2', getattr(self, f'{field}_m2') + delta * (value - mean))
+    
+    def baseline_zscores(self, metric):
+        """
+        Return ``{field: z-score}`` of an EngagementMetric against the
+        baseline, or None while the baseline has fewer than
+        ADAPTIVE_BASELINE_MIN_SAMPLES samples.
+        """
+        samples = self.baseline_samples
+        if samples < max(settings.ADAPTIVE_BASELINE_MIN_SAMPLES, 2):
+            return None
+        zscores = {}
+        for field, min_stddev in self.BASELINE_MIN_STDDEV.items():
+            variance = max(getattr(self, f'{field}_m2'), 0.0) / (samples - 1)
+            stddev = max(math.sqrt(variance), min_stddev)
+            zscores[field] = (getattr(metric, field) - getattr(self, f'{field}_mean')) / stddev
+        return zscores
+    
+    def latest_baseline_zscores(self, metric):
+        """
+        Return the z-scores ``add_engagement`` left on ``metric`` when it was
+        ingested. If it is the latest sample folded into the baseline, its
+        Welford update is reversed to recover the baseline before it;
+        otherwise the current baseline is used.
+        """
+        samples = self.baseline_samples
+        if samples < 2 or metric.timestamp != self.last_engagement_at:
+            return self.baseline_zscores(metric)
+        previous = UserSignalState(baseline_samples=samples - 1)
+        for field in self.BASELINE_MIN_STDDEV:
+            value = getattr(metric, field)
+            mean = getattr(self, f'{field}_mean')
+            previous_mean = (samples * mean - value) / (samples - 1)
+            setattr(previous, f'{field}_mean', previous_mean)
+            setattr(previous, f'{field}_m2', getattr(self, f'{field}_m2') - (value - previous_mean) * (value - mean))
+        return previous.baseline_zscores(metric)
+    
+    def latest_sample_at(self):
+        """Return when the latest engagement or sensory sample was taken (None if none)."""
+        return max(
+            (at for at in (self.last_engagement_at, self.last_sensory_at) if at is not None),
+            default=None
+        )
+    
+    def add_sensory(self, log):
+        """Update the sensory aggregates with one sample."""
+        alpha = settings.ADAPTIVE_MOOD_MEAN_ALPHA
+        if self.sensory_samples == 0:
+            self.mood_score_mean = log.mood_score
+        else:
+            self.mood_score_mean += alpha * (log.mood_score - self.mood_score_mean)
+        self.recent_overload_count = self.decayed_overload_count(log.timestamp)
+        if log.sensory_overload_flag:
+            self.recent_overload_count += 1.0
+            self.last_overload_at = log.timestamp
+        self.sensory_samples += 1
+        self.last_sensory_at = log.timestamp
+    
+    def decayed_overload_count(self, now):
+        """Return recent_overload_count decayed from the last sensory sample to ``now``."""
+        if self.last_sensory_at is None or not self.recent_overload_count:
+            return self.recent_overload_count
+        elapsed = max((now - self.last_sensory_at).total_seconds(), 0.0)
+        return self.recent_overload_count * 0.5 ** (elapsed / settings.ADAPTIVE_OVERLOAD_HALF_LIFE_SECONDS)
+    
+    def trend_signals(self, now=None):
+        """Return the rolling aggregates as signals rules can reference."""
+        now = now or timezone.now()
+        signals = {}
+        if self.engagement_samples:
+            signals['idle_ratio_trend'] = self.idle_ratio_ewma
+        if self.sensory_samples:
+            signals['mood_score_trend'] = self.mood_score_mean
+            signals['recent_overload_count'] = self.decayed_overload_count(now)
+        if self.last_overload_at is not None:
+            signals['seconds_since_overload'] = max((now - self.last_overload_at).total_seconds(), 0.0)
+        return signals
+
+
+ROLLUP_PERIOD_CHOICES = [
+    ('hour', 'Hour'),
+    ('day', 'Day'),
+]
+
+
+class EngagementRollup(models.Model):
+    """
+    EngagementRollup summarizes a user's EngagementMetric samples per hour or per day.
+    Filled incrementally by the compact_signals management command.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='engagement_rollups',
+        help_text='The user whose engagement is summarized'
+    )
+    
+    period = models.CharField(
+        max_length=10,
+        choices=ROLLUP_PERIOD_CHOICES,
+        help_text='Length of the rollup bucket'
+    )
+    
+    bucket_start = models.DateTimeField(
+        help_text='Start of the hour or day this rollup covers'
+    )
+    
+    sample_count = models.PositiveIntegerField(default=0)
+    
+    time_on_task_mean = models.FloatField(default=0.0)
+    time_on_task_min = models.FloatField(default=0.0)
+    time_on_task_max = models.FloatField(default=0.0)
+    
+    completion_rate_mean = models.FloatField(default=0.0)
+    completion_rate_min = models.FloatField(default=0.0)
+    completion_rate_max = models.FloatField(default=0.0)
+    
+    idle_ratio_mean = models.FloatField(default=0.0)
+    idle_ratio_min = models.FloatField(default=0.0)
+    idle_ratio_max = models.FloatField(default=0.0)
+    
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'period', 'bucket_start'],
+                name='unique_engagement_rollup_bucket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.email} - {self.period} {self.bucket_start.strftime('%Y-%m-%d %H:%M')} ({self.sample_count} samples)"
+
+
+class SensoryRollup(models.Model):
+    """
+    SensoryRollup summarizes a user's SensoryLog samples per hour or per day.
+    Filled incrementally by the compact_signals management command.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='sensory_rollups',
+        help_text='The user whose sensory state is summarized'
+    )
+    
+    period = models.CharField(
+        max_length=10,
+        choices=ROLLUP_PERIOD_CHOICES,
+        help_text='Length of the rollup bucket'
+    )
+    
+    bucket_start = models.DateTimeField(
+        help_text='Start of the hour or day this rollup covers'
+    )
+    
+    sample_count = models.PositiveIntegerField(default=0)
+    
+    mood_score_mean = models.FloatField(default=0.0)
+    mood_score_min = models.FloatField(default=0.0)
+    mood_score_max = models.FloatField(default=0.0)
+    
+    overload_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of samples with sensory_overload_flag set'
+    )
+    
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'period', 'bucket_start'],
+                name='unique_sensory_rollup_bucket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.email} - {self.period} {self.bucket_start.strftime('%Y-%m-%d %H:%M')} ({self.sample_count} samples)"
+
+
+class RollupWatermark(models.Model):
+    """
+    High-water mark of raw rows already folded into rollups, one row per source model.
+    """
+    source = models.CharField(
+        max_length=100,
+        unique=True,
+        help_text='Label of the raw model being compacted (e.g. "adaptive_engine.EngagementMetric")'
+    )
+    
+    last_id = models.BigIntegerField(
+        default=0,
+        help_text='Highest raw row id included in the rollups'
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.source} compacted through id {self.last_id}"
+
+
+class TriggerEvent(models.Model):
+    """
+    TriggerEvent records that an AdaptiveRule fired for a user, with the
+    signals it fired on. Repeated firings within the rule's cooldown window
+    are not recorded.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='trigger_events',
+        help_text='The user the rule fired for'
+    )
+    
+    rule = models.ForeignKey(
+        AdaptiveRule,
+        on_delete=models.CASCADE,
+        related_name='trigger_events',
+        help_text='The rule that fired'
+    )
+    
+    inputs = models.JSONField(
+        default=dict,
+        help_text='Signals the rule was evaluated against'
+    )
+    
+    timestamp = models.DateTimeField(
+        default=timezone.now,
+        help_text='When the rule fired'
+    )
+    
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', 'timestamp']),
+            models.Index(fields=['rule', 'timestamp']),
+        ]
+    
+    def __str__(self):
+        return f"{self.rule.name} fired for {self.user.email} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+
+
+class RuleEvaluationJob(models.Model):
+    """
+    RuleEvaluationJob is a queued request to evaluate the adaptive rules for a
+    user's signals outside the request that ingested them. Jobs are drained by
+    the process_rule_jobs management command and deleted once processed.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='rule_evaluation_jobs',
+        help_text='The user whose signals should be evaluated'
+    )
+    
+    signals = models.JSONField(
+        default=dict,
+        help_text='Signals captured at ingestion time'
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        help_text='Pending jobs are picked up by workers; failed jobs exhausted their attempts'
+    )
+    
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of failed processing attempts'
+    )
+    
+    last_error = models.TextField(
+        blank=True,
+        help_text='Error raised by the last failed attempt'
+    )
+    
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        help_text='The job is not picked up before this time (pushed back after each failed attempt)'
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"Rule evaluation for {self.user.email} ({self.get_status_display()})"
+
+
+class UserAdaptation(models.Model):
+    """
+    UserAdaptation is the materialized set of adaptations currently in effect
+    for a user: the rules that fire on the user's latest signals and their
+    merged modifiers. It is recomputed only when the user's signals, their
+    NeuroProfile or the rule set change, and served with a strong ETag.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='adaptation',
+        help_text='The user these adaptations apply to'
+    )
+    
+    signals = models.JSONField(
+        default=dict,
+        help_text='Latest known value of every signal for the user'
+    )
+    
+    fired_rules = models.JSONField(
+        default=list,
+        help_text='Names of the rules currently in effect'
+    )
+    
+    modifiers = models.JSONField(
+        default=dict,
+        help_text='Merged modifiers of the rules currently in effect'
+    )
+    
+    rule_set_version = models.PositiveBigIntegerField(
+        default=0,
+        help_text='Rule set version the adaptations were computed with'
+    )
+    
+    etag = models.CharField(
+        max_length=66,
+        blank=True,
+        help_text='Strong ETag of the served adaptation document'
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Adaptations for {self.user.email} ({len(self.fired_rules)} rules)"
+    
+    def document(self):
+        """Return the adaptation document served to the frontend."""
+        return {
+            'rules': self.fired_rules,
+            'modifiers': self.modifiers,
+        }
+
+
+class RuleStats(models.Model):
+    """
+    RuleStats holds evaluation counters for an AdaptiveRule, aggregated in
+    each worker process and periodically added here.
+    """
+    rule = models.OneToOneField(
+        AdaptiveRule,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        help_text='The rule these counters belong to'
+    )
+    
+    evaluation_count = models.PositiveBigIntegerField(
+        default=0,
+        help_text='Number of times the rule condition was evaluated'
+    )
+    
+    fire_count = models.PositiveBigIntegerField(
+        default=0,
+        help_text='Number of evaluations where the rule fired'
+    )
+    
+    total_evaluation_seconds = models.FloatField(
+        default=0.0,
+        help_text='Cumulative time spent evaluating the rule condition'
+    )
+    
+    max_evaluation_seconds = models.FloatField(
+        default=0.0,
+        help_text='Slowest single evaluation of the rule condition'
+    )
+    
+    last_fired_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When the rule last fired'
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Rule stats'
+        verbose_name_plural = 'Rule stats'
+    
+    def __str__(self):
+        return f"Stats for {self.rule.name}: {self.fire_count}/{self.evaluation_count} fired"
+    
+    @property
+    def mean_evaluation_seconds(self):
+        if not self.evaluation_count:
+            return 0.0
+        return self.total_evaluation_seconds / self.evaluation_count
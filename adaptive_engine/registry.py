@@ -0,0 +1,187 @@
+"""
+Process-local registry of active AdaptiveRules.
+
+Each worker process loads and compiles the active rules once and keeps them
+in memory, so evaluating a signal does not hit the database for rules. The
+registry stays correct across workers by comparing its loaded version with
+RuleSetVersion, a single-row counter bumped on every rule change. That check
+runs at most once per request (see ``mark_stale``) or, outside requests, once
+every ``ADAPTIVE_RULES_VERSION_CHECK_SECONDS``.
+
+When rules load the registry also builds an inverted index from each signal
+name and profile tag to the rules that read it, so an event only evaluates
+the rules whose inputs it carries.
+
+Once a RuleSet has been published, the registry serves the snapshot
+RuleSetVersion points to instead of the live AdaptiveRule rows, so a publish
+or rollback switches every worker to a complete rule set at once. Compiled
+snapshots are kept per process, so flipping back to a recently served rule
+set does not parse anything.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from core.models import profile_tag_names
+from .conditions import ConditionSyntaxError, get_compiled
+from .models import AdaptiveRule, RuleSet, RuleSetVersion
+
+DEFAULT_VERSION_CHECK_SECONDS = 5.0
+
+# Compiled rule set snapshots kept per process for instant rollbacks
+COMPILED_RULE_SETS_KEPT = 4
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledRule:
+    """An AdaptiveRule paired with its compiled condition predicate."""
+    __slots__ = ('rule', 'predicate', 'references', 'tree')
+
+    def __init__(self, rule, predicate, references=frozenset(), tree=None):
+        self.rule = rule
+        self.predicate = predicate
+        self.references = references
+        self.tree = tree
+
+    @property
+    def name(self):
+        return self.rule.name
+
+    def __repr__(self):
+        return f"<CompiledRule {self.rule.name}>"
+
+
+class RuleIndex:
+    """
+    Inverted index from rule inputs to compiled rules.
+
+    Keys are signal names (``"fidgeting_detected"``) and ``(name, value)``
+    pairs for ``.contains()`` checks (``("learner_profile", "adhd_profile")``).
+    A rule whose inputs are all absent from an event evaluates exactly as it
+    would against an empty signal dict, so only rules that are already true
+    for ``{}`` (e.g. ``!some_signal``) need evaluating on every event.
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self._by_input = {}
+        always = []
+        for position, compiled in enumerate(self.rules):
+            for key in compiled.references:
+                self._by_input.setdefault(key, []).append(position)
+            if compiled.predicate({}):
+                always.append(position)
+        self._always = frozenset(always)
+
+    def candidates(self, signals):
+        """Return the rules that could fire for this event, in library order."""
+        positions = set(self._always)
+        by_input = self._by_input
+        for name, value in signals.items():
+            positions.update(by_input.get(name, ()))
+            if isinstance(value, (set, frozenset, list, tuple)):
+                for item in value:
+                    positions.update(by_input.get((name, item), ()))
+            elif type(value) is int and value > 0:
+                for item in profile_tag_names(value):
+                    positions.update(by_input.get((name, item), ()))
+        rules = self.rules
+        return [rules[position] for position in sorted(positions)]
+
+
+class RuleRegistry:
+    """In-memory, version-checked cache of compiled active rules."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = RuleIndex(())
+        self._version = None
+        self._rule_set_id = None
+        self._rule_sets = OrderedDict()
+        self._checked_at = 0.0
+        self._check_pending = True
+
+    @property
+    def version(self):
+        """Rule set version currently loaded (None before the first load)."""
+        return self._version
+
+    @property
+    def rule_set_id(self):
+        """Id of the published RuleSet being served (None when serving live rules)."""
+        return self._rule_set_id
+
+    def mark_stale(self):
+        """Ask for a version check on the next access (called at request start)."""
+        self._check_pending = True
+
+    def invalidate(self):
+        """Force a full reload on the next access, recompiling published rule sets too."""
+        with self._lock:
+            self._version = None
+            self._rule_sets.clear()
+            self._check_pending = True
+
+    def rules(self):
+        """Return the compiled active rules, reloading them if the version changed."""
+        return self.index().rules
+
+    def candidates(self, signals):
+        """Return only the compiled rules that read an input present in ``signals``."""
+        return self.index().candidates(signals)
+
+    def index(self):
+        """Return the current RuleIndex, reloading rules if the version changed."""
+        max_age = getattr(settings, 'ADAPTIVE_RULES_VERSION_CHECK_SECONDS', DEFAULT_VERSION_CHECK_SECONDS)
+        if (
+            self._check_pending
+            or self._version is None
+            or time.monotonic() - self._checked_at > max_age
+        ):
+            self._refresh()
+        return self._index
+
+    def _refresh(self):
+        with self._lock:
+            version, rule_set_id = RuleSetVersion.pointer()
+            self._checked_at = time.monotonic()
+            self._check_pending = False
+            if version == self._version:
+                return
+            if rule_set_id is None:
+                index = RuleIndex(self._compile(AdaptiveRule.objects.filter(is_active=True)))
+            else:
+                index = self._rule_set_index(rule_set_id)
+            self._index = index
+            self._version = version
+            self._rule_set_id = rule_set_id
+
+    def _rule_set_index(self, rule_set_id):
+        """Return the RuleIndex of a published rule set, compiling it on first use."""
+        index = self._rule_sets.get(rule_set_id)
+        if index is None:
+            rule_set = RuleSet.objects.get(pk=rule_set_id)
+            index = self._rule_sets[rule_set_id] = RuleIndex(self._compile(rule_set.build_rules()))
+            while len(self._rule_sets) > COMPILED_RULE_SETS_KEPT:
+                self._rule_sets.popitem(last=False)
+        else:
+            self._rule_sets.move_to_end(rule_set_id)
+        return index
+
+    @staticmethod
+    def _compile(rules):
+        compiled = []
+        for rule in rules:
+            try:
+                predicate, references, tree = get_compiled(rule)
+                compiled.append(CompiledRule(rule, predicate, references, tree))
+            except ConditionSyntaxError as e:
+                logger.warning('Skipping rule %s: %s', rule.name, e)
+        return tuple(compiled)
+
+
+rule_registry = RuleRegistry()
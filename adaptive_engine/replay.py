@@ -0,0 +1,191 @@
+"""
+Offline replay of historical signals against two rule sets.
+
+``replay_shard`` streams the EngagementMetric and SensoryLog rows of one
+user-id shard in (user, timestamp) order with ``.iterator()``, rebuilds each
+user's rolling signal state and adaptation snapshot the way the live
+ingestion path does, and evaluates both rule sets on the snapshot after every
+event. Only one user's state is held at a time, so memory stays bounded by the
+iterator chunk size whatever the length of the replay window.
+
+Shards are independent (``user_id % shard_count``), so ``replay`` runs them
+in a process pool. Each shard returns the users whose adaptations differ
+between the two rule sets and how often each rule fired.
+"""
+import heapq
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections
+from django.db.models.functions import Mod
+
+from core.models import NeuroProfile
+from .adaptations import preference_signals
+from .conditions import parse_condition
+from .engine import engagement_signals, sensory_signals
+from .models import EngagementMetric, SensoryLog, UserSignalState
+
+
+def rule_set_from_rules(rules):
+    """Return ``{name: condition}`` for AdaptiveRule objects."""
+    return {rule.name: rule.condition for rule in rules}
+
+
+def rule_set_from_data(rules_data):
+    """
+    Return ``{name: condition}`` for a rules library in the AI_RULES_DATA
+    format (``{name: {"trigger": ..., "action": ..., ...}}``). Entries with
+    ``"is_active": false`` are left out.
+    """
+    return {
+        name: rule_data.get('trigger', '')
+        for name, rule_data in rules_data.items()
+        if rule_data.get('is_active', True)
+    }
+
+
+def _compile_rule_set(rule_set):
+    """Compile ``{name: condition}`` into ``[(name, evaluate)]``."""
+    return [(name, parse_condition(condition).compile()) for name, condition in sorted(rule_set.items())]
+
+
+def _shard(queryset, shard, shard_count):
+    if shard_count > 1:
+        queryset = queryset.alias(shard=Mod('user_id', shard_count)).filter(shard=shard)
+    return queryset
+
+
+def _events(since, shard, shard_count, chunk_size):
+    """Yield ``(user_id, timestamp, kind, row)`` for a shard in (user, timestamp) order."""
+    metrics = (
+        _shard(EngagementMetric.objects.filter(timestamp__gte=since), shard, shard_count)
+        .order_by('user_id', 'timestamp', 'pk')
+        .iterator(chunk_size=chunk_size)
+    )
+    logs = (
+        _shard(SensoryLog.objects.filter(timestamp__gte=since), shard, shard_count)
+        .order_by('user_id', 'timestamp', 'pk')
+        .iterator(chunk_size=chunk_size)
+    )
+    return heapq.merge(
+        ((metric.user_id, metric.timestamp, 0, metric) for metric in metrics),
+        ((log.user_id, log.timestamp, 1, log) for log in logs),
+        key=lambda event: event[:3]
+    )
+
+
+def _fired(rules, snapshot):
+    return {name for name, evaluate in rules if evaluate(snapshot)}
+
+
+def replay_shard(shard, shard_count, since, current, candidate, chunk_size=2000):
+    """
+    Replay one user-id shard from ``since`` against two ``{name: condition}``
+    rule sets. Returns a dict with the number of users and events replayed,
+    per-rule fire counts for each rule set (in events) and, for every user
+    whose adaptations differ, the rules the candidate set would add
+    (``gained``) or remove (``lost``) over the window.
+    """
+    current_rules = _compile_rule_set(current)
+    candidate_rules = _compile_rule_set(candidate)
+
+    # Profiles are merge-joined against the event stream, which is ordered by user too
+    profiles = iter(
+        _shard(NeuroProfile.objects.all(), shard, shard_count)
+        .order_by('user_id')
+        .iterator(chunk_size=chunk_size)
+    )
+    profile = next(profiles, None)
+
+    result = {
+        'users': 0,
+        'events': 0,
+        'current_fires': Counter(),
+        'candidate_fires': Counter(),
+        'diffs': {},
+    }
+    user_id = state = snapshot = None
+    current_fired = candidate_fired = None
+
+    def finish_user():
+        gained = candidate_fired - current_fired
+        lost = current_fired - candidate_fired
+        if gained or lost:
+            result['diffs'][user_id] = {'gained': sorted(gained), 'lost': sorted(lost)}
+
+    for event_user_id, timestamp, kind, row in _events(since, shard, shard_count, chunk_size):
+        if event_user_id != user_id:
+            if user_id is not None:
+                finish_user()
+            user_id = event_user_id
+            result['users'] += 1
+            state = UserSignalState(user_id=user_id)
+            snapshot = {}
+            while profile is not None and profile.user_id < user_id:
+                profile = next(profiles, None)
+            if profile is not None and profile.user_id == user_id:
+                snapshot.update(preference_signals(profile))
+            current_fired, candidate_fired = set(), set()
+
+        if kind == 0:
+            state.add_engagement(row)
+            snapshot.update(engagement_signals(row))
+        else:
+            state.add_sensory(row)
+            snapshot.update(sensory_signals(row))
+        snapshot.update(state.trend_signals(timestamp))
+        result['events'] += 1
+
+        fired = _fired(current_rules, snapshot)
+        result['current_fires'].update(fired)
+        current_fired |= fired
+        fired = _fired(candidate_rules, snapshot)
+        result['candidate_fires'].update(fired)
+        candidate_fired |= fired
+
+    if user_id is not None:
+        finish_user()
+    return result
+
+
+def _replay_shard_in_worker(*args):
+    try:
+        return replay_shard(*args)
+    finally:
+        connections.close_all()
+
+
+def replay(since, current, candidate, workers=1, chunk_size=2000):
+    """
+    Replay every user from ``since`` against both rule sets, split into
+    ``workers`` user-id shards replayed in parallel processes.
+    Returns the shard results combined (see ``replay_shard``).
+    """
+    if workers <= 1:
+        shard_results = [replay_shard(0, 1, since, current, candidate, chunk_size)]
+    else:
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(_replay_shard_in_worker, shard, workers, since, current, candidate, chunk_size)
+                for shard in range(workers)
+            ]
+            shard_results = [future.result() for future in futures]
+
+    combined = {
+        'users': 0,
+        'events': 0,
+        'current_fires': Counter(),
+        'candidate_fires': Counter(),
+        'diffs': {},
+    }
+    for shard_result in shard_results:
+        combined['users'] += shard_result['users']
+        combined['events'] += shard_result['events']
+        combined['current_fires'].update(shard_result['current_fires'])
+        combined['candidate_fires'].update(shard_result['candidate_fires'])
+        combined['diffs'].update(shard_result['diffs'])
+    return combined
@@ -0,0 +1,156 @@
+"""
+Hourly and daily rollups of raw EngagementMetric and SensoryLog rows.
+
+``compact`` folds raw rows newer than the source's RollupWatermark into the
+rollup tables in id-ordered batches, aggregating each batch in the database
+and merging it into existing buckets. ``purge`` then deletes raw rows that are
+both compacted and older than the retention window, in bounded batches.
+
+Ids are handed out when rows are inserted, not when they commit, so a
+transaction still in flight (e.g. a large ingestion batch) can commit rows
+below ids that are already visible. The watermark therefore stops short of
+the first row younger than ``ADAPTIVE_ROLLUP_SETTLE_SECONDS``; rows behind
+it are older than any ingestion transaction and can no longer appear.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Q
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import (
+    EngagementMetric,
+    EngagementRollup,
+    RollupWatermark,
+    SensoryLog,
+    SensoryRollup,
+)
+
+# (raw model, rollup model, summarized fields, whether to count overload flags)
+ROLLUP_SOURCES = [
+    (EngagementMetric, EngagementRollup, ('time_on_task', 'completion_rate', 'idle_ratio'), False),
+    (SensoryLog, SensoryRollup, ('mood_score',), True),
+]
+
+ROLLUP_PERIODS = ('hour', 'day')
+
+
+def _aggregate(batch, period, fields, count_overload):
+    """Aggregate a batch of raw rows per (user, bucket) in the database."""
+    aggregates = {'sample_count': Count('pk')}
+    for field in fields:
+        aggregates[f'{field}_mean'] = Avg(field)
+        aggregates[f'{field}_min'] = Min(field)
+        aggregates[f'{field}_max'] = Max(field)
+    if count_overload:
+        aggregates['overload_count'] = Count('pk', filter=Q(sensory_overload_flag=True))
+    # order_by() clears the model's default ordering so it does not split the groups
+    return (
+        batch.order_by()
+        .annotate(bucket_start=Trunc('timestamp', period))
+        .values('user_id', 'bucket_start')
+        .annotate(**aggregates)
+    )
+
+
+def _merge(rollup, row, fields, count_overload):
+    """Merge an aggregated row into an existing rollup bucket."""
+    old_count, new_count = rollup.sample_count, row['sample_count']
+    total = old_count + new_count
+    for field in fields:
+        old_mean = getattr(rollup, f'{field}_mean')
+        setattr(rollup, f'{field}_mean', (old_mean * old_count + row[f'{field}_mean'] * new_count) / total)
+        setattr(rollup, f'{field}_min', min(getattr(rollup, f'{field}_min'), row[f'{field}_min']))
+        setattr(rollup, f'{field}_max', max(getattr(rollup, f'{field}_max'), row[f'{field}_max']))
+    if count_overload:
+        rollup.overload_count += row['overload_count']
+    rollup.sample_count = total
+
+
+def _fold_batch(batch, rollup_model, fields, count_overload):
+    """Fold one batch of raw rows into the hourly and daily rollups."""
+    update_fields = ['sample_count'] + [
+        f'{field}_{stat}' for field in fields for stat in ('mean', 'min', 'max')
+    ]
+    if count_overload:
+        update_fields.append('overload_count')
+
+    for period in ROLLUP_PERIODS:
+        rows = list(_aggregate(batch, period, fields, count_overload))
+        existing = {
+            (rollup.user_id, rollup.bucket_start): rollup
+            for rollup in rollup_model.objects.filter(
+                period=period,
+                user_id__in={row['user_id'] for row in rows},
+                bucket_start__in={row['bucket_start'] for row in rows},
+            )
+        }
+        to_create, to_update = [], []
+        for row in rows:
+            rollup = existing.get((row['user_id'], row['bucket_start']))
+            if rollup is None:
+                to_create.append(rollup_model(period=period, **row))
+            else:
+                _merge(rollup, row, fields, count_overload)
+                to_update.append(rollup)
+        rollup_model.objects.bulk_create(to_create)
+        rollup_model.objects.bulk_update(to_update, update_fields)
+
+
+def compact(raw_model, rollup_model, fields, count_overload, batch_size=5000):
+    """
+    Fold raw rows above the source's high-water mark into its rollups, up to
+    the first row younger than ADAPTIVE_ROLLUP_SETTLE_SECONDS.
+    Each batch is folded and the watermark advanced in one transaction.
+    Returns the number of raw rows compacted.
+    """
+    source = raw_model._meta.label
+    watermark, created = RollupWatermark.objects.get_or_create(source=source)
+    settled = raw_model.objects.all()
+    settled_before = timezone.now() - timedelta(seconds=settings.ADAPTIVE_ROLLUP_SETTLE_SECONDS)
+    first_unsettled = (
+        raw_model.objects.filter(pk__gt=watermark.last_id, timestamp__gte=settled_before)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+        .first()
+    )
+    if first_unsettled is not None:
+        settled = settled.filter(pk__lt=first_unsettled)
+    compacted = 0
+
+    while True:
+        with transaction.atomic():
+            watermark = RollupWatermark.objects.select_for_update().get(source=source)
+            ids = list(
+                settled.filter(pk__gt=watermark.last_id)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return compacted
+            batch = raw_model.objects.filter(pk__gt=watermark.last_id, pk__lte=ids[-1])
+            _fold_batch(batch, rollup_model, fields, count_overload)
+            watermark.last_id = ids[-1]
+            watermark.save(update_fields=['last_id', 'updated_at'])
+        compacted += len(ids)
+
+
+def purge(raw_model, cutoff, batch_size=5000):
+    """
+    Delete raw rows older than ``cutoff`` that are already compacted,
+    at most ``batch_size`` rows per DELETE. Returns the number of rows deleted.
+    """
+    watermark = RollupWatermark.objects.filter(source=raw_model._meta.label).first()
+    if watermark is None:
+        return 0
+
+    expired = raw_model.objects.filter(timestamp__lt=cutoff, pk__lte=watermark.last_id)
+    deleted = 0
+    while True:
+        ids = list(expired.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        raw_model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
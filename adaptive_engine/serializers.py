@@ -0,0 +1,84 @@
+from rest_framework import serializers
+from core.models import profile_tag_mask
+from .adaptations import PROFILE_SIGNAL
+from .models import EngagementMetric, SensoryLog
+
+# Maximum number of samples of each kind accepted in one batch request
+MAX_SIGNAL_BATCH_SIZE = 1000
+
+# Maximum number of hypothetical signal dicts accepted in one what-if request
+MAX_WHAT_IF_INPUTS = 5000
+
+
+class EngagementMetricSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a single EngagementMetric sample.
+    The user is taken from the request, not the payload.
+    """
+    class Meta:
+        model = EngagementMetric
+        fields = ['time_on_task', 'completion_rate', 'idle_ratio']
+
+
+class SensoryLogSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a single SensoryLog sample.
+    The user is taken from the request, not the payload.
+    """
+    class Meta:
+        model = SensoryLog
+        fields = ['mood_score', 'sensory_overload_flag']
+
+
+class SignalBatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of telemetry samples.
+    Accepts up to MAX_SIGNAL_BATCH_SIZE engagement and sensory samples each.
+    """
+    engagement = EngagementMetricSerializer(
+        many=True,
+        required=False,
+        max_length=MAX_SIGNAL_BATCH_SIZE,
+        default=list
+    )
+    sensory = SensoryLogSerializer(
+        many=True,
+        required=False,
+        max_length=MAX_SIGNAL_BATCH_SIZE,
+        default=list
+    )
+
+    def validate(self, attrs):
+        """Require at least one sample in the batch."""
+        if not attrs.get('engagement') and not attrs.get('sensory'):
+            raise serializers.ValidationError("Batch must contain at least one engagement or sensory sample.")
+        return attrs
+
+
+class WhatIfSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of hypothetical signal dicts.
+    Accepts up to MAX_WHAT_IF_INPUTS inputs; ``learner_profile`` may be
+    given as a list of profile tag names and is converted to the tag bitmask.
+    """
+    inputs = serializers.ListField(
+        child=serializers.DictField(),
+        min_length=1,
+        max_length=MAX_WHAT_IF_INPUTS
+    )
+
+    def validate_inputs(self, inputs):
+        """Normalize learner_profile to the bitmask the engine evaluates."""
+        for signals in inputs:
+            profile = signals.get(PROFILE_SIGNAL)
+            if profile is None or (type(profile) is int and profile >= 0):
+                continue
+            if not isinstance(profile, list):
+                raise serializers.ValidationError(
+                    f"{PROFILE_SIGNAL} must be a list of profile tags or a tag bitmask."
+                )
+            try:
+                signals[PROFILE_SIGNAL] = profile_tag_mask(profile)
+            except (TypeError, ValueError) as e:
+                raise serializers.ValidationError(str(e))
+        return inputs
@@ -1,62 +1,102 @@
-from django.db.models.signals import post_save
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models import ProtectedError
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from .models import EngagementMetric, SensoryLog, AdaptiveRule
+from core.models import NeuroProfile
+from .adaptations import preference_signals, refresh_adaptation
+from .models import AdaptiveRule, EngagementMetric, SensoryLog, RuleSetVersion, UserSignalState
+from .engine import dispatch_rules, engagement_signals, sensory_signals
+from .firings import trigger_recorder
+from .metrics import rule_metrics
+from .registry import rule_registry
+
+
+@receiver(request_started)
+def check_rule_registry_version(sender, **kwargs):
+    """
+    Have the rule registry re-check the rule set version once per request,
+    so rule changes made by other workers are picked up.
+    """
+    rule_registry.mark_stale()
+
+
+@receiver(request_finished)
+def flush_trigger_events(sender, **kwargs):
+    """Write buffered rule firings once enough are pending or they are old enough."""
+    if trigger_recorder.is_due():
+        trigger_recorder.flush()
+
+
+@receiver(request_finished)
+def flush_rule_metrics(sender, **kwargs):
+    """Add the in-process rule evaluation counters to RuleStats every so often."""
+    if rule_metrics.is_due():
+        rule_metrics.flush()
+
+
+@receiver(pre_delete, sender=AdaptiveRule)
+def protect_served_rules(sender, instance, **kwargs):
+    """
+    Refuse to delete a rule that the served RuleSet contains: workers would
+    keep evaluating it and its firings could not be stored. Deactivate the
+    rule and publish a new rule set first.
+    """
+    if instance.pk in RuleSetVersion.served_rule_ids():
+        raise ProtectedError(
+            f'{instance.name} is part of the served rule set; deactivate it and publish before deleting it.',
+            {instance}
+        )
+
+
+@receiver(post_save, sender=AdaptiveRule)
+@receiver(post_delete, sender=AdaptiveRule)
+def bump_rule_set_version(sender, instance, **kwargs):
+    """
+    Signal handler for AdaptiveRule changes.
+    While workers serve the live rules, bumps the shared rule set version so
+    every worker reloads its registry. Once a RuleSet has been published,
+    the edit only takes effect with the next publish.
+    """
+    if RuleSetVersion.rules_changed():
+        transaction.on_commit(rule_registry.invalidate)
 
 
 @receiver(post_save, sender=SensoryLog)
 def check_sensory_triggers(sender, instance, created, **kwargs):
     """
     Signal handler for SensoryLog post_save.
-    Checks for sensory-related triggers and applies adaptive rules.
+    Updates the user's rolling signal state, then evaluates (or queues) the
+    adaptive rules against the sensory and trend signals
+    (e.g. sensory_overload_detected -> AI_SENSORY_REDUCE).
     """
     if not created:
         return  # Only process new log entries
-    
-    user = instance.user
-    
-    # Check for sensory overload trigger - AI_SENSORY_REDUCE
-    if instance.sensory_overload_flag:
-        rule = AdaptiveRule.objects.filter(
-            name='AI_SENSORY_REDUCE',
-            is_active=True
-        ).first()
-        
-        if rule:
-            print(f"⚡ TRIGGER DETECTED: {rule.name} applied for User {user.email}")
+
+    state = UserSignalState.record(instance.user, logs=[instance])
+    dispatch_rules(instance.user, {**sensory_signals(instance), **state.trend_signals()})
 
 
 @receiver(post_save, sender=EngagementMetric)
 def check_engagement_triggers(sender, instance, created, **kwargs):
     """
     Signal handler for EngagementMetric post_save.
-    Checks for engagement-related triggers and applies adaptive rules.
+    Updates the user's rolling signal state, then evaluates (or queues) the
+    adaptive rules against the engagement and trend signals
+    (e.g. attention_drop_detected -> AI_MICRO_GOALS,
+    long_content_detected -> AI_CONTENT_CHUNK).
     """
     if not created:
         return  # Only process new metric entries
-    
-    user = instance.user
-    
-    # Check for attention drop detected - AI_MICRO_GOALS
-    # Trigger: attention_drop_detected == true (high idle ratio or low completion rate)
-    attention_drop_detected = instance.idle_ratio > 0.5 or instance.completion_rate < 30.0
-    if attention_drop_detected:
-        rule = AdaptiveRule.objects.filter(
-            name='AI_MICRO_GOALS',
-            is_active=True
-        ).first()
-        
-        if rule:
-            print(f"⚡ TRIGGER DETECTED: {rule.name} applied for User {user.email}")
-    
-    # Check for long content detected - AI_CONTENT_CHUNK
-    # Trigger: long_content_detected == true (high time on task indicates long content)
-    long_content_detected = instance.time_on_task > 10.0
-    if long_content_detected:
-        rule = AdaptiveRule.objects.filter(
-            name='AI_CONTENT_CHUNK',
-            is_active=True
-        ).first()
-        
-        if rule:
-            print(f"⚡ TRIGGER DETECTED: {rule.name} applied for User {user.email}")
 
+    state = UserSignalState.record(instance.user, metrics=[instance])
+    dispatch_rules(instance.user, {**engagement_signals(instance), **state.trend_signals()})
+
+
+@receiver(post_save, sender=NeuroProfile)
+def refresh_profile_adaptations(sender, instance, **kwargs):
+    """
+    Signal handler for NeuroProfile post_save.
+    Recomputes the user's active adaptations with their updated preferences.
+    """
+    refresh_adaptation(instance.user, preference_signals(instance))
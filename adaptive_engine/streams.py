@@ -0,0 +1,133 @@
+"""
+In-process pub/sub of adaptation changes for the server-sent event stream.
+
+``refresh_adaptation`` publishes a user's new adaptation document once its
+transaction commits. Every open stream of that user in this process holds a
+Subscription: a single slot for the latest document plus an asyncio event,
+so a slow client never buffers more than one pending document (only the most
+recent state matters).
+
+Changes made by other processes (other ASGI workers, ``process_rule_jobs``)
+are picked up by one poller task per process, which every
+``ADAPTIVE_STREAM_POLL_SECONDS`` reads the UserAdaptation rows of the
+subscribed users updated since its last poll and publishes them locally.
+That costs one query per process per interval, however many streams are open.
+"""
+import asyncio
+import threading
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import UserAdaptation
+
+# Subscribed user ids are polled in chunks of this size
+POLL_CHUNK_SIZE = 1000
+
+
+class Subscription:
+    """One open stream: the latest undelivered document and a wake-up event."""
+
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.last_etag = None
+        self._pending = None
+        self._event = asyncio.Event()
+
+    def offer(self, etag, document):
+        """Replace the pending document (runs on the subscription's event loop)."""
+        if etag == self.last_etag:
+            return
+        self._pending = (etag, document)
+        self._event.set()
+
+    async def next(self, timeout):
+        """Return the next new ``(etag, document)``, or None if ``timeout`` passes first."""
+        deadline = self.loop.time() + timeout
+        while True:
+            try:
+                await asyncio.wait_for(self._event.wait(), max(deadline - self.loop.time(), 0))
+            except asyncio.TimeoutError:
+                return None
+            self._event.clear()
+            pending, self._pending = self._pending, None
+            # An update may have been offered before last_etag was known
+            if pending is not None and pending[0] != self.last_etag:
+                self.last_etag = pending[0]
+                return pending
+
+
+class AdaptationBroker:
+    """Routes published adaptation documents to the subscriptions of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._poller = None
+
+    def subscribe(self, user_id):
+        """
+        Open a subscription for a user on the running event loop.
+        Returns None when the user already has
+        ADAPTIVE_STREAM_MAX_CONNECTIONS_PER_USER open streams in this process.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            subscriptions = self._subscriptions.setdefault(user_id, set())
+            if len(subscriptions) >= settings.ADAPTIVE_STREAM_MAX_CONNECTIONS_PER_USER:
+                return None
+            subscription = Subscription(user_id, loop)
+            subscriptions.add(subscription)
+            if self._poller is None or self._poller.done():
+                self._poller = loop.create_task(self._poll())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, etag, document):
+        """Deliver a user's new document to their subscriptions; safe from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.offer, etag, document)
+
+    async def _poll(self):
+        """Publish adaptations changed by other processes until nobody is subscribed."""
+        since = timezone.now()
+        while True:
+            await asyncio.sleep(settings.ADAPTIVE_STREAM_POLL_SECONDS)
+            with self._lock:
+                user_ids = list(self._subscriptions)
+                if not user_ids:
+                    self._poller = None
+                    return
+            polled_at = timezone.now()
+            # The overlap covers rows committed late; duplicates are dropped by etag
+            rows = await sync_to_async(self._changed)(user_ids, since - timedelta(seconds=1))
+            since = polled_at
+            for user_id, etag, fired_rules, modifiers in rows:
+                self.publish(user_id, etag, {'rules': fired_rules, 'modifiers': modifiers})
+
+    @staticmethod
+    def _changed(user_ids, since):
+        rows = []
+        for start in range(0, len(user_ids), POLL_CHUNK_SIZE):
+            rows.extend(
+                UserAdaptation.objects.filter(
+                    user_id__in=user_ids[start:start + POLL_CHUNK_SIZE],
+                    updated_at__gte=since
+                ).values_list('user_id', 'etag', 'fired_rules', 'modifiers')
+            )
+        return rows
+
+
+adaptation_broker = AdaptationBroker()
@@ -1,3 +1,1340 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.core.exceptions import ValidationError
+from django.db.models import ProtectedError, Sum
+from django.core import signing
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import PROFILE_TAGS, NeuroProfile, User, profile_tag_mask
+from .adaptations import adaptation_documents, profile_plan, refresh_adaptation
+from .conditions import (
+    Contains, ConditionSyntaxError, Literal, SignalFrame, compile_condition, get_compiled, parse_condition
+)
+from .engine import engagement_signals, evaluate_rules, user_signals
+from .firings import TriggerRecorder, trigger_recorder
+from .management.commands.load_neuro_rules import Command as LoadNeuroRulesCommand
+from .metrics import RuleMetrics, rule_metrics
+from .models import (
+    AdaptiveRule, EngagementMetric, EngagementRollup, RollupWatermark, RuleEvaluationJob, RuleSetVersion,
+    RuleSet, RuleStats, SensoryLog, SensoryRollup, TriggerEvent, UserAdaptation, UserSignalState
+)
+from .registry import CompiledRule, RuleIndex, RuleRegistry, rule_registry
+from .replay import replay, replay_shard, rule_set_from_data, rule_set_from_rules
+from .rollups import ROLLUP_SOURCES, compact, purge
+from .streams import adaptation_broker
+from .views import STREAM_TICKET_SALT
+
+
+class EngineTestCase(TestCase):
+    """
+    Resets the process-wide engine state around each test: the rule registry
+    and profile plans (rolled-back tests reuse rule set versions), the
+    cooldown cache, and the buffered firings and metrics, which would
+    otherwise be flushed into a database that no longer exists.
+    """
+
+    def setUp(self):
+        cache.clear()
+        rule_registry.invalidate()
+        profile_plan.cache_clear()
+        self.addCleanup(rule_registry.invalidate)
+        self.addCleanup(trigger_recorder.discard)
+        self.addCleanup(rule_metrics.discard)
+
+
+def atom_rows(tree):
+    """
+    Return ``(row, expected)`` pairs for a condition that is a disjunction of
+    ``signal == true`` and ``learner_profile.contains(tag)`` atoms: each atom
+    alone makes it fire, and near misses of every atom do not.
+    """
+    references = tree.references()
+    names = [key for key in references if isinstance(key, str)]
+    tags = [key for key in references if isinstance(key, tuple)]
+    rows = [({}, False)]
+    for name in names:
+        rows.append(({name: True}, True))
+        rows.append(({name: False}, False))
+        rows.append(({name: 'true'}, False))
+    for signal, tag in tags:
+        others = [other for other in PROFILE_TAGS if other != tag]
+        rows.append(({signal: profile_tag_mask([tag])}, True))
+        rows.append(({signal: profile_tag_mask(others)}, False))
+        rows.append(({signal: {tag}}, True))
+        rows.append(({signal: 0}, False))
+    near_misses = {name: False for name in names}
+    near_misses.update(
+        (signal, profile_tag_mask(other for other in PROFILE_TAGS if (signal, other) not in tags))
+        for signal, _ in tags
+    )
+    rows.append((near_misses, False))
+    return rows
+
+
+class RuleLibraryConditionTests(SimpleTestCase):
+    """Every trigger in the rule library compiles and evaluates as written."""
+
+    def test_every_trigger_parses_and_reads_known_inputs(self):
+        for name, rule_data in LoadNeuroRulesCommand.AI_RULES_DATA.items():
+            with self.subTest(rule=name):
+                references = parse_condition(rule_data['trigger']).references()
+                self.assertTrue(references)
+                for key in references:
+                    if isinstance(key, tuple):
+                        self.assertEqual(key[0], 'learner_profile')
+                        self.assertIn(key[1], PROFILE_TAGS)
+
+    def test_every_trigger_fires_on_exactly_its_atoms(self):
+        for name, rule_data in LoadNeuroRulesCommand.AI_RULES_DATA.items():
+            tree = parse_condition(rule_data['trigger'])
+            predicate = compile_condition(rule_data['trigger'])
+            for row, expected in atom_rows(tree):
+                with self.subTest(rule=name, signals=row):
+                    self.assertIs(predicate(row), expected)
+
+    def test_column_wise_and_partial_evaluation_agree_with_predicates(self):
+        for name, rule_data in LoadNeuroRulesCommand.AI_RULES_DATA.items():
+            tree = parse_condition(rule_data['trigger'])
+            predicate = compile_condition(rule_data['trigger'])
+            rows = [row for row, _ in atom_rows(tree)]
+            with self.subTest(rule=name):
+                expected = [i for i, row in enumerate(rows) if predicate(row)]
+                self.assertEqual(SignalFrame.indices(tree.mask(SignalFrame(rows))), expected)
+                for row in rows:
+                    known = dict.fromkeys(key if isinstance(key, str) else key[0] for key in tree.references())
+                    known.update(row)
+                    specialized = tree.partial(known)
+                    self.assertIsInstance(specialized, Literal)
+                    self.assertEqual(bool(specialized.value), predicate(row))
+
+
+class ConditionCompilerTests(SimpleTestCase):
+
+    def test_operators(self):
+        cases = [
+            ("a == true && b == true", {'a': True, 'b': True}, True),
+            ("a == true && b == true", {'a': True}, False),
+            ("!(a == true) || b > 2", {'a': True, 'b': 3}, True),
+            ("!(a == true) || b > 2", {'a': True, 'b': 2}, False),
+            ("b >= 2.5", {'b': 2.5}, True),
+            ("2 < b", {'b': 3}, True),
+            ("mode != 'quiet'", {'mode': 'loud'}, True),
+            ("mode == null", {}, True),
+        ]
+        for text, signals, expected in cases:
+            with self.subTest(condition=text, signals=signals):
+                self.assertIs(compile_condition(text)(signals), expected)
+
+    def test_ordering_against_missing_or_mismatched_values_is_false(self):
+        self.assertIs(compile_condition("score < 3")({}), False)
+        self.assertIs(compile_condition("score < 3")({'score': 'low'}), False)
+
+    def test_contains_on_profile_bitmask(self):
+        tree = parse_condition("learner_profile.contains('dyslexic_profile')")
+        self.assertIsInstance(tree, Contains)
+        predicate = compile_condition("learner_profile.contains('dyslexic_profile')")
+        self.assertTrue(predicate({'learner_profile': profile_tag_mask(['adhd_profile', 'dyslexic_profile'])}))
+        self.assertFalse(predicate({'learner_profile': profile_tag_mask(['adhd_profile'])}))
+        self.assertFalse(compile_condition("learner_profile.contains('unknown_tag')")({'learner_profile': 2 ** 5 - 1}))
+
+    def test_syntax_errors(self):
+        for text in ["a ==", "(a == true", "a == true)", "a === true", "a && && b", "a.contains(b)", ""]:
+            with self.subTest(condition=text):
+                with self.assertRaises(ConditionSyntaxError):
+                    parse_condition(text)
+
+
+@override_settings(ADAPTIVE_RULES_VERSION_CHECK_SECONDS=3600)
+class RuleRegistryTests(TestCase):
+
+    def setUp(self):
+        self.registry = RuleRegistry()
+        self.rule = AdaptiveRule.objects.create(
+            name='TEST_RULE', condition='attention_drop_detected == true', action_payload={}
+        )
+
+    def names(self):
+        return [compiled.name for compiled in self.registry.rules()]
+
+    def test_rules_are_loaded_once_per_version(self):
+        self.assertEqual(self.names(), ['TEST_RULE'])
+        with self.assertNumQueries(0):
+            self.registry.rules()
+        self.registry.mark_stale()
+        with self.assertNumQueries(1):
+            self.registry.rules()
+
+    def test_rule_changes_are_picked_up_after_a_version_check(self):
+        self.assertEqual(self.names(), ['TEST_RULE'])
+        version = self.registry.version
+        AdaptiveRule.objects.create(name='OTHER_RULE', condition='mastery_detected == true', action_payload={})
+        self.assertEqual(RuleSetVersion.current(), version + 1)
+
+        self.assertEqual(self.names(), ['TEST_RULE'])
+        self.registry.mark_stale()
+        self.assertEqual(self.names(), ['OTHER_RULE', 'TEST_RULE'])
+
+    def test_inactive_rules_are_not_loaded(self):
+        self.rule.is_active = False
+        self.rule.save()
+        self.assertEqual(self.names(), [])
+
+    def test_rules_that_do_not_parse_are_skipped(self):
+        AdaptiveRule.objects.create(name='BROKEN_RULE', condition='mastery_detected ==', action_payload={})
+        with self.assertLogs('adaptive_engine.registry', 'WARNING') as logs:
+            self.assertEqual(self.names(), ['TEST_RULE'])
+        self.assertIn('BROKEN_RULE', logs.output[0])
+
+
+class SignalBatchViewTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        AdaptiveRule.objects.create(
+            name='TEST_ATTENTION', condition='attention_drop_detected == true', action_payload={}
+        )
+        AdaptiveRule.objects.create(
+            name='TEST_OVERLOAD', condition='sensory_overload_detected == true', action_payload={}
+        )
+        self.user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, engagement=(), sensory=()):
+        return self.client.post(
+            '/api/adaptive/signals/batch/',
+            {'engagement': list(engagement), 'sensory': list(sensory)},
+            format='json'
+        )
+
+    def test_batch_is_stored_and_evaluated_once(self):
+        response = self.post(
+            engagement=[
+                {'time_on_task': 2.0, 'completion_rate': 80.0, 'idle_ratio': 0.1},
+                {'time_on_task': 3.0, 'completion_rate': 90.0, 'idle_ratio': 0.9},
+            ],
+            sensory=[{'mood_score': 0.2, 'sensory_overload_flag': False}]
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['engagement_count'], 2)
+        self.assertEqual(response.data['sensory_count'], 1)
+        # Detectors are merged over the batch: one attention drop is enough
+        self.assertEqual(response.data['fired_rules'], ['TEST_ATTENTION'])
+        self.assertEqual(EngagementMetric.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(SensoryLog.objects.filter(user=self.user).count(), 1)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        sample = {'time_on_task': 2.0, 'completion_rate': 80.0, 'idle_ratio': 0.1}
+        self.post(engagement=[sample])  # loads the rule registry
+        counts = []
+        for size in (5, 40):
+            user = User.objects.create_user(email=f'student{size}@example.com', password='pass', role='student')
+            self.client.force_authenticate(user)
+            with CaptureQueriesContext(connection) as queries:
+                self.post(engagement=[sample] * size)
+            counts.append(len(queries.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_batches_are_rejected(self):
+        self.assertEqual(self.post().status_code, 400)
+        self.assertEqual(self.post(engagement=[{'time_on_task': 'long'}]).status_code, 400)
+        too_many = [{'mood_score': 0.0, 'sensory_overload_flag': False}] * 1001
+        self.assertEqual(self.post(sensory=too_many).status_code, 400)
+        self.assertFalse(SensoryLog.objects.exists())
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        response = self.post(sensory=[{'mood_score': 0.0, 'sensory_overload_flag': True}])
+        self.assertEqual(response.status_code, 401)
+
+
+class RuleIndexTests(SimpleTestCase):
+
+    def index(self, **conditions):
+        rules = []
+        for pk, (name, condition) in enumerate(conditions.items(), start=1):
+            rule = AdaptiveRule(pk=pk, name=name, condition=condition, action_payload={})
+            rules.append(CompiledRule(rule, *get_compiled(rule)))
+        return RuleIndex(rules)
+
+    def candidates(self, index, signals):
+        return [compiled.name for compiled in index.candidates(signals)]
+
+    def test_only_rules_reading_an_input_of_the_event_are_candidates(self):
+        index = self.index(
+            attention='attention_drop_detected == true',
+            overload='sensory_overload_detected == true || mastery_detected == true',
+            adhd="learner_profile.contains('adhd_profile')",
+            calm='!(sensory_overload_detected == true)',
+        )
+        self.assertEqual(self.candidates(index, {}), ['calm'])
+        self.assertEqual(self.candidates(index, {'attention_drop_detected': False}), ['attention', 'calm'])
+        self.assertEqual(self.candidates(index, {'mastery_detected': True}), ['overload', 'calm'])
+        self.assertEqual(
+            self.candidates(index, {'learner_profile': profile_tag_mask(['adhd_profile'])}),
+            ['adhd', 'calm']
+        )
+        self.assertEqual(self.candidates(index, {'learner_profile': profile_tag_mask(['autistic_profile'])}), ['calm'])
+        self.assertEqual(self.candidates(index, {'learner_profile': ['adhd_profile']}), ['adhd', 'calm'])
+
+
+class RegistryEvaluationTests(EngineTestCase):
+    """The loaded library evaluated through the registry's inverted index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('load_neuro_rules')
+
+    def expected_rules(self, signals):
+        return sorted(
+            name for name, rule_data in LoadNeuroRulesCommand.AI_RULES_DATA.items()
+            if compile_condition(rule_data['trigger'])(signals)
+        )
+
+    def test_candidates_find_every_rule_that_fires(self):
+        rows = [
+            {},
+            {'attention_drop_detected': True},
+            {'sensory_overload_detected': True, 'long_content_detected': False},
+            {'learner_profile': profile_tag_mask(['autistic_profile'])},
+            {'learner_profile': profile_tag_mask(PROFILE_TAGS), 'mastery_detected': True},
+        ]
+        for signals in rows:
+            with self.subTest(signals=signals):
+                fired = sorted(rule.name for rule in evaluate_rules(signals))
+                self.assertEqual(fired, self.expected_rules(signals))
+
+    def test_inactive_rules_are_not_evaluated(self):
+        AdaptiveRule.objects.filter(name='AI_MICRO_GOALS').update(is_active=False)
+        RuleSetVersion.bump()
+        fired = {rule.name for rule in evaluate_rules({'attention_drop_detected': True})}
+        self.assertNotIn('AI_MICRO_GOALS', fired)
+        self.assertIn('AI_MICRO_GOALS', self.expected_rules({'attention_drop_detected': True}))
+
+
+class SweepRulesTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name, condition in [
+            ('ATTENTION', 'attention_drop_detected == true'),
+            ('ADHD_LONG_CONTENT', "learner_profile.contains('adhd_profile') && long_content_detected == true"),
+            ('ANIMATIONS', 'animation_sensitivity_flag == true'),
+            ('IDLE_TREND', 'idle_ratio_trend > 0.5'),
+            ('OVERLOAD', 'sensory_overload_detected == true'),
+        ]:
+            AdaptiveRule.objects.create(name=name, condition=condition, action_payload={}, cooldown_seconds=0)
+
+    def student(self, name, tags=(), preferences=None):
+        user = User.objects.create_user(email=f'{name}@example.com', password='pass', role='student')
+        profile = NeuroProfile(user=user, sensory_preferences=preferences or {})
+        profile.tags = tags
+        profile.save()
+        return user
+
+    def sweep(self):
+        out = io.StringIO()
+        call_command('sweep_rules', chunk_size=2, verbosity=2, stdout=out)
+        fired = {}
+        for line in out.getvalue().splitlines():
+            rule, _, email = line.partition(': ')
+            if email.endswith('@example.com'):
+                fired.setdefault(email, []).append(rule)
+        return {email: sorted(rules) for email, rules in fired.items()}
+
+    def test_sweep_matches_live_evaluation(self):
+        adhd = self.student('adhd', tags=['adhd_profile'])
+        EngagementMetric.objects.create(user=adhd, time_on_task=15.0, completion_rate=80.0, idle_ratio=0.1)
+        sensitive = self.student('sensitive', preferences={'reduce_animations': True})
+        SensoryLog.objects.create(user=sensitive, mood_score=0.0, sensory_overload_flag=True)
+        idle = self.student('idle')
+        for idle_ratio in (0.9, 0.8, 0.2):
+            EngagementMetric.objects.create(user=idle, time_on_task=1.0, completion_rate=80.0, idle_ratio=idle_ratio)
+        self.student('quiet')
+        teacher = User.objects.create_user(email='teacher@example.com', password='pass', role='teacher')
+        EngagementMetric.objects.create(user=teacher, time_on_task=1.0, completion_rate=10.0, idle_ratio=0.9)
+
+        live = {
+            adaptation.user.email: sorted(adaptation.fired_rules)
+            for adaptation in UserAdaptation.objects.filter(user__role='student').select_related('user')
+            if adaptation.fired_rules
+        }
+        self.assertEqual(live, {
+            'adhd@example.com': ['ADHD_LONG_CONTENT'],
+            'sensitive@example.com': ['ANIMATIONS', 'OVERLOAD'],
+            'idle@example.com': ['IDLE_TREND'],
+        })
+        self.assertEqual(self.sweep(), live)
+
+
+@override_settings(
+    ADAPTIVE_IDLE_RATIO_EWMA_ALPHA=0.5,
+    ADAPTIVE_MOOD_MEAN_ALPHA=0.5,
+    ADAPTIVE_OVERLOAD_HALF_LIFE_SECONDS=600
+)
+class UserSignalStateTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def metric(self, minutes, idle_ratio):
+        return EngagementMetric(
+            user=self.user, time_on_task=1.0, completion_rate=80.0, idle_ratio=idle_ratio,
+            timestamp=self.start + timedelta(minutes=minutes)
+        )
+
+    def log(self, minutes, mood_score, overload=False):
+        return SensoryLog(
+            user=self.user, mood_score=mood_score, sensory_overload_flag=overload,
+            timestamp=self.start + timedelta(minutes=minutes)
+        )
+
+    def test_samples_are_folded_in_timestamp_order(self):
+        state = UserSignalState.record(self.user, metrics=[self.metric(2, 0.0), self.metric(1, 1.0)])
+        state = UserSignalState.record(self.user, metrics=[self.metric(3, 1.0)])
+        self.assertEqual(state.engagement_samples, 3)
+        # 1.0, then 0.5 after 0.0, then 0.75 after 1.0
+        self.assertAlmostEqual(state.idle_ratio_ewma, 0.75)
+        self.assertEqual(state.last_engagement_at, self.start + timedelta(minutes=3))
+        self.assertEqual(UserSignalState.objects.get(user=self.user).engagement_samples, 3)
+
+    def test_overload_count_decays_with_its_half_life(self):
+        state = UserSignalState.record(self.user, logs=[
+            self.log(0, 1.0, overload=True),
+            self.log(10, 0.0, overload=True),
+            self.log(20, -1.0),
+        ])
+        # 1 overload halves over 10 minutes, plus 1, halves again
+        self.assertAlmostEqual(state.recent_overload_count, 0.75)
+        self.assertAlmostEqual(state.mood_score_mean, -0.25)
+
+        now = self.start + timedelta(minutes=30)
+        signals = state.trend_signals(now)
+        self.assertAlmostEqual(signals['recent_overload_count'], 0.375)
+        self.assertAlmostEqual(signals['mood_score_trend'], -0.25)
+        self.assertEqual(signals['seconds_since_overload'], 1200.0)
+        self.assertNotIn('idle_ratio_trend', signals)
+
+    def test_ingestion_updates_the_state_and_evaluates_trends(self):
+        AdaptiveRule.objects.create(name='IDLE_TREND', condition='idle_ratio_trend > 0.5', action_payload={})
+        EngagementMetric.objects.create(user=self.user, time_on_task=1.0, completion_rate=80.0, idle_ratio=0.9)
+        EngagementMetric.objects.create(user=self.user, time_on_task=1.0, completion_rate=80.0, idle_ratio=0.3)
+        state = UserSignalState.objects.get(user=self.user)
+        self.assertEqual(state.engagement_samples, 2)
+        self.assertAlmostEqual(state.idle_ratio_ewma, 0.6)
+        self.assertEqual(UserAdaptation.objects.get(user=self.user).fired_rules, ['IDLE_TREND'])
+
+
+@override_settings(ADAPTIVE_ROLLUP_SETTLE_SECONDS=300)
+class RollupTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        self.hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=2)
+
+    def metrics(self, *rows):
+        """Insert ``(pk, minutes after self.hour, time_on_task)`` rows without running the engine."""
+        EngagementMetric.objects.bulk_create([
+            EngagementMetric(pk=pk, user=self.user, time_on_task=time_on_task, completion_rate=50.0, idle_ratio=0.5)
+            for pk, minutes, time_on_task in rows
+        ])
+        for pk, minutes, time_on_task in rows:
+            timestamp = self.hour + timedelta(minutes=minutes) if minutes is not None else timezone.now()
+            EngagementMetric.objects.filter(pk=pk).update(timestamp=timestamp)
+
+    def compact(self, batch_size=2):
+        return compact(*ROLLUP_SOURCES[0], batch_size=batch_size)
+
+    def test_rows_are_folded_into_hourly_and_daily_buckets(self):
+        self.metrics((1, 0, 2.0), (2, 10, 4.0), (3, 70, 9.0))
+        self.assertEqual(self.compact(), 3)
+        self.metrics((4, 20, 6.0))
+        self.assertEqual(self.compact(), 1)
+        self.assertEqual(self.compact(), 0)
+
+        first_hour = EngagementRollup.objects.get(period='hour', bucket_start=self.hour)
+        self.assertEqual(first_hour.sample_count, 3)
+        self.assertAlmostEqual(first_hour.time_on_task_mean, 4.0)
+        self.assertEqual((first_hour.time_on_task_min, first_hour.time_on_task_max), (2.0, 6.0))
+        self.assertEqual(EngagementRollup.objects.filter(period='hour').count(), 2)
+        day = EngagementRollup.objects.filter(period='day').get()
+        self.assertEqual(day.sample_count, 4)
+        self.assertAlmostEqual(day.time_on_task_mean, 5.25)
+        self.assertEqual(RollupWatermark.objects.get(source='adaptive_engine.EngagementMetric').last_id, 4)
+
+    def test_rows_committed_below_the_watermark_are_not_skipped(self):
+        # Row 4 is fresh; row 3 belongs to a transaction that has not committed yet
+        self.metrics((1, 0, 1.0), (2, 1, 1.0), (4, None, 1.0))
+        self.assertEqual(self.compact(), 2)
+        self.assertEqual(RollupWatermark.objects.get().last_id, 2)
+
+        self.metrics((3, None, 1.0))
+        with override_settings(ADAPTIVE_ROLLUP_SETTLE_SECONDS=0):
+            self.assertEqual(self.compact(), 2)
+        total = EngagementRollup.objects.filter(period='day').aggregate(total=Sum('sample_count'))['total']
+        self.assertEqual(total, 4)
+
+    def test_purge_only_deletes_compacted_rows_past_the_cutoff(self):
+        self.metrics((1, 0, 1.0), (2, 1, 1.0), (3, 2, 1.0))
+        self.compact(batch_size=2)
+        cutoff = self.hour + timedelta(minutes=2)
+        EngagementMetric.objects.bulk_create([
+            EngagementMetric(pk=5, user=self.user, time_on_task=1.0, completion_rate=50.0, idle_ratio=0.5)
+        ])
+        EngagementMetric.objects.filter(pk=5).update(timestamp=self.hour)
+        self.assertEqual(purge(EngagementMetric, cutoff, batch_size=1), 2)
+        self.assertEqual(sorted(EngagementMetric.objects.values_list('pk', flat=True)), [3, 5])
+
+    def test_sensory_rollups_count_overloads(self):
+        SensoryLog.objects.bulk_create([
+            SensoryLog(user=self.user, mood_score=mood, sensory_overload_flag=flag)
+            for mood, flag in [(1.0, True), (-1.0, False), (0.5, True)]
+        ])
+        SensoryLog.objects.update(timestamp=self.hour)
+        self.assertEqual(compact(*ROLLUP_SOURCES[1]), 3)
+        rollup = SensoryRollup.objects.get(period='hour')
+        self.assertEqual((rollup.sample_count, rollup.overload_count), (3, 2))
+        self.assertAlmostEqual(rollup.mood_score_mean, 0.5 / 3)
+
+
+@override_settings(ADAPTIVE_TRIGGER_FLUSH_SIZE=100, ADAPTIVE_TRIGGER_FLUSH_SECONDS=60)
+class TriggerRecorderTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.recorder = TriggerRecorder()
+        self.user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        self.rule = AdaptiveRule.objects.create(
+            name='TEST_RULE',
+            condition='attention_drop_detected == true',
+            action_payload={'action': 'test'},
+            cooldown_seconds=300
+        )
+
+    def test_firings_inside_the_cooldown_are_dropped(self):
+        self.assertTrue(self.recorder.record(self.user, self.rule, {'attention_drop_detected': True}))
+        self.assertFalse(self.recorder.record(self.user, self.rule, {'attention_drop_detected': True}))
+
+        other = User.objects.create_user(email='other@example.com', password='pass', role='student')
+        self.assertTrue(self.recorder.record(other, self.rule, {'attention_drop_detected': True}))
+
+        self.assertEqual(self.recorder.flush(), 2)
+        self.assertEqual(TriggerEvent.objects.filter(rule=self.rule).count(), 2)
+        self.assertEqual(
+            TriggerEvent.objects.get(user=self.user).inputs,
+            {'attention_drop_detected': True}
+        )
+
+    def test_rules_without_cooldown_record_every_firing(self):
+        self.rule.cooldown_seconds = 0
+        self.assertTrue(self.recorder.record(self.user, self.rule, {}))
+        self.assertTrue(self.recorder.record(self.user, self.rule, {}))
+        self.assertEqual(self.recorder.flush(), 2)
+
+    def test_set_signals_are_stored_as_lists(self):
+        self.recorder.record(self.user, self.rule, {'learner_profile': {'adhd_profile'}})
+        self.recorder.flush()
+        self.assertEqual(TriggerEvent.objects.get().inputs, {'learner_profile': ['adhd_profile']})
+
+    def test_flush_when_due(self):
+        self.assertFalse(self.recorder.is_due())
+        with override_settings(ADAPTIVE_TRIGGER_FLUSH_SIZE=2):
+            self.recorder.record(self.user, self.rule, {})
+            self.assertFalse(TriggerEvent.objects.exists())
+            other = User.objects.create_user(email='other@example.com', password='pass', role='student')
+            self.recorder.record(other, self.rule, {})
+        self.assertEqual(TriggerEvent.objects.count(), 2)
+        self.assertFalse(self.recorder.is_due())
+
+    def test_failed_flush_keeps_the_batch(self):
+        self.recorder.record(self.user, self.rule, {})
+        with mock.patch.object(TriggerEvent.objects, 'bulk_create', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                self.recorder.flush()
+        self.assertEqual(self.recorder.flush(), 1)
+        self.assertEqual(TriggerEvent.objects.count(), 1)
+
+
+    def test_discard(self):
+        self.recorder.record(self.user, self.rule, {})
+        self.assertEqual(self.recorder.discard(), 1)
+        self.assertEqual(self.recorder.flush(), 0)
+        self.assertFalse(TriggerEvent.objects.exists())
+
+@override_settings(ADAPTIVE_TRIGGER_FLUSH_SIZE=100, ADAPTIVE_TRIGGER_FLUSH_SECONDS=60)
+class TriggerRecorderIntegrityTests(TransactionTestCase):
+    """Foreign keys are only checked on commit, so this needs real transactions."""
+
+    def setUp(self):
+        cache.clear()
+        self.recorder = TriggerRecorder()
+
+    def test_firings_of_deleted_rules_are_dropped(self):
+        user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        kept = AdaptiveRule.objects.create(name='KEPT', condition='a == true', action_payload={})
+        deleted = AdaptiveRule.objects.create(name='DELETED', condition='a == true', action_payload={})
+        self.recorder.record(user, kept, {'a': True})
+        self.recorder.record(user, deleted, {'a': True})
+        deleted.delete()
+
+        self.assertEqual(self.recorder.flush(), 1)
+        self.assertEqual(list(TriggerEvent.objects.values_list('rule__name', flat=True)), ['KEPT'])
+
+
+class ApplyRulesTests(EngineTestCase):
+
+    def test_ingestion_records_firings_once_per_cooldown(self):
+        AdaptiveRule.objects.create(
+            name='OVERLOAD', condition='sensory_overload_detected == true', action_payload={}, cooldown_seconds=300
+        )
+        user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        for _ in range(3):
+            SensoryLog.objects.create(user=user, mood_score=0.0, sensory_overload_flag=True)
+        self.assertEqual(trigger_recorder.flush(), 1)
+        event = TriggerEvent.objects.get()
+        self.assertEqual((event.user, event.rule.name), (user, 'OVERLOAD'))
+        self.assertTrue(event.inputs['sensory_overload_detected'])
+
+
+@override_settings(ADAPTIVE_ENGINE_QUEUE_EVALUATION=True)
+class RuleJobTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        AdaptiveRule.objects.create(name='OVERLOAD', condition='sensory_overload_detected == true', action_payload={})
+        self.user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        self.other = User.objects.create_user(email='other@example.com', password='pass', role='student')
+
+    def queue(self, user, overload):
+        with self.captureOnCommitCallbacks(execute=True):
+            SensoryLog.objects.create(user=user, mood_score=0.0, sensory_overload_flag=overload)
+
+    def work(self, **options):
+        call_command('process_rule_jobs', once=True, stdout=io.StringIO(), **options)
+
+    def fired_rules(self, user):
+        return UserAdaptation.objects.get(user=user).fired_rules
+
+    def test_ingestion_queues_jobs_that_the_worker_applies_in_order(self):
+        self.queue(self.user, True)
+        self.queue(self.user, False)
+        self.assertEqual(RuleEvaluationJob.objects.count(), 2)
+        self.assertFalse(UserAdaptation.objects.filter(user=self.user).exists())
+
+        self.work(batch_size=1)
+        self.assertFalse(RuleEvaluationJob.objects.exists())
+        self.assertEqual(self.fired_rules(self.user), [])
+        self.assertEqual(trigger_recorder.flush(), 0)
+
+    def test_failed_job_is_retried_after_a_delay_and_holds_back_the_users_later_jobs(self):
+        self.queue(self.user, True)
+        self.queue(self.other, True)
+        self.queue(self.user, False)
+        first = RuleEvaluationJob.objects.order_by('pk').first()
+
+        from adaptive_engine.management.commands import process_rule_jobs
+        apply_rules = process_rule_jobs.apply_rules
+        calls = []
+
+        def fail_first(user, signals):
+            calls.append(user.email)
+            if len(calls) == 1:
+                raise OperationalError('database is busy')
+            return apply_rules(user, signals)
+
+        with mock.patch.object(process_rule_jobs, 'apply_rules', side_effect=fail_first):
+            started = timezone.now()
+            self.work(retry_delay=60)
+        self.assertEqual(calls, ['student@example.com', 'other@example.com'])
+        self.assertEqual(list(RuleEvaluationJob.objects.values_list('user__email', flat=True)), [
+            'student@example.com', 'student@example.com'
+        ])
+        first.refresh_from_db()
+        self.assertEqual((first.attempts, first.status, first.last_error), (1, 'pending', 'database is busy'))
+        self.assertGreaterEqual(first.run_after, started + timedelta(seconds=60))
+        self.assertEqual(self.fired_rules(self.other), ['OVERLOAD'])
+
+        RuleEvaluationJob.objects.update(run_after=timezone.now())
+        self.work()
+        self.assertFalse(RuleEvaluationJob.objects.exists())
+        # The later job (no overload) was applied after the retried one
+        self.assertEqual(self.fired_rules(self.user), [])
+
+    def test_retry_delay_doubles_until_the_job_fails(self):
+        self.queue(self.user, True)
+        job = RuleEvaluationJob.objects.get()
+        delays = []
+        with mock.patch(
+            'adaptive_engine.management.commands.process_rule_jobs.apply_rules',
+            side_effect=OperationalError('database is busy')
+        ):
+            for _ in range(3):
+                started = timezone.now()
+                self.work(retry_delay=10, max_attempts=3)
+                job.refresh_from_db()
+                delays.append(round((job.run_after - started).total_seconds()))
+                RuleEvaluationJob.objects.update(run_after=timezone.now())
+        self.assertEqual(delays[:2], [10, 20])
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+
+
+class ActiveAdaptationsViewTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        AdaptiveRule.objects.create(
+            name='OVERLOAD', condition='sensory_overload_detected == true',
+            action_payload={'modifiers': {'animations': 'off'}}
+        )
+        self.user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **headers):
+        return self.client.get('/api/adaptive/adaptations/', headers=headers)
+
+    def test_unchanged_document_is_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'rules': [], 'modifiers': {}})
+        etag = response['ETag']
+
+        for if_none_match in (etag, f'"stale", {etag}', '*'):
+            response = self.get(If_None_Match=if_none_match)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+
+        SensoryLog.objects.create(user=self.user, mood_score=0.0, sensory_overload_flag=True)
+        response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json(), {'rules': ['OVERLOAD'], 'modifiers': {'animations': 'off'}})
+
+    def test_reads_do_not_rewrite_the_row(self):
+        self.get()
+        updated_at = UserAdaptation.objects.get(user=self.user).updated_at
+        with CaptureQueriesContext(connection) as queries:
+            self.get()
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+        self.assertEqual(UserAdaptation.objects.get(user=self.user).updated_at, updated_at)
+
+    def test_recompute_keeps_signals_written_since_the_row_was_read(self):
+        SensoryLog.objects.create(user=self.user, mood_score=0.0, sensory_overload_flag=False)
+        # A published rule set leaves the stored document on an older version
+        UserAdaptation.objects.filter(user=self.user).update(rule_set_version=0)
+
+        index = rule_registry.index
+        writes = []
+
+        def concurrent_write():
+            # Another worker stores a new signal after get_adaptation read the row
+            if not writes:
+                writes.append(UserAdaptation.objects.filter(user=self.user).update(
+                    signals={'sensory_overload_detected': True}
+                ))
+            return index()
+
+        with mock.patch.object(rule_registry, 'index', side_effect=concurrent_write):
+            response = self.get()
+        self.assertEqual(writes, [1])
+        self.assertEqual(response.json()['rules'], ['OVERLOAD'])
+        self.assertTrue(UserAdaptation.objects.get(user=self.user).signals['sensory_overload_detected'])
+
+
+class BenchmarkCommandTests(EngineTestCase):
+
+    def test_benchmark_leaves_nothing_behind(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('bench_adaptive_engine', users=3, events_per_user=4, output=output, stdout=io.StringIO())
+            with open(output) as f:
+                results = json.load(f)
+
+        self.assertEqual(results['events'], 12)
+        self.assertGreater(results['rules'], 0)
+        self.assertGreater(results['queries_per_event'], 0)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(AdaptiveRule.objects.exists())
+        self.assertEqual(trigger_recorder.discard(), 0)
+        self.assertEqual(rule_metrics.discard(), 0)
+
+        # The post_save handlers are connected again
+        user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        SensoryLog.objects.create(user=user, mood_score=0.0, sensory_overload_flag=True)
+        self.assertTrue(UserSignalState.objects.filter(user=user).exists())
+
+
+class LoadNeuroRulesTests(EngineTestCase):
+
+    def load(self, **options):
+        call_command('load_neuro_rules', stdout=io.StringIO(), **options)
+
+    def test_unchanged_rules_are_not_written(self):
+        self.load()
+        self.assertEqual(AdaptiveRule.objects.count(), len(LoadNeuroRulesCommand.AI_RULES_DATA))
+        version = RuleSetVersion.current()
+        updated_at = dict(AdaptiveRule.objects.values_list('name', 'updated_at'))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.load()
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+        self.assertEqual(RuleSetVersion.current(), version)
+        self.assertEqual(dict(AdaptiveRule.objects.values_list('name', 'updated_at')), updated_at)
+
+    def test_only_changed_rules_are_updated(self):
+        self.load()
+        version = RuleSetVersion.current()
+        AdaptiveRule.objects.filter(name='AI_NO_TIMER').update(condition='anxiety_detected == true')
+        AdaptiveRule.objects.filter(name='AI_CAPTIONS_ON').update(is_active=False)
+        AdaptiveRule.objects.filter(name='AI_SLOW_AUDIO').delete()
+        updated_at = dict(AdaptiveRule.objects.values_list('name', 'updated_at'))
+
+        stdout = io.StringIO()
+        call_command('load_neuro_rules', stdout=stdout)
+        self.assertIn('1 created, 2 updated', stdout.getvalue())
+        self.assertGreater(RuleSetVersion.current(), version)
+        self.assertEqual(
+            AdaptiveRule.objects.get(name='AI_NO_TIMER').condition,
+            LoadNeuroRulesCommand.AI_RULES_DATA['AI_NO_TIMER']['trigger']
+        )
+        self.assertTrue(AdaptiveRule.objects.get(name='AI_CAPTIONS_ON').is_active)
+        changed = {
+            name for name, timestamp in AdaptiveRule.objects.values_list('name', 'updated_at')
+            if updated_at.get(name) != timestamp
+        }
+        self.assertEqual(changed, {'AI_NO_TIMER', 'AI_CAPTIONS_ON', 'AI_SLOW_AUDIO'})
+
+    def test_rules_missing_from_the_library_are_only_deactivated_on_request(self):
+        self.load()
+        AdaptiveRule.objects.create(name='CUSTOM', condition='a == true', action_payload={})
+        self.load()
+        self.assertTrue(AdaptiveRule.objects.get(name='CUSTOM').is_active)
+        self.load(deactivate_missing=True)
+        self.assertFalse(AdaptiveRule.objects.get(name='CUSTOM').is_active)
+        self.assertEqual(AdaptiveRule.objects.filter(is_active=True).count(), len(LoadNeuroRulesCommand.AI_RULES_DATA))
+
+
+class ProfilePlanTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name, condition, modifiers in (
+            ('A_SIGNAL', 'sensory_overload_detected == true', {'animations': 'reduced', 'audio': 'low'}),
+            ('B_ADHD', "learner_profile.contains('adhd_profile')", {'chunks': 'small', 'animations': 'off'}),
+            ('C_ADHD_OR_TIRED', "learner_profile.contains('adhd_profile') || tired == true", {'chunks': 'tiny'}),
+            ('D_ADHD_AND_IDLE', "learner_profile.contains('adhd_profile') && idle == true", {'prompt': 'nudge'}),
+        ):
+            AdaptiveRule.objects.create(name=name, condition=condition, action_payload={'modifiers': modifiers})
+        self.adhd = profile_tag_mask(['adhd_profile'])
+        rule_registry.index()
+
+    def test_rules_are_split_by_what_the_tags_decide(self):
+        plan = profile_plan(self.adhd, rule_registry.version)
+        self.assertEqual([rule.name for rule in plan.base_rules], ['B_ADHD', 'C_ADHD_OR_TIRED'])
+        # Base rules merge in name order, so the later name wins a conflict
+        self.assertEqual(plan.base_modifiers, {'chunks': 'tiny', 'animations': 'off'})
+        residual = {compiled.rule.name: compiled for compiled in plan.residual_rules}
+        self.assertEqual(set(residual), {'A_SIGNAL', 'D_ADHD_AND_IDLE'})
+        self.assertEqual(residual['D_ADHD_AND_IDLE'].references, frozenset({'idle'}))
+        self.assertTrue(residual['D_ADHD_AND_IDLE'].predicate({'idle': True}))
+
+        plan = profile_plan(0, rule_registry.version)
+        self.assertEqual(plan.base_rules, ())
+        self.assertEqual({compiled.rule.name for compiled in plan.residual_rules}, {'A_SIGNAL', 'C_ADHD_OR_TIRED'})
+
+    def test_plans_are_cached_per_tags_and_version(self):
+        version = rule_registry.version
+        self.assertIs(profile_plan(self.adhd, version), profile_plan(self.adhd, version))
+        rule = AdaptiveRule.objects.get(name='B_ADHD')
+        rule.is_active = False
+        rule.save()
+        rule_registry.mark_stale()
+        rule_registry.index()
+        self.assertNotEqual(rule_registry.version, version)
+        plan = profile_plan(self.adhd, rule_registry.version)
+        self.assertEqual([rule.name for rule in plan.base_rules], ['C_ADHD_OR_TIRED'])
+
+    def test_signal_rules_win_conflicts_with_the_profile_base(self):
+        user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        snapshot = {'learner_profile': self.adhd, 'sensory_overload_detected': True, 'idle': True}
+        adaptation = refresh_adaptation(user, snapshot)
+
+        self.assertEqual(adaptation.fired_rules, ['A_SIGNAL', 'B_ADHD', 'C_ADHD_OR_TIRED', 'D_ADHD_AND_IDLE'])
+        self.assertEqual(adaptation.modifiers, {
+            'animations': 'reduced', 'audio': 'low', 'chunks': 'tiny', 'prompt': 'nudge'
+        })
+        self.assertEqual(adaptation_documents([snapshot]), [adaptation.document()])
+
+
+class RuleMetricsTests(TestCase):
+
+    def setUp(self):
+        self.metrics = RuleMetrics()
+        self.rule = AdaptiveRule.objects.create(name='TEST_RULE', condition='a == true', action_payload={})
+
+    def test_counters_are_added_to_rule_stats(self):
+        self.metrics.observe(self.rule.pk, 2000, fired=True)
+        self.metrics.observe(self.rule.pk, 5000, fired=False)
+        self.assertEqual(self.metrics.flush(), 1)
+        self.metrics.observe(self.rule.pk, 1000, fired=False)
+        self.metrics.flush()
+
+        stats = RuleStats.objects.get(rule=self.rule)
+        self.assertEqual(stats.evaluation_count, 3)
+        self.assertEqual(stats.fire_count, 1)
+        self.assertAlmostEqual(stats.total_evaluation_seconds, 8e-6)
+        self.assertAlmostEqual(stats.max_evaluation_seconds, 5e-6)
+        self.assertIsNotNone(stats.last_fired_at)
+
+    def test_failed_flush_keeps_the_counters(self):
+        self.metrics.observe(self.rule.pk, 1000, fired=True)
+        with mock.patch.object(RuleStats.objects, 'bulk_create', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                self.metrics.flush()
+        self.metrics.observe(self.rule.pk, 1000, fired=False)
+        self.assertEqual(self.metrics.flush(), 1)
+        stats = RuleStats.objects.get(rule=self.rule)
+        self.assertEqual((stats.evaluation_count, stats.fire_count), (2, 1))
+
+    def test_counters_of_deleted_rules_are_dropped(self):
+        self.metrics.observe(self.rule.pk, 1000, fired=True)
+        self.metrics.observe(self.rule.pk + 1000, 1000, fired=True)
+        self.assertEqual(self.metrics.flush(), 1)
+        self.assertEqual(list(RuleStats.objects.values_list('rule__name', flat=True)), ['TEST_RULE'])
+
+    def test_discard(self):
+        self.metrics.observe(self.rule.pk, 1000, fired=True)
+        self.assertEqual(self.metrics.discard(), 1)
+        self.assertEqual(self.metrics.flush(), 0)
+        self.assertFalse(RuleStats.objects.exists())
+
+
+class RuleStatsViewTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        AdaptiveRule.objects.create(name='OVERLOAD', condition='sensory_overload_detected == true', action_payload={})
+        AdaptiveRule.objects.create(name='IDLE', condition='attention_drop_detected == true', action_payload={})
+        self.client = APIClient()
+
+    def test_pending_counters_are_included(self):
+        student = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        for overload in (True, False):
+            SensoryLog.objects.create(user=student, mood_score=0.0, sensory_overload_flag=overload)
+        staff = User.objects.create_user(email='staff@example.com', password='pass', role='student', is_staff=True)
+        self.client.force_authenticate(staff)
+
+        response = self.client.get('/api/adaptive/rules/stats/')
+        self.assertEqual(response.status_code, 200)
+        rows = {row['name']: row for row in response.json()}
+        self.assertEqual(set(rows), {'OVERLOAD', 'IDLE'})
+        self.assertEqual((rows['OVERLOAD']['evaluation_count'], rows['OVERLOAD']['fire_count']), (2, 1))
+        self.assertIsNotNone(rows['OVERLOAD']['last_fired_at'])
+        self.assertEqual((rows['IDLE']['evaluation_count'], rows['IDLE']['last_fired_at']), (0, None))
+
+    def test_requires_staff(self):
+        student = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        self.client.force_authenticate(student)
+        self.assertEqual(self.client.get('/api/adaptive/rules/stats/').status_code, 403)
+
+
+class ReplayRulesTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        AdaptiveRule.objects.create(name='OVERLOAD', condition='sensory_overload_detected == true', action_payload={})
+        AdaptiveRule.objects.create(name='IDLE', condition='attention_drop_detected == true', action_payload={})
+        self.users = [
+            User.objects.create_user(email=f'student{i}@example.com', password='pass', role='student')
+            for i in range(4)
+        ]
+        for i, user in enumerate(self.users):
+            SensoryLog.objects.create(user=user, mood_score=0.0, sensory_overload_flag=i % 2 == 0)
+            EngagementMetric.objects.create(user=user, time_on_task=1.0, completion_rate=90.0, idle_ratio=0.1)
+        self.candidate = {
+            'OVERLOAD': {'trigger': 'sensory_overload_detected == true || attention_drop_detected == true'},
+            'IDLE': {'trigger': 'attention_drop_detected == true', 'is_active': False},
+            'FOCUSED': {'trigger': 'attention_drop_detected == false'},
+        }
+
+    def test_shards_together_replay_every_user(self):
+        current = rule_set_from_rules(AdaptiveRule.objects.all())
+        candidate = rule_set_from_data(self.candidate)
+        since = timezone.now() - timedelta(days=1)
+        full = replay(since, current, candidate)
+
+        self.assertEqual((full['users'], full['events']), (4, 8))
+        self.assertEqual(full['current_fires'], {'OVERLOAD': 4})
+        self.assertEqual(full['candidate_fires'], {'OVERLOAD': 4, 'FOCUSED': 4})
+        self.assertEqual(full['diffs'], {user.pk: {'gained': ['FOCUSED'], 'lost': []} for user in self.users})
+
+        shards = [replay_shard(shard, 2, since, current, candidate, chunk_size=1) for shard in range(2)]
+        self.assertEqual(sum(shard['users'] for shard in shards), 4)
+        self.assertEqual({user_id for shard in shards for user_id in shard['diffs']}, set(full['diffs']))
+
+    def test_command_reports_differences_without_writing(self):
+        SensoryLog.objects.filter(user=self.users[0]).update(timestamp=timezone.now() - timedelta(days=10))
+        counts = [model.objects.count() for model in (SensoryLog, EngagementMetric, UserSignalState, TriggerEvent)]
+        with tempfile.TemporaryDirectory() as directory:
+            candidate = os.path.join(directory, 'candidate.json')
+            output = os.path.join(directory, 'replay.json')
+            with open(candidate, 'w') as f:
+                json.dump(self.candidate, f)
+            stdout = io.StringIO()
+            call_command('replay_rules', days=7, candidate=candidate, output=output, stdout=stdout)
+            with open(output) as f:
+                results = json.load(f)
+
+        self.assertIn('FOCUSED: 0 -> 4 firings', stdout.getvalue())
+        self.assertIn('+ FOCUSED: student1@example.com', stdout.getvalue())
+        self.assertEqual(results['events'], 7)
+        self.assertEqual(len(results['diffs']), 4)
+        self.assertEqual(
+            [model.objects.count() for model in (SensoryLog, EngagementMetric, UserSignalState, TriggerEvent)],
+            counts
+        )
+
+    def test_invalid_candidates_are_rejected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            candidate = os.path.join(directory, 'candidate.json')
+            with open(candidate, 'w') as f:
+                json.dump({'BROKEN': {'trigger': 'a == '}}, f)
+            with self.assertRaisesMessage(CommandError, 'Candidate rule BROKEN has an invalid trigger'):
+                call_command('replay_rules', candidate=candidate, stdout=io.StringIO())
+            with self.assertRaisesMessage(CommandError, 'Could not read candidate rules'):
+                call_command('replay_rules', candidate=os.path.join(directory, 'missing.json'), stdout=io.StringIO())
+
+
+@override_settings(ADAPTIVE_BASELINE_MIN_SAMPLES=5, ADAPTIVE_BASELINE_ZSCORE_THRESHOLD=2.0)
+class BaselineTests(SimpleTestCase):
+
+    def setUp(self):
+        self.started = timezone.now()
+        self.samples = [
+            (5.0 + i % 3, 80.0 + 4 * (i % 4), 0.2 + 0.03 * (i % 5))
+            for i in range(12)
+        ]
+
+    def metric(self, i, time_on_task, completion_rate, idle_ratio):
+        return EngagementMetric(
+            time_on_task=time_on_task, completion_rate=completion_rate, idle_ratio=idle_ratio,
+            timestamp=self.started + timedelta(minutes=i)
+        )
+
+    def fold(self, samples):
+        state = UserSignalState()
+        metrics = [self.metric(i, *sample) for i, sample in enumerate(samples)]
+        for metric in metrics:
+            state.add_engagement(metric)
+        return state, metrics
+
+    def test_welford_matches_the_sample_mean_and_variance(self):
+        state, metrics = self.fold(self.samples)
+        for position, field in enumerate(('time_on_task', 'completion_rate', 'idle_ratio')):
+            values = [sample[position] for sample in self.samples]
+            self.assertAlmostEqual(getattr(state, f'{field}_mean'), statistics.mean(values))
+            self.assertAlmostEqual(
+                getattr(state, f'{field}_m2') / (len(values) - 1), statistics.variance(values)
+            )
+
+    def test_zscores_need_a_warm_baseline_and_respect_the_stddev_floor(self):
+        state, metrics = self.fold([(5.0, 80.0, 0.2)] * 5)
+        self.assertIsNone(metrics[4].baseline_zscores)
+        self.assertIsNotNone(state.baseline_zscores(metrics[0]))
+        # Identical samples have no variance; the floor keeps the z-score finite
+        zscores = state.baseline_zscores(self.metric(5, 7.0, 70.0, 0.3))
+        self.assertAlmostEqual(zscores['time_on_task'], 2.0)
+        self.assertAlmostEqual(zscores['completion_rate'], -2.0)
+        self.assertAlmostEqual(zscores['idle_ratio'], 2.0)
+
+    def test_latest_zscores_are_recovered_from_the_stored_baseline(self):
+        state, metrics = self.fold(self.samples + [(6.0, 40.0, 0.9)])
+        latest = metrics[-1]
+        stored = EngagementMetric(
+            time_on_task=latest.time_on_task, completion_rate=latest.completion_rate,
+            idle_ratio=latest.idle_ratio, timestamp=latest.timestamp
+        )
+        recovered = state.latest_baseline_zscores(stored)
+        for field, zscore in latest.baseline_zscores.items():
+            self.assertAlmostEqual(recovered[field], zscore)
+        # Any other sample is scored against the current baseline
+        self.assertEqual(state.latest_baseline_zscores(metrics[0]), state.baseline_zscores(metrics[0]))
+
+    def test_detectors_use_zscores_once_the_baseline_is_warm(self):
+        # A 40% completion rate is low by the fixed threshold's standard...
+        cold = self.metric(0, 6.0, 40.0, 0.2)
+        self.assertFalse(engagement_signals(cold)['attention_drop_detected'])
+        # ...but an outlier for a learner who usually completes 80-92%
+        state, metrics = self.fold(self.samples + [(6.0, 40.0, 0.2)])
+        signals = engagement_signals(metrics[-1])
+        self.assertTrue(signals['attention_drop_detected'])
+        self.assertLess(signals['completion_rate_zscore'], -2.0)
+        offline = user_signals(state=state, metric=metrics[-1])
+        self.assertAlmostEqual(offline['completion_rate_zscore'], signals['completion_rate_zscore'])
+
+
+class RuleSetTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.overload = AdaptiveRule.objects.create(
+            name='OVERLOAD', condition='sensory_overload_detected == true', action_payload={}
+        )
+        self.idle = AdaptiveRule.objects.create(name='IDLE', condition='attention_drop_detected == true', action_payload={})
+
+    def served(self):
+        rule_registry.mark_stale()
+        return sorted(compiled.rule.name for compiled in rule_registry.rules())
+
+    def test_edits_wait_for_the_next_publish(self):
+        first = RuleSet.publish(note='first')
+        self.assertEqual((first.number, rule_registry.rule_set_id), (1, None))
+        self.assertEqual(self.served(), ['IDLE', 'OVERLOAD'])
+        self.assertEqual(rule_registry.rule_set_id, first.pk)
+
+        self.idle.is_active = False
+        self.idle.save()
+        AdaptiveRule.objects.create(name='MASTERY', condition='mastery_detected == true', action_payload={})
+        self.assertEqual(self.served(), ['IDLE', 'OVERLOAD'])
+
+        second = RuleSet.publish(note='second')
+        self.assertEqual(second.number, 2)
+        self.assertEqual(self.served(), ['MASTERY', 'OVERLOAD'])
+
+        call_command('publish_rules', activate=1, stdout=io.StringIO())
+        self.assertEqual(self.served(), ['IDLE', 'OVERLOAD'])
+        stdout = io.StringIO()
+        call_command('publish_rules', list=True, stdout=stdout)
+        self.assertEqual([line[0] for line in stdout.getvalue().splitlines()], [' ', '*'])
+
+    def test_rules_that_do_not_parse_are_not_published(self):
+        AdaptiveRule.objects.create(name='BROKEN', condition='a == ', action_payload={})
+        with self.assertRaises(ValidationError):
+            RuleSet.publish()
+        self.assertFalse(RuleSet.objects.exists())
+        with self.assertRaisesMessage(CommandError, 'Cannot publish: BROKEN'):
+            call_command('publish_rules', stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, 'Rule set #7 does not exist'):
+            call_command('publish_rules', activate=7, stdout=io.StringIO())
+
+    def test_served_rules_cannot_be_deleted(self):
+        RuleSet.publish()
+        with self.assertRaises(ProtectedError), transaction.atomic():
+            self.idle.delete()
+
+        self.idle.is_active = False
+        self.idle.save()
+        RuleSet.publish()
+        self.idle.delete()
+        self.assertFalse(AdaptiveRule.objects.filter(name='IDLE').exists())
+
+    def test_admin_only_deletes_rules_outside_the_served_rule_set(self):
+        RuleSet.publish()
+        outside = AdaptiveRule.objects.create(name='MASTERY', condition='mastery_detected == true', action_payload={})
+        admin_user = User.objects.create_superuser(email='admin@example.com', password='pass')
+        self.client.force_login(admin_user)
+
+        protected = 'IDLE (part of the served rule set; deactivate and publish first)'
+        response = self.client.post(f'/admin/adaptive_engine/adaptiverule/{self.idle.pk}/delete/', {'post': 'yes'})
+        self.assertContains(response, protected)
+        response = self.client.post('/admin/adaptive_engine/adaptiverule/', {
+            'action': 'delete_selected',
+            '_selected_action': [self.idle.pk, outside.pk],
+            'post': 'yes',
+        })
+        self.assertContains(response, protected)
+        self.assertEqual(AdaptiveRule.objects.count(), 3)
+
+        response = self.client.post('/admin/adaptive_engine/adaptiverule/', {
+            'action': 'delete_selected',
+            '_selected_action': [outside.pk],
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sorted(AdaptiveRule.objects.values_list('name', flat=True)), ['IDLE', 'OVERLOAD'])
+
+    def test_rules_deleted_since_a_rule_set_was_published_are_skipped(self):
+        first = RuleSet.publish()
+        self.idle.is_active = False
+        self.idle.save()
+        RuleSet.publish()
+        self.idle.delete()
+
+        with self.assertLogs('adaptive_engine.models', 'WARNING') as logs:
+            first.activate()
+            self.assertEqual(self.served(), ['OVERLOAD'])
+        self.assertIn('skipping deleted rule IDLE', logs.output[0])
+
+    def test_boot_load_publishes_library_changes_once_rule_sets_are_in_use(self):
+        AdaptiveRule.objects.all().delete()
+        call_command('load_neuro_rules', stdout=io.StringIO())
+        self.assertFalse(RuleSet.objects.exists())
+
+        call_command('load_neuro_rules', publish=True, stdout=io.StringIO())
+        self.assertEqual(RuleSet.objects.count(), 1)
+        call_command('load_neuro_rules', stdout=io.StringIO())
+        self.assertEqual(RuleSet.objects.count(), 1)
+
+        # A rollback to a rule set that predates the library lasts until the next boot
+        rule = AdaptiveRule.objects.get(name='AI_NO_TIMER')
+        rule.condition = 'anxiety_detected == true'
+        rule.save()
+        RuleSet.publish(note='manual edit')
+        call_command('load_neuro_rules', stdout=io.StringIO())
+        latest = RuleSet.objects.first()
+        self.assertEqual((latest.number, latest.note), (3, 'load_neuro_rules'))
+        self.assertEqual(RuleSetVersion.pointer()[1], latest.pk)
+        served = {rule['name']: rule['condition'] for rule in latest.rules}
+        self.assertEqual(served['AI_NO_TIMER'], LoadNeuroRulesCommand.AI_RULES_DATA['AI_NO_TIMER']['trigger'])
+
+
+class RuleWhatIfViewTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        AdaptiveRule.objects.create(
+            name='OVERLOAD', condition='sensory_overload_detected == true',
+            action_payload={'modifiers': {'animations': 'off'}}
+        )
+        AdaptiveRule.objects.create(
+            name='ADHD', condition="learner_profile.contains('adhd_profile')",
+            action_payload={'modifiers': {'chunks': 'small'}}
+        )
+        self.staff = User.objects.create_user(email='staff@example.com', password='pass', role='student', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def post(self, inputs):
+        return self.client.post('/api/adaptive/rules/what-if/', {'inputs': inputs}, format='json')
+
+    def test_results_follow_the_input_order(self):
+        inputs = [
+            {'learner_profile': ['adhd_profile'], 'sensory_overload_detected': True},
+            {'sensory_overload_detected': False},
+            {'learner_profile': profile_tag_mask(['adhd_profile'])},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(inputs)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['rule_set_version'], RuleSetVersion.current())
+        self.assertEqual(response.json()['results'], [
+            {'rules': ['ADHD', 'OVERLOAD'], 'modifiers': {'chunks': 'small', 'animations': 'off'}},
+            {'rules': [], 'modifiers': {}},
+            {'rules': ['ADHD'], 'modifiers': {'chunks': 'small'}},
+        ])
+        self.assertFalse([query for query in queries if query['sql'].startswith(('INSERT', 'UPDATE'))])
+        self.assertEqual(trigger_recorder.discard(), 0)
+
+    def test_invalid_inputs_are_rejected(self):
+        for inputs in ([], [{'learner_profile': ['unknown_profile']}], [{'learner_profile': 'adhd_profile'}], ['x']):
+            self.assertEqual(self.post(inputs).status_code, 400, inputs)
+
+    def test_requires_staff(self):
+        student = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        self.client.force_authenticate(student)
+        self.assertEqual(self.post([{}]).status_code, 403)
+
+
+@override_settings(ADAPTIVE_STREAM_POLL_SECONDS=0.01, ADAPTIVE_STREAM_HEARTBEAT_SECONDS=0.05)
+class AdaptationStreamTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        AdaptiveRule.objects.create(
+            name='OVERLOAD', condition='sensory_overload_detected == true',
+            action_payload={'modifiers': {'animations': 'off'}}
+        )
+        self.user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+
+    def ticket(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/adaptive/adaptations/stream/ticket/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['ticket']
+
+    async def read(self, response, count):
+        chunks = []
+        async for chunk in response.streaming_content:
+            chunks.append(chunk.decode())
+            if len(chunks) == count:
+                break
+        await response.streaming_content.aclose()
+        # Let the poller notice the stream is gone
+        await asyncio.sleep(0.05)
+        return chunks
+
+    async def test_stream_sends_the_document_then_its_changes(self):
+        ticket = await sync_to_async(self.ticket)()
+        response = await AsyncClient().get('/api/adaptive/adaptations/stream/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        async def overload():
+            await asyncio.sleep(0.01)
+            await SensoryLog.objects.acreate(user=self.user, mood_score=0.0, sensory_overload_flag=True)
+
+        task = asyncio.ensure_future(overload())
+        first, *rest = await self.read(response, 3)
+        await task
+        etag = (await UserAdaptation.objects.aget(user=self.user)).etag
+        self.assertTrue(first.startswith('id: "'))
+        self.assertIn('data: {"rules": [], "modifiers": {}}', first)
+        updates = [chunk for chunk in rest if not chunk.startswith(':')]
+        self.assertEqual(updates, [
+            f'id: {etag}\nevent: adaptation\ndata: {{"rules": ["OVERLOAD"], "modifiers": {{"animations": "off"}}}}\n\n'
+        ])
+
+    async def test_last_event_id_skips_the_current_document(self):
+        adaptation = await sync_to_async(refresh_adaptation)(self.user)
+        ticket = await sync_to_async(self.ticket)()
+        response = await AsyncClient().get(
+            '/api/adaptive/adaptations/stream/', {'ticket': ticket}, headers={'Last-Event-ID': adaptation.etag}
+        )
+        self.assertEqual(await self.read(response, 1), [': keepalive\n\n'])
+
+    async def test_stream_ends_after_its_max_duration(self):
+        ticket = await sync_to_async(self.ticket)()
+        with self.settings(ADAPTIVE_STREAM_MAX_SECONDS=0.1):
+            response = await AsyncClient().get('/api/adaptive/adaptations/stream/', {'ticket': ticket})
+            chunks = await self.read(response, 100)
+        self.assertIn('event: adaptation', chunks[0])
+        self.assertTrue(all(chunk == ': keepalive\n\n' for chunk in chunks[1:]))
+
+    async def test_stream_requires_a_valid_ticket(self):
+        client = AsyncClient()
+        # Signed for another purpose, and for a user that does not exist
+        other_purpose = signing.dumps(self.user.pk)
+        unknown_user = signing.dumps(self.user.pk + 1, salt=STREAM_TICKET_SALT)
+        for params in ({}, {'ticket': 'garbage'}, {'ticket': other_purpose}, {'ticket': unknown_user}):
+            response = await client.get('/api/adaptive/adaptations/stream/', params)
+            self.assertEqual(response.status_code, 401, params)
+
+        ticket = await sync_to_async(self.ticket)()
+        with self.settings(ADAPTIVE_STREAM_TICKET_SECONDS=0):
+            await asyncio.sleep(1)
+            response = await client.get('/api/adaptive/adaptations/stream/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 401)
+
+    def test_ticket_requires_authentication(self):
+        self.assertEqual(APIClient().post('/api/adaptive/adaptations/stream/ticket/').status_code, 401)
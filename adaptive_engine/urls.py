@@ -0,0 +1,20 @@
+from django.urls import path
+from .views import (
+    ActiveAdaptationsView,
+    AdaptationStreamTicketView,
+    RuleStatsView,
+    RuleWhatIfView,
+    SignalBatchView,
+    adaptation_stream,
+)
+
+app_name = 'adaptive_engine'
+
+urlpatterns = [
+    path('signals/batch/', SignalBatchView.as_view(), name='signal-batch'),
+    path('adaptations/', ActiveAdaptationsView.as_view(), name='active-adaptations'),
+    path('adaptations/stream/', adaptation_stream, name='adaptation-stream'),
+    path('adaptations/stream/ticket/', AdaptationStreamTicketView.as_view(), name='adaptation-stream-ticket'),
+    path('rules/stats/', RuleStatsView.as_view(), name='rule-stats'),
+    path('rules/what-if/', RuleWhatIfView.as_view(), name='rule-what-if'),
+]
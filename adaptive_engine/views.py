@@ -1,3 +1,327 @@
-from django.shortcuts import render
+import json
+import time
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from core.models import User
+from .models import AdaptiveRule, EngagementMetric, RuleStats, SensoryLog
+from .serializers import SignalBatchSerializer, WhatIfSerializer
+from .engine import apply_batch_rules
+from .adaptations import adaptation_documents, get_adaptation
+from .metrics import rule_metrics
+from .registry import rule_registry
+from .streams import adaptation_broker
+
+
+class SignalBatchView(APIView):
+    """
+    API view for batched telemetry ingestion.
+    POST /api/adaptive/signals/batch/
+    Requires authentication.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Store a batch of engagement and sensory samples for the authenticated
+        user and evaluate the adaptive rules once over the whole batch.
+
+        Expected payload:
+        {
+            "engagement": [{"time_on_task": 12.5, "completion_rate": 40.0, "idle_ratio": 0.2}, ...],
+            "sensory": [{"mood_score": -0.4, "sensory_overload_flag": true}, ...]
+        }
+
+        Returns the number of stored samples and the names of the rules that
+        fired (null when rule evaluation is queued for a background worker).
+        """
+        serializer = SignalBatchSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        user = request.user
+        metrics = [
+            EngagementMetric(user=user, **sample)
+            for sample in serializer.validated_data['engagement']
+        ]
+        logs = [
+            SensoryLog(user=user, **sample)
+            for sample in serializer.validated_data['sensory']
+        ]
+
+        # bulk_create skips post_save, so rules are evaluated explicitly below
+        with transaction.atomic():
+            EngagementMetric.objects.bulk_create(metrics)
+            SensoryLog.objects.bulk_create(logs)
+
+        fired = apply_batch_rules(user, metrics, logs)
+
+        return Response(
+            {
+                'engagement_count': len(metrics),
+                'sensory_count': len(logs),
+                'fired_rules': None if fired is None else [rule.name for rule in fired]
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+
+class ActiveAdaptationsView(APIView):
+    """
+    API view returning the adaptations currently in effect for the user.
+    GET /api/adaptive/adaptations/
+    Requires authentication.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Return the materialized adaptation document:
+        {
+            "rules": ["AI_DYSLEXIA_FONT_MODE", ...],
+            "modifiers": {"font_type": "OpenDyslexic", ...}
+        }
+
+        The response carries a strong ETag; a request whose If-None-Match
+        matches it gets an empty 304 Not Modified instead.
+        """
+        adaptation = get_adaptation(request.user)
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            if '*' in etags or adaptation.etag in etags:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = adaptation.etag
+                return response
+
+        response = Response(adaptation.document(), status=status.HTTP_200_OK)
+        response['ETag'] = adaptation.etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class RuleStatsView(APIView):
+    """
+    API view exposing per-rule evaluation counters.
+    GET /api/adaptive/rules/stats/
+    Requires staff access.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        Return every rule with its evaluation counters, slowest total first:
+        [
+            {
+                "name": "AI_SENSORY_REDUCE",
+                "is_active": true,
+                "evaluation_count": 1200,
+                "fire_count": 85,
+                "total_evaluation_seconds": 0.0021,
+                "mean_evaluation_us": 1.75,
+                "max_evaluation_us": 14.2,
+                "last_fired_at": "2025-01-01T12:00:00Z"
+            },
+            ...
+        ]
+
+        Counters are flushed per worker process, so other workers may hold
+        evaluations that are not included yet. This process's pending
+        counters are flushed first.
+        """
+        rule_metrics.flush()
+
+        rules = AdaptiveRule.objects.select_related('stats').order_by('name')
+        data = []
+        for rule in rules:
+            try:
+                stats = rule.stats
+            except RuleStats.DoesNotExist:
+                stats = RuleStats(rule=rule)
+            data.append({
+                'name': rule.name,
+                'is_active': rule.is_active,
+                'evaluation_count': stats.evaluation_count,
+                'fire_count': stats.fire_count,
+                'total_evaluation_seconds': stats.total_evaluation_seconds,
+                'mean_evaluation_us': round(stats.mean_evaluation_seconds * 1e6, 3),
+                'max_evaluation_us': round(stats.max_evaluation_seconds * 1e6, 3),
+                'last_fired_at': stats.last_fired_at,
+            })
+        data.sort(key=lambda row: row['total_evaluation_seconds'], reverse=True)
+
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class RuleWhatIfView(APIView):
+    """
+    API view evaluating the rules against hypothetical learners.
+    POST /api/adaptive/rules/what-if/
+    Requires staff access.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        """
+        Return the adaptations each signal dict would produce, in input order,
+        evaluated in memory against the rule set workers currently serve.
+        Nothing is stored and no rule firings are recorded.
+
+        Expected payload:
+        {
+            "inputs": [
+                {"learner_profile": ["adhd_profile"], "attention_drop_detected": true},
+                {"sensory_overload_detected": true},
+                ...
+            ]
+        }
+
+        Returns:
+        {
+            "rule_set_version": 12,
+            "results": [{"rules": ["AI_MICRO_GOALS", ...], "modifiers": {...}}, ...]
+        }
+        """
+        serializer = WhatIfSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = adaptation_documents(serializer.validated_data['inputs'])
+
+        return Response(
+            {
+                'rule_set_version': rule_registry.version,
+                'results': results
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+# Salt that makes stream tickets useless anywhere else
+STREAM_TICKET_SALT = 'adaptive_engine.adaptation_stream'
+
+
+class AdaptationStreamTicketView(APIView):
+    """
+    API view issuing tickets to open the adaptation stream.
+    POST /api/adaptive/adaptations/stream/ticket/
+    Requires authentication.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Return a ticket for GET /api/adaptive/adaptations/stream/?ticket=<ticket>:
+        {
+            "ticket": "...",
+            "expires_in": 30
+        }
+
+        EventSource cannot send an Authorization header, so the stream URL
+        carries this ticket instead of the access token. It is signed for
+        the stream only and expires after ADAPTIVE_STREAM_TICKET_SECONDS, so
+        a URL that ends up in a log is of no use.
+        """
+        ticket = signing.dumps(request.user.pk, salt=STREAM_TICKET_SALT)
+        return Response(
+            {
+                'ticket': ticket,
+                'expires_in': settings.ADAPTIVE_STREAM_TICKET_SECONDS
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+def _stream_user(request):
+    """
+    Return the active user the ``ticket`` query parameter was issued to, or
+    None if it is missing, forged or expired.
+    """
+    try:
+        user_id = signing.loads(
+            request.GET.get('ticket', ''),
+            salt=STREAM_TICKET_SALT,
+            max_age=settings.ADAPTIVE_STREAM_TICKET_SECONDS
+        )
+    except signing.BadSignature:
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).first()
+
+
+def _sse_event(etag, document):
+    return f'id: {etag}\nevent: adaptation\ndata: {json.dumps(document)}\n\n'
+
+
+async def adaptation_stream(request):
+    """
+    Server-sent event stream of the authenticated user's adaptations.
+    GET /api/adaptive/adaptations/stream/?ticket=<stream ticket>
+
+    Sends the current document first (unless Last-Event-ID already matches
+    its ETag), then an ``adaptation`` event every time it changes, with the
+    ETag as the event id. A comment line is sent every
+    ADAPTIVE_STREAM_HEARTBEAT_SECONDS to keep proxies from closing the
+    connection. The stream ends after ADAPTIVE_STREAM_MAX_SECONDS, so the
+    client reconnects with a fresh ticket (see AdaptationStreamTicketView),
+    which needs a valid access token.
+
+    Must be served through config/asgi.py; each open stream is one idle
+    coroutine holding at most one undelivered document.
+    """
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Stream ticket was not provided or is invalid.'}, status=401)
+    expires_at = time.time() + settings.ADAPTIVE_STREAM_MAX_SECONDS
+
+    subscription = adaptation_broker.subscribe(user.pk)
+    if subscription is None:
+        return JsonResponse({'detail': 'Too many open adaptation streams.'}, status=429)
+
+    try:
+        adaptation = await sync_to_async(get_adaptation)(user)
+    except BaseException:
+        adaptation_broker.unsubscribe(subscription)
+        raise
+    # Updates carrying the document sent below are not sent again
+    subscription.last_etag = adaptation.etag
+
+    async def events():
+        try:
+            if request.headers.get('Last-Event-ID') != adaptation.etag:
+                yield _sse_event(adaptation.etag, adaptation.document())
+            while True:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    return
+                update = await subscription.next(
+                    min(settings.ADAPTIVE_STREAM_HEARTBEAT_SECONDS, remaining)
+                )
+                if update is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield _sse_event(*update)
+        finally:
+            adaptation_broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import AI_Persona, ChatMessage
+from .models import AI_Persona, ChatMessage, ConversationSummary
 
 
 @admin.register(AI_Persona)
@@ -44,3 +44,15 @@ class ChatMessageAdmin(admin.ModelAdmin):
         """Display a preview of the message (first 50 characters)."""
         return obj.message[:50] + '...' if len(obj.message) > 50 else obj.message
     message_preview.short_description = 'Message Preview'
+
+
+@admin.register(ConversationSummary)
+class ConversationSummaryAdmin(admin.ModelAdmin):
+    """
+    Admin interface for ConversationSummary model.
+    """
+    list_display = ['user', 'ai_persona', 'summarized_message_count', 'summarized_until', 'updated_at']
+    list_filter = ['ai_persona']
+    search_fields = ['user__email', 'summary']
+    list_select_related = ['user', 'ai_persona']
+    readonly_fields = ['summarized_until', 'summarized_through_id', 'summarized_message_count', 'updated_at']
@@ -0,0 +1,132 @@
+"""
+In-process cache of assistant replies for repeated prompts.
+
+Students often send a persona near-identical requests ("explain fractions
+using pizza"). When ``ASSISTANT_RESPONSE_CACHE_ENABLED`` is set, ChatView
+looks a prompt up here before calling the provider, and a hit skips the
+upstream round trip entirely. Only messages that open a session (no earlier
+turn with the persona within ``ASSISTANT_SESSION_GAP_SECONDS``) are cached,
+since later replies depend on the session so far. With the cache enabled,
+session openings are answered without the earlier conversation or its
+summary, so a cached reply never carries another student's history.
+
+Entries are keyed by persona, a hash of the persona's system prompt (so
+editing the prompt retires its cached replies), the provider and the
+normalized message text. Each persona has its own LRU budget of
+``ASSISTANT_RESPONSE_CACHE_MAX_ENTRIES`` entries, so a busy persona cannot
+evict another persona's replies, and entries expire after
+``ASSISTANT_RESPONSE_CACHE_TTL_SECONDS``. Hits, misses, evictions and
+expirations are counted per persona. The cache and its counters are per
+worker process.
+"""
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def normalize_message(text):
+    """
+    Fold a message to the form used in cache keys: Unicode-normalized,
+    case-folded, whitespace collapsed and trailing punctuation dropped, so
+    "Explain fractions using pizza" and "explain  fractions using pizza?"
+    share an entry.
+    """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return ' '.join(text.split()).rstrip(' .!?')
+
+
+def prompt_version(system_prompt):
+    """Short hash identifying a version of a persona's system prompt."""
+    return hashlib.sha256(system_prompt.encode()).hexdigest()[:16]
+
+
+class PersonaCache:
+    """One persona's entries, least recently used first, and its counters."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+class ResponseCache:
+    """LRU + TTL cache of reply texts with a separate budget per persona."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._personas = {}
+
+    @staticmethod
+    def enabled():
+        return settings.ASSISTANT_RESPONSE_CACHE_ENABLED
+
+    @staticmethod
+    def key(provider, ai_persona, message_text):
+        """Return the cache key for a message to a persona."""
+        return (provider.name, prompt_version(ai_persona.system_prompt), normalize_message(message_text))
+
+    def _persona(self, persona_name):
+        persona = self._personas.get(persona_name)
+        if persona is None:
+            persona = self._personas[persona_name] = PersonaCache()
+        return persona
+
+    def get(self, persona_name, key):
+        """Return the cached reply, or None on a miss (expired entries are dropped)."""
+        now = time.monotonic()
+        with self._lock:
+            persona = self._persona(persona_name)
+            entry = persona.entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del persona.entries[key]
+                persona.expirations += 1
+                entry = None
+            if entry is None:
+                persona.misses += 1
+                return None
+            persona.entries.move_to_end(key)
+            persona.hits += 1
+            return entry[1]
+
+    def put(self, persona_name, key, reply):
+        """Store a reply, evicting the persona's least recently used entries over budget."""
+        max_entries = settings.ASSISTANT_RESPONSE_CACHE_MAX_ENTRIES
+        if max_entries <= 0:
+            return
+        expires_at = time.monotonic() + settings.ASSISTANT_RESPONSE_CACHE_TTL_SECONDS
+        with self._lock:
+            persona = self._persona(persona_name)
+            persona.entries[key] = (expires_at, reply)
+            persona.entries.move_to_end(key)
+            while len(persona.entries) > max_entries:
+                persona.entries.popitem(last=False)
+                persona.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._personas.clear()
+
+    def stats(self):
+        """Return ``{persona_name: counters}`` for this process."""
+        with self._lock:
+            return {
+                persona_name: {
+                    'entries': len(persona.entries),
+                    'hits': persona.hits,
+                    'misses': persona.misses,
+                    'hit_rate': round(persona.hits / (persona.hits + persona.misses), 4)
+                    if persona.hits + persona.misses else None,
+                    'evictions': persona.evictions,
+                    'expirations': persona.expirations,
+                }
+                for persona_name, persona in sorted(self._personas.items())
+            }
+
+
+response_cache = ResponseCache()
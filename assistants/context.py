@@ -0,0 +1,246 @@
+"""
+Conversation context for assistant replies.
+
+``build_context`` turns a user's new message into the message list sent to
+the provider: the persona's system prompt, the rolling summary of older
+turns, as many recent turns as fit ``ASSISTANT_CONTEXT_TOKEN_BUDGET``, and
+the new message.
+
+Recent turns are read newest first through the (user, ai_persona,
+timestamp) index of ChatMessage, starting after the last summarized message
+and capped at ``ASSISTANT_CONTEXT_MAX_MESSAGES`` rows, so the cost does not
+grow with the length of the conversation. Turns that fall out of the
+budget are folded into the ConversationSummary once at least
+``ASSISTANT_SUMMARY_FOLD_MESSAGES`` of them have accumulated: the provider
+is asked to extend the stored summary with just those turns, so a summary
+is never regenerated from the whole history.
+
+Folding happens after the reply has been saved, on one background thread
+per process (``schedule_fold``), so it never delays a reply. If the
+provider cannot summarize, the turns are appended to the summary as a
+transcript trimmed to ``ASSISTANT_SUMMARY_MAX_TOKENS`` instead.
+
+Token counts are estimated from text length (about four characters per
+token), which is close enough for budgeting without a tokenizer dependency.
+"""
+import dataclasses
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ChatMessage, ConversationSummary
+from .providers import ProviderError
+
+logger = logging.getLogger(__name__)
+
+# Tokens added per message for role and formatting
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a tutoring conversation between a student "
+    "and an assistant. Update the summary with the new turns below. Keep what the "
+    "student is working on, what they found hard, what helped and anything they "
+    "asked you to remember. Reply with the updated summary only, in at most "
+    "150 words."
+)
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in ``text``."""
+    return (len(text) + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+def _role(message):
+    return 'assistant' if message.is_from_bot else 'user'
+
+
+@dataclass
+class ConversationContext:
+    """
+    The messages for the provider, how much history went into them, the
+    newest out-of-context message to fold into the summary (if due), and
+    whether the new message opens a session: no earlier turn within
+    ``ASSISTANT_SESSION_GAP_SECONDS``.
+    """
+    messages: list
+    history_messages: int
+    summarized: bool
+    fold_until: object = None
+    opens_session: bool = True
+
+    def without_history(self):
+        """Return this context with only the system prompt and the new message."""
+        return dataclasses.replace(
+            self,
+            messages=[self.messages[0], self.messages[-1]],
+            history_messages=0,
+            summarized=False
+        )
+
+
+def _after_summary(queryset, summary):
+    """Restrict ``queryset`` to messages after the summarized ones, by (timestamp, id)."""
+    if summary is None or summary.summarized_through_id is None:
+        return queryset
+    return queryset.filter(
+        Q(timestamp__gt=summary.summarized_until)
+        | Q(timestamp=summary.summarized_until, pk__gt=summary.summarized_through_id)
+    )
+
+
+def _summary_limit():
+    return settings.ASSISTANT_SUMMARY_MAX_TOKENS * 4
+
+
+def fold_into_summary(provider, user_id, ai_persona_id, until_id):
+    """
+    Fold the unsummarized messages up to and including message ``until_id``
+    (oldest first, at most ``ASSISTANT_SUMMARY_FOLD_MAX_MESSAGES``) into the
+    conversation summary. Returns the number of messages folded.
+
+    The provider is called outside any transaction; the summary is then
+    only updated if no concurrent fold moved it on in the meantime.
+    """
+    summary, _ = ConversationSummary.objects.get_or_create(user_id=user_id, ai_persona_id=ai_persona_id)
+    until = ChatMessage.objects.filter(pk=until_id).values_list('timestamp', flat=True).first()
+    if until is None:
+        return 0
+    turns = list(
+        _after_summary(
+            ChatMessage.objects.filter(user_id=user_id, ai_persona_id=ai_persona_id),
+            summary
+        )
+        .filter(Q(timestamp__lt=until) | Q(timestamp=until, pk__lte=until_id))
+        .order_by('timestamp', 'pk')[:settings.ASSISTANT_SUMMARY_FOLD_MAX_MESSAGES]
+    )
+    if not turns:
+        return 0
+
+    transcript = '\n'.join(
+        f"{'Assistant' if turn.is_from_bot else 'Student'}: {turn.message}" for turn in turns
+    )
+    try:
+        updated = provider.complete([
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Current summary:\n{summary.summary or '(none)'}\n\nNew turns:\n{transcript}"},
+        ]).strip()[:_summary_limit()]
+    except ProviderError:
+        # Fall back to truncation: keep the most recent part of the transcript
+        updated = f"{summary.summary}\n{transcript}".strip()[-_summary_limit():]
+
+    folded = ConversationSummary.objects.filter(
+        pk=summary.pk,
+        summarized_through_id=summary.summarized_through_id
+    ).update(
+        summary=updated,
+        summarized_until=turns[-1].timestamp,
+        summarized_through_id=turns[-1].pk,
+        summarized_message_count=summary.summarized_message_count + len(turns),
+        updated_at=timezone.now()
+    )
+    return len(turns) if folded else 0
+
+
+_fold_executor = None
+_fold_lock = threading.Lock()
+_folds_pending = set()
+
+
+def _fold_in_background(provider, user_id, ai_persona_id, until_id):
+    close_old_connections()
+    try:
+        fold_into_summary(provider, user_id, ai_persona_id, until_id)
+    except Exception:
+        logger.exception('Could not fold conversation of user %s with persona %s', user_id, ai_persona_id)
+    finally:
+        with _fold_lock:
+            _folds_pending.discard((user_id, ai_persona_id))
+        connection.close()
+
+
+def schedule_fold(provider, user_id, ai_persona_id, until_id):
+    """
+    Fold a conversation into its summary on this process's background
+    thread. A conversation already waiting to be folded is not queued twice.
+    """
+    global _fold_executor
+    with _fold_lock:
+        if (user_id, ai_persona_id) in _folds_pending:
+            return
+        _folds_pending.add((user_id, ai_persona_id))
+        if _fold_executor is None:
+            _fold_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='summary-fold')
+    _fold_executor.submit(_fold_in_background, provider, user_id, ai_persona_id, until_id)
+
+
+def build_context(user, ai_persona, user_message):
+    """
+    Return the ConversationContext for answering ``user_message``, a saved
+    ChatMessage. When enough turns no longer fit the budget, ``fold_until``
+    names the newest of them; pass it to ``schedule_fold`` once the reply
+    has been saved.
+    """
+    summary = ConversationSummary.objects.filter(user=user, ai_persona=ai_persona).first()
+
+    budget = (
+        settings.ASSISTANT_CONTEXT_TOKEN_BUDGET
+        - estimate_tokens(ai_persona.system_prompt)
+        - estimate_tokens(user_message.message)
+    )
+    if summary is not None and summary.summary:
+        budget -= estimate_tokens(summary.summary)
+
+    # Newest first, so the most recent turns are kept when the budget runs out.
+    # The extra rows show whether enough turns are out of context to fold.
+    max_messages = settings.ASSISTANT_CONTEXT_MAX_MESSAGES
+    fold_messages = settings.ASSISTANT_SUMMARY_FOLD_MESSAGES
+    recent = list(
+        _after_summary(
+            ChatMessage.objects.filter(user=user, ai_persona=ai_persona),
+            summary
+        )
+        .exclude(pk=user_message.pk)
+        .order_by('-timestamp', '-pk')[:max_messages + fold_messages]
+    )
+    window = []
+    for message in recent[:max_messages]:
+        cost = estimate_tokens(message.message)
+        if cost > budget:
+            break
+        budget -= cost
+        window.append(message)
+
+    # Older unsummarized turns are left out until enough accumulate to fold
+    dropped = recent[len(window):]
+
+    messages = [{"role": "system", "content": ai_persona.system_prompt}]
+    if summary is not None and summary.summary:
+        messages.append({
+            "role": "system",
+            "content": f"Summary of your earlier conversation with this student:\n{summary.summary}"
+        })
+    messages.extend(
+        {"role": _role(message), "content": message.message} for message in reversed(window)
+    )
+    messages.append({"role": "user", "content": user_message.message})
+
+    if recent:
+        last_turn_at = recent[0].timestamp
+    else:
+        last_turn_at = summary.summarized_until if summary is not None else None
+    session_gap = timedelta(seconds=settings.ASSISTANT_SESSION_GAP_SECONDS)
+
+    return ConversationContext(
+        messages=messages,
+        history_messages=len(window),
+        summarized=summary is not None and bool(summary.summary),
+        fold_until=dropped[0] if len(dropped) >= fold_messages else None,
+        opens_session=last_turn_at is None or user_message.timestamp - last_turn_at >= session_gap
+    )
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistants', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('summary', models.TextField(blank=True, default='', help_text='Summary of the conversation up to the summarized message')),
+                ('summarized_until', models.DateTimeField(blank=True, help_text='Timestamp of the last message folded into the summary', null=True)),
+                ('summarized_through_id', models.PositiveBigIntegerField(blank=True, help_text='ID of the last message folded into the summary', null=True)),
+                ('summarized_message_count', models.PositiveIntegerField(default=0, help_text='Number of messages folded into the summary')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('ai_persona', models.ForeignKey(help_text='The AI persona the conversation is with', on_delete=django.db.models.deletion.CASCADE, related_name='conversation_summaries', to='assistants.ai_persona')),
+                ('user', models.ForeignKey(help_text='The user whose conversation is summarized', on_delete=django.db.models.deletion.CASCADE, related_name='conversation_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Conversation summary',
+                'verbose_name_plural': 'Conversation summaries',
+                'constraints': [models.UniqueConstraint(fields=('user', 'ai_persona'), name='unique_conversation_summary')],
+            },
+        ),
+    ]
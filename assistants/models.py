@@ -76,3 +76,63 @@ class ChatMessage(models.Model):
     def __str__(self):
         sender = self.ai_persona.name if self.is_from_bot else self.user.username
         return f"{sender}: {self.message[:50]}..."
+
+
+class ConversationSummary(models.Model):
+    """
+    ConversationSummary holds the rolling summary of the older turns of a
+    User's conversation with an AI_Persona. Turns that no longer fit the
+    context budget are folded into it a few at a time, up to and including
+    the message identified by (summarized_until, summarized_through_id).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='conversation_summaries',
+        help_text='The user whose conversation is summarized'
+    )
+    
+    ai_persona = models.ForeignKey(
+        AI_Persona,
+        on_delete=models.CASCADE,
+        related_name='conversation_summaries',
+        help_text='The AI persona the conversation is with'
+    )
+    
+    summary = models.TextField(
+        blank=True,
+        default='',
+        help_text='Summary of the conversation up to the summarized message'
+    )
+    
+    summarized_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Timestamp of the last message folded into the summary'
+    )
+    
+    summarized_through_id = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text='ID of the last message folded into the summary'
+    )
+    
+    summarized_message_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of messages folded into the summary'
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Conversation summary'
+        verbose_name_plural = 'Conversation summaries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ai_persona'],
+                name='unique_conversation_summary'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Summary of {self.user} with {self.ai_persona.name} ({self.summarized_message_count} messages)"
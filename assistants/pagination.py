@@ -0,0 +1,128 @@
+"""
+Keyset pagination for chat history.
+
+Pages are cut on (timestamp, id) rather than with OFFSET, and no COUNT(*)
+is run, so every page is an index range scan of the same size however far
+back in a conversation it is. Cursors are opaque strings naming the
+(timestamp, id) of a page's first or last message:
+
+    ?before=<cursor>  the messages just older than the cursor (default: the latest)
+    ?after=<cursor>   the messages just newer than the cursor
+
+Each page lists its messages oldest first, with ``previous`` and ``next``
+links to the adjacent pages (None when there is nothing more that way).
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(message):
+    """Return the opaque cursor for a ChatMessage's (timestamp, id) position."""
+    position = f'{message.timestamp.isoformat()}|{message.pk}'
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ``(timestamp, id)`` of a cursor, raising ValidationError if it is malformed."""
+    try:
+        position = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = position.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValidationError('Invalid cursor.')
+
+
+def newer_than(queryset, timestamp, pk):
+    """
+    Rows after the (timestamp, id) position. The plain ``timestamp >=``
+    bound lets the database seek the (user, ai_persona, timestamp) index to
+    the cursor; the OR alone would make it scan the whole conversation.
+    """
+    return queryset.filter(timestamp__gte=timestamp).filter(
+        Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk)
+    )
+
+
+def older_than(queryset, timestamp, pk):
+    """Rows before the (timestamp, id) position, bounded like ``newer_than``."""
+    return queryset.filter(timestamp__lte=timestamp).filter(
+        Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk)
+    )
+
+
+class ChatHistoryPagination(BasePagination):
+    """Cursor pagination of ChatMessage rows by (timestamp, id)."""
+
+    before_query_param = 'before'
+    after_query_param = 'after'
+    limit_query_param = 'limit'
+    max_limit = 200
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return settings.ASSISTANT_HISTORY_PAGE_SIZE
+        return min(max(limit, 1), self.max_limit)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        limit = self.get_limit(request)
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+
+        if after:
+            timestamp, pk = decode_cursor(after)
+            rows = list(newer_than(queryset, timestamp, pk).order_by('timestamp', 'pk')[:limit + 1])
+            page = rows[:limit]
+            self.has_newer = len(rows) > limit
+            # The cursor's own message may have been deleted since
+            self.has_older = bool(page) and older_than(queryset, page[0].timestamp, page[0].pk).exists()
+        else:
+            if before:
+                timestamp, pk = decode_cursor(before)
+                queryset_before = older_than(queryset, timestamp, pk)
+            else:
+                queryset_before = queryset
+            # Newest first so the page ends at the cursor, then put back in reading order
+            rows = list(queryset_before.order_by('-timestamp', '-pk')[:limit + 1])
+            page = rows[:limit][::-1]
+            self.has_older = len(rows) > limit
+            self.has_newer = (
+                bool(before) and bool(page)
+                and newer_than(queryset, page[-1].timestamp, page[-1].pk).exists()
+            )
+
+        self.page = page
+        return page
+
+    def _link(self, param, message):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.before_query_param)
+        url = remove_query_param(url, self.after_query_param)
+        return replace_query_param(url, param, encode_cursor(message))
+
+    def get_previous_link(self):
+        if not self.page or not self.has_older:
+            return None
+        return self._link(self.before_query_param, self.page[0])
+
+    def get_next_link(self):
+        if not self.page or not self.has_newer:
+            return None
+        return self._link(self.after_query_param, self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'previous': self.get_previous_link(),
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -0,0 +1,303 @@
+"""
+Chat completion providers for the AI personas.
+
+ChatView talks to a provider instead of building an OpenAI client per
+request. ``get_provider()`` returns one provider per worker process, chosen
+by ``ASSISTANT_PROVIDER``:
+
+    openai  OpenAIProvider: long-lived pooled OpenAI clients with timeouts,
+            retries with jittered exponential backoff and a circuit breaker
+    stub    StubProvider: deterministic local replies with configurable
+            latency, for load tests and CI without network access or an API key
+
+Providers expose ``complete(messages)`` returning the reply text and
+``stream(messages)``, an async iterator of text deltas.
+"""
+import asyncio
+import hashlib
+import random
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+    Timeout,
+)
+
+
+class ProviderError(Exception):
+    """Raised when a provider cannot produce a reply."""
+
+
+class ProviderUnavailable(ProviderError):
+    """Raised without calling upstream, e.g. while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls
+    for ``reset_seconds``. After that one trial call is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def before_call(self):
+        """
+        Raise ProviderUnavailable if the call should not be attempted.
+        Returns True when the call is the half-open trial, which the caller
+        must end with record_success, record_failure or release.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_running:
+                raise ProviderUnavailable('The assistant is temporarily unavailable, please try again shortly.')
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """End a trial call without a verdict (e.g. cancelled), so another can be tried."""
+        with self._lock:
+            self._trial_running = False
+
+
+class ChatProvider:
+    """Base class for chat completion providers."""
+
+    name = 'base'
+
+    def configuration_error(self):
+        """Return why the provider cannot be used, or None if it is ready."""
+        return None
+
+    def complete(self, messages):
+        """Return the reply text for a list of chat messages."""
+        raise NotImplementedError
+
+    async def stream(self, messages):
+        """Yield the reply as text deltas."""
+        raise NotImplementedError
+        yield
+
+
+class OpenAIProvider(ChatProvider):
+    """
+    OpenAI chat completions through clients that live as long as the worker,
+    so connections are pooled and reused across requests.
+    """
+
+    name = 'openai'
+
+    # Errors worth retrying; anything else (bad request, auth) fails at once
+    RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+    def __init__(self):
+        self.model = settings.ASSISTANT_MODEL
+        self.max_retries = settings.ASSISTANT_MAX_RETRIES
+        self.retry_base_delay = settings.ASSISTANT_RETRY_BASE_DELAY_SECONDS
+        self.timeout = Timeout(
+            settings.ASSISTANT_TIMEOUT_SECONDS,
+            connect=settings.ASSISTANT_CONNECT_TIMEOUT_SECONDS
+        )
+        self.breaker = CircuitBreaker(
+            settings.ASSISTANT_CIRCUIT_FAILURE_THRESHOLD,
+            settings.ASSISTANT_CIRCUIT_RESET_SECONDS
+        )
+        self._lock = threading.Lock()
+        self._client = None
+        # Async clients hold connections bound to an event loop, so keep one per loop
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def configuration_error(self):
+        if not settings.OPENAI_API_KEY:
+            return 'OpenAI API key is not configured'
+        return None
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                # Retries are handled here, with jitter and the circuit breaker
+                self._client = OpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    timeout=self.timeout,
+                    max_retries=0
+                )
+            return self._client
+
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                timeout=self.timeout,
+                max_retries=0
+            )
+        return client
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff for a retry attempt (0-based)."""
+        return random.uniform(0, self.retry_base_delay * 2 ** attempt)
+
+    def complete(self, messages):
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            try:
+                response = self.client().chat.completions.create(model=self.model, messages=messages)
+            except self.RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise ProviderError(str(e)) from e
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+            except Exception as e:
+                # Not an upstream outage (e.g. a bad request): no verdict on the circuit
+                raise ProviderError(str(e)) from e
+            finally:
+                if trial:
+                    self.breaker.release()
+            self.breaker.record_success()
+            return response.choices[0].message.content
+
+    async def stream(self, messages):
+        trial = False
+        try:
+            # Only opening the stream is retried; once tokens flow they are not replayed
+            attempt = 0
+            while True:
+                trial = self.breaker.before_call()
+                try:
+                    stream = await self.async_client().chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        stream=True
+                    )
+                    break
+                except self.RETRYABLE_ERRORS as e:
+                    self.breaker.record_failure()
+                    trial = False
+                    if attempt >= self.max_retries:
+                        raise ProviderError(str(e)) from e
+                    await asyncio.sleep(self.backoff(attempt))
+                    attempt += 1
+                except Exception as e:
+                    raise ProviderError(str(e)) from e
+
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+            except self.RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                trial = False
+                raise ProviderError(str(e)) from e
+            except Exception as e:
+                raise ProviderError(str(e)) from e
+            finally:
+                # Closing the response stops generation upstream (e.g. on client disconnect)
+                await stream.close()
+            self.breaker.record_success()
+            trial = False
+        finally:
+            # A trial that ended without a verdict (cancelled, non-retryable error)
+            # must not keep the circuit open for good
+            if trial:
+                self.breaker.release()
+
+
+class StubProvider(ChatProvider):
+    """
+    Deterministic local provider: the same messages always get the same reply.
+    ``ASSISTANT_STUB_LATENCY_SECONDS`` is waited before the reply (or first
+    token) and ``ASSISTANT_STUB_TOKEN_DELAY_SECONDS`` between streamed tokens.
+    """
+
+    name = 'stub'
+
+    OPENINGS = (
+        "Great question!",
+        "Let's take this one step at a time.",
+        "Here is a simple way to think about it.",
+        "Good thinking, let's break it down.",
+    )
+
+    def __init__(self):
+        self.latency = settings.ASSISTANT_STUB_LATENCY_SECONDS
+        self.token_delay = settings.ASSISTANT_STUB_TOKEN_DELAY_SECONDS
+
+    def reply(self, messages):
+        last_message = next(
+            (message['content'] for message in reversed(messages) if message['role'] == 'user'),
+            ''
+        )
+        digest = hashlib.sha256(repr(messages).encode()).digest()
+        opening = self.OPENINGS[digest[0] % len(self.OPENINGS)]
+        return f'{opening} You asked: "{last_message}". (stub reply {digest.hex()[:8]})'
+
+    def complete(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.reply(messages)
+
+    async def stream(self, messages):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        words = self.reply(messages).split(' ')
+        for position, word in enumerate(words):
+            if position and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield word if position == len(words) - 1 else word + ' '
+
+
+PROVIDERS = {
+    OpenAIProvider.name: OpenAIProvider,
+    StubProvider.name: StubProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """Return this worker's provider, created on first use from ASSISTANT_PROVIDER."""
+    global _provider
+    with _provider_lock:
+        if _provider is None or _provider.name != settings.ASSISTANT_PROVIDER:
+            try:
+                _provider = PROVIDERS[settings.ASSISTANT_PROVIDER]()
+            except KeyError:
+                raise ImproperlyConfigured(f'Unknown ASSISTANT_PROVIDER: {settings.ASSISTANT_PROVIDER}')
+        return _provider
@@ -6,7 +6,8 @@ class ChatMessageSerializer(serializers.ModelSerializer):
     """
     Serializer for ChatMessage model.
     Includes id, message, is_from_bot, timestamp.
-    Also accepts a write-only persona_name field to choose the AI persona.
+    Also accepts a write-only persona_name field to choose the AI persona,
+    and a write-only stream flag to receive the reply as server-sent events.
     """
     persona_name = serializers.CharField(
         write_only=True,
@@ -14,9 +15,16 @@ class ChatMessageSerializer(serializers.ModelSerializer):
         help_text='Name of the AI persona (e.g., DANI or LUCAS)'
     )
     
+    stream = serializers.BooleanField(
+        write_only=True,
+        required=False,
+        default=False,
+        help_text='Stream the reply token by token as server-sent events'
+    )
+    
     class Meta:
         model = ChatMessage
-        fields = ['id', 'message', 'is_from_bot', 'timestamp', 'persona_name']
+        fields = ['id', 'message', 'is_from_bot', 'timestamp', 'persona_name', 'stream']
         read_only_fields = ['id', 'is_from_bot', 'timestamp']
     
     def validate_persona_name(self, value):
@@ -1,3 +1,509 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from openai import APIConnectionError
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from core.models import User
+from .cache import ResponseCache, normalize_message, prompt_version, response_cache
+from .context import _fold_in_background, build_context, estimate_tokens, fold_into_summary
+from .models import AI_Persona, ChatMessage, ConversationSummary
+from .pagination import decode_cursor, encode_cursor, older_than
+from .providers import CircuitBreaker, OpenAIProvider, ProviderError, ProviderUnavailable, StubProvider
+
+
+def parse_events(chunks):
+    """Return ``[(event, data)]`` for server-sent event chunks."""
+    events = []
+    for chunk in chunks:
+        fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@override_settings(ASSISTANT_PROVIDER='stub', ASSISTANT_STUB_LATENCY_SECONDS=0, ASSISTANT_STUB_TOKEN_DELAY_SECONDS=0)
+class ChatTestCase(TestCase):
+
+    def setUp(self):
+        self.persona = AI_Persona.objects.create(
+            name='LUCAS', full_name='Learning Understanding Coach', system_prompt='You are Lucas.'
+        )
+        self.user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def chat(self, message):
+        return self.client.post('/api/chat/', {'message': message, 'persona_name': 'LUCAS'}, format='json')
+
+
+class ChatStreamTests(ChatTestCase):
+
+    async def stream(self, message, limit=None):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.post(
+            '/api/chat/',
+            {'message': message, 'persona_name': 'LUCAS', 'stream': True},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = []
+        async for chunk in response.streaming_content:
+            chunks.append(chunk)
+            if len(chunks) == limit:
+                break
+        await response.streaming_content.aclose()
+        return parse_events(chunks)
+
+    async def test_reply_is_streamed_and_saved_once(self):
+        events = await self.stream('What is a fraction?')
+        names = [event for event, data in events]
+        self.assertEqual(names[0], 'start')
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(set(names[1:-1]), {'token'})
+        self.assertGreater(len(names), 3)
+
+        reply = ''.join(data['delta'] for event, data in events[1:-1])
+        self.assertEqual(events[0][1], {'persona': 'LUCAS', 'persona_full_name': 'Learning Understanding Coach'})
+        self.assertEqual(events[-1][1]['message'], reply)
+        self.assertIn('You asked: "What is a fraction?"', reply)
+        messages = [message async for message in ChatMessage.objects.order_by('timestamp', 'pk')]
+        self.assertEqual(
+            [(message.is_from_bot, message.message) for message in messages],
+            [(False, 'What is a fraction?'), (True, reply)]
+        )
+
+    async def test_streamed_and_plain_replies_agree(self):
+        events = await self.stream('What is a fraction?')
+        await ChatMessage.objects.all().adelete()
+
+        response = await sync_to_async(self.chat)('What is a fraction?')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['message'], events[-1][1]['message'])
+
+    async def test_provider_errors_end_the_stream_without_saving(self):
+        async def failing_stream(provider, messages):
+            yield 'Half '
+            raise ProviderError('upstream closed the connection')
+
+        with mock.patch.object(StubProvider, 'stream', failing_stream):
+            events = await self.stream('What is a fraction?')
+        self.assertEqual([event for event, data in events], ['start', 'token', 'error'])
+        self.assertEqual(events[-1][1], {'error': 'OpenAI API error: upstream closed the connection'})
+        self.assertFalse(await ChatMessage.objects.filter(is_from_bot=True).aexists())
+
+    async def test_disconnected_client_stops_the_reply(self):
+        events = await self.stream('What is a fraction?', limit=2)
+        self.assertEqual([event for event, data in events], ['start', 'token'])
+        self.assertFalse(await ChatMessage.objects.filter(is_from_bot=True).aexists())
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('assistants.providers.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+
+    def open_circuit(self):
+        for _ in range(3):
+            self.assertFalse(self.breaker.before_call())
+            self.breaker.record_failure()
+
+    def test_closed_until_the_failure_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.before_call())
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.before_call())
+
+    def test_open_circuit_rejects_calls_until_reset(self):
+        self.open_circuit()
+        with self.assertRaises(ProviderUnavailable):
+            self.breaker.before_call()
+        self.now += 29
+        with self.assertRaises(ProviderUnavailable):
+            self.breaker.before_call()
+
+    def test_half_open_lets_one_trial_through(self):
+        self.open_circuit()
+        self.now += 30
+        self.assertTrue(self.breaker.before_call())
+        with self.assertRaises(ProviderUnavailable):
+            self.breaker.before_call()
+
+    def test_successful_trial_closes_the_circuit(self):
+        self.open_circuit()
+        self.now += 30
+        self.assertTrue(self.breaker.before_call())
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.before_call())
+        self.assertFalse(self.breaker.before_call())
+
+    def test_failed_trial_reopens_the_circuit(self):
+        self.open_circuit()
+        self.now += 30
+        self.assertTrue(self.breaker.before_call())
+        self.breaker.record_failure()
+        with self.assertRaises(ProviderUnavailable):
+            self.breaker.before_call()
+        self.now += 30
+        self.assertTrue(self.breaker.before_call())
+
+    def test_released_trial_lets_the_next_call_try(self):
+        self.open_circuit()
+        self.now += 30
+        self.assertTrue(self.breaker.before_call())
+        self.breaker.release()
+        self.assertTrue(self.breaker.before_call())
+
+
+@override_settings(
+    ASSISTANT_MAX_RETRIES=2, ASSISTANT_RETRY_BASE_DELAY_SECONDS=0,
+    ASSISTANT_CIRCUIT_FAILURE_THRESHOLD=3, ASSISTANT_CIRCUIT_RESET_SECONDS=30
+)
+class OpenAIProviderTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('assistants.providers.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.provider = OpenAIProvider()
+        self.create = mock.Mock()
+        client = mock.Mock()
+        client.chat.completions.create = self.create
+        patcher = mock.patch.object(self.provider, 'client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reply(self, text):
+        return mock.Mock(choices=[mock.Mock(message=mock.Mock(content=text))])
+
+    def test_outages_are_retried_then_open_the_circuit(self):
+        outage = APIConnectionError(request=mock.Mock())
+        self.create.side_effect = [outage, outage, self.reply('Hello')]
+        self.assertEqual(self.provider.complete([]), 'Hello')
+
+        self.create.side_effect = outage
+        with self.assertRaises(ProviderError):
+            self.provider.complete([])
+        self.assertEqual(self.create.call_count, 6)
+        with self.assertRaises(ProviderUnavailable):
+            self.provider.complete([])
+        self.assertEqual(self.create.call_count, 6)
+
+    def test_bad_requests_are_not_retried_and_release_the_trial(self):
+        self.create.side_effect = ValueError('bad request')
+        with self.assertRaises(ProviderError):
+            self.provider.complete([])
+        self.assertEqual(self.create.call_count, 1)
+
+        for _ in range(3):
+            self.provider.breaker.record_failure()
+        self.now += 30
+        with self.assertRaises(ProviderError):
+            self.provider.complete([])
+        # The failed trial gave no verdict, so the next call may try again
+        self.create.side_effect = [self.reply('Hello')]
+        self.assertEqual(self.provider.complete([]), 'Hello')
+
+
+@override_settings(ASSISTANT_RESPONSE_CACHE_MAX_ENTRIES=2, ASSISTANT_RESPONSE_CACHE_TTL_SECONDS=60)
+class ResponseCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('assistants.cache.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ResponseCache()
+
+    def test_normalized_messages_share_a_key(self):
+        self.assertEqual(
+            normalize_message('Explain  fractions using PIZZA?'),
+            normalize_message('explain fractions using pizza')
+        )
+        self.assertNotEqual(prompt_version('You are DANI.'), prompt_version('You are LUCAS.'))
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get('DANI', 'a'))
+        self.cache.put('DANI', 'a', 'reply a')
+        self.assertEqual(self.cache.get('DANI', 'a'), 'reply a')
+        self.assertIsNone(self.cache.get('LUCAS', 'a'))
+        stats = self.cache.stats()
+        self.assertEqual((stats['DANI']['hits'], stats['DANI']['misses']), (1, 1))
+        self.assertEqual(stats['DANI']['hit_rate'], 0.5)
+
+    def test_least_recently_used_entry_is_evicted_per_persona(self):
+        self.cache.put('DANI', 'a', 'reply a')
+        self.cache.put('DANI', 'b', 'reply b')
+        self.cache.put('LUCAS', 'c', 'reply c')
+        self.cache.get('DANI', 'a')
+        self.cache.put('DANI', 'd', 'reply d')
+
+        self.assertIsNone(self.cache.get('DANI', 'b'))
+        self.assertEqual(self.cache.get('DANI', 'a'), 'reply a')
+        self.assertEqual(self.cache.get('DANI', 'd'), 'reply d')
+        self.assertEqual(self.cache.get('LUCAS', 'c'), 'reply c')
+        self.assertEqual(self.cache.stats()['DANI']['evictions'], 1)
+
+    def test_entries_expire(self):
+        self.cache.put('DANI', 'a', 'reply a')
+        self.now += 59
+        self.assertEqual(self.cache.get('DANI', 'a'), 'reply a')
+        self.now += 1
+        self.assertIsNone(self.cache.get('DANI', 'a'))
+        self.assertEqual(self.cache.stats()['DANI']['expirations'], 1)
+        self.assertEqual(self.cache.stats()['DANI']['entries'], 0)
+
+
+@override_settings(ASSISTANT_RESPONSE_CACHE_ENABLED=True, ASSISTANT_SESSION_GAP_SECONDS=1800)
+class ChatResponseCacheTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+        self.other = User.objects.create_user(email='other@example.com', password='pass', role='student')
+        patcher = mock.patch.object(StubProvider, 'complete', autospec=True, side_effect=StubProvider.reply)
+        self.complete = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def chat_as(self, user, message):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/chat/', {'message': message, 'persona_name': 'LUCAS'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['message']
+
+    def age_messages(self, user, minutes):
+        ChatMessage.objects.filter(user=user).update(timestamp=timezone.now() - timedelta(minutes=minutes))
+
+    def test_session_openings_are_answered_from_the_cache(self):
+        reply = self.chat_as(self.user, 'Explain fractions using pizza')
+        self.assertEqual(self.complete.call_count, 1)
+
+        # A returning student whose last turn is older than the session gap
+        self.chat_as(self.other, 'I like dinosaurs')
+        self.age_messages(self.other, 31)
+        self.assertEqual(self.chat_as(self.other, 'explain  fractions using pizza?'), reply)
+        self.assertEqual(self.complete.call_count, 2)
+        self.assertEqual(response_cache.stats()['LUCAS']['hits'], 1)
+        self.assertEqual(
+            ChatMessage.objects.filter(user=self.other, is_from_bot=True).latest('timestamp').message, reply
+        )
+
+    def test_openings_are_generated_without_the_earlier_conversation(self):
+        self.chat_as(self.user, 'I like dinosaurs')
+        self.age_messages(self.user, 31)
+        self.chat_as(self.user, 'Explain fractions using pizza')
+        messages = self.complete.call_args.args[1]
+        self.assertEqual([message['role'] for message in messages], ['system', 'user'])
+
+    def test_messages_within_a_session_are_not_cached(self):
+        self.chat_as(self.user, 'Explain fractions using pizza')
+        self.chat_as(self.other, 'I like dinosaurs')
+        self.age_messages(self.other, 29)
+        self.chat_as(self.other, 'Explain fractions using pizza')
+        self.assertEqual(self.complete.call_count, 3)
+        self.assertEqual(response_cache.stats()['LUCAS']['hits'], 0)
+        messages = self.complete.call_args.args[1]
+        self.assertEqual([message['role'] for message in messages], ['system', 'user', 'assistant', 'user'])
+
+    async def test_streamed_openings_are_answered_from_the_cache(self):
+        reply = await sync_to_async(self.chat_as)(self.user, 'Explain fractions using pizza')
+        client = AsyncClient()
+        await client.aforce_login(self.other)
+        response = await client.post(
+            '/api/chat/',
+            {'message': 'Explain fractions using pizza', 'persona_name': 'LUCAS', 'stream': True},
+            content_type='application/json'
+        )
+        events = parse_events([chunk async for chunk in response.streaming_content])
+        self.assertEqual(events[1], ('token', {'delta': reply}))
+        self.assertEqual(events[-1][1]['message'], reply)
+        self.assertEqual(self.complete.call_count, 1)
+
+
+@override_settings(
+    ASSISTANT_CONTEXT_TOKEN_BUDGET=200, ASSISTANT_CONTEXT_MAX_MESSAGES=40,
+    ASSISTANT_SUMMARY_FOLD_MESSAGES=4, ASSISTANT_SUMMARY_FOLD_MAX_MESSAGES=40, ASSISTANT_SUMMARY_MAX_TOKENS=400
+)
+class ConversationContextTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.provider = mock.Mock()
+        self.provider.complete.return_value = 'Student likes pizza.'
+
+    def say(self, *texts):
+        """Save alternating student and assistant turns, one second apart, and return them."""
+        start = timezone.now() - timedelta(minutes=5)
+        turns = []
+        for i, text in enumerate(texts):
+            turn = ChatMessage.objects.create(user=self.user, ai_persona=self.persona, message=text, is_from_bot=i % 2 == 1)
+            ChatMessage.objects.filter(pk=turn.pk).update(timestamp=start + timedelta(seconds=len(turns)))
+            turn.refresh_from_db()
+            turns.append(turn)
+        return turns
+
+    def context(self, text='And now?'):
+        message = ChatMessage.objects.create(user=self.user, ai_persona=self.persona, message=text)
+        return build_context(self.user, self.persona, message)
+
+    def test_recent_turns_that_fit_the_budget_are_sent(self):
+        # Each turn costs 14 tokens; 200 - system prompt - new message leaves room for 13
+        turns = self.say(*[f'turn {i:02d} ' + 'x' * 32 for i in range(20)])
+        self.assertEqual(estimate_tokens(turns[0].message), 14)
+        context = self.context()
+
+        self.assertEqual(context.history_messages, 13)
+        self.assertEqual(
+            [(message['role'], message['content']) for message in context.messages[1:-1]],
+            [('assistant' if turn.is_from_bot else 'user', turn.message) for turn in turns[7:]]
+        )
+        self.assertEqual(context.messages[0], {'role': 'system', 'content': 'You are Lucas.'})
+        self.assertEqual(context.messages[-1], {'role': 'user', 'content': 'And now?'})
+        # Seven turns are out of context, enough to fold up to the newest of them
+        self.assertEqual(context.fold_until, turns[6])
+
+    def test_folding_waits_until_enough_turns_are_out_of_context(self):
+        self.say(*[f'turn {i:02d} ' + 'x' * 32 for i in range(15)])
+        self.assertIsNone(self.context().fold_until)
+
+    def test_folded_turns_are_replaced_by_the_summary(self):
+        turns = self.say(*[f'turn {i:02d} ' + 'x' * 32 for i in range(20)])
+        self.assertEqual(fold_into_summary(self.provider, self.user.pk, self.persona.pk, turns[7].pk), 8)
+        prompt = self.provider.complete.call_args.args[0][1]['content']
+        self.assertIn('Student: turn 00', prompt)
+        self.assertIn('Assistant: turn 07', prompt)
+        self.assertNotIn('turn 08', prompt)
+
+        summary = ConversationSummary.objects.get(user=self.user, ai_persona=self.persona)
+        self.assertEqual((summary.summarized_through_id, summary.summarized_message_count), (turns[7].pk, 8))
+        context = self.context()
+        self.assertTrue(context.summarized)
+        self.assertIn('Student likes pizza.', context.messages[1]['content'])
+        self.assertEqual(context.messages[2]['content'], turns[-context.history_messages].message)
+        self.assertIsNone(context.fold_until)
+
+    def test_concurrent_folds_do_not_overwrite_each_other(self):
+        turns = self.say(*[f'turn {i:02d} ' + 'x' * 32 for i in range(20)])
+
+        def complete(messages):
+            # Another worker folds the same turns while this fold waits for the provider
+            if self.provider.complete.call_count == 1:
+                fold_into_summary(self.provider, self.user.pk, self.persona.pk, turns[9].pk)
+            return f'summary {self.provider.complete.call_count}'
+
+        self.provider.complete.side_effect = complete
+        self.assertEqual(fold_into_summary(self.provider, self.user.pk, self.persona.pk, turns[7].pk), 0)
+        summary = ConversationSummary.objects.get(user=self.user, ai_persona=self.persona)
+        self.assertEqual((summary.summary, summary.summarized_through_id), ('summary 2', turns[9].pk))
+        self.assertEqual(summary.summarized_message_count, 10)
+
+    def test_provider_errors_fall_back_to_the_transcript(self):
+        turns = self.say('I like pizza', 'Great!', 'Fractions are hard', 'Let us practice')
+        self.provider.complete.side_effect = ProviderError('unavailable')
+        self.assertEqual(fold_into_summary(self.provider, self.user.pk, self.persona.pk, turns[-1].pk), 4)
+        summary = ConversationSummary.objects.get(user=self.user, ai_persona=self.persona)
+        self.assertEqual(
+            summary.summary,
+            'Student: I like pizza\nAssistant: Great!\nStudent: Fractions are hard\nAssistant: Let us practice'
+        )
+
+    def test_failed_background_folds_are_logged(self):
+        turns = self.say('I like pizza', 'Great!')
+        self.provider.complete.side_effect = RuntimeError('boom')
+        with mock.patch('assistants.context.connection.close'), self.assertLogs('assistants.context', 'ERROR') as logs:
+            _fold_in_background(self.provider, self.user.pk, self.persona.pk, turns[-1].pk)
+        self.assertIn(f'Could not fold conversation of user {self.user.pk}', logs.output[0])
+
+
+
+class ChatHistoryPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='student@example.com', password='pass', role='student')
+        other = User.objects.create_user(email='other@example.com', password='pass', role='student')
+        cls.persona = AI_Persona.objects.create(name='DANI', full_name='Dani', system_prompt='You are DANI.')
+        ChatMessage.objects.bulk_create(
+            [ChatMessage(user=cls.user, ai_persona=cls.persona, message=f'message {i}') for i in range(11)]
+            + [ChatMessage(user=other, ai_persona=cls.persona, message='not mine')]
+        )
+        # Several messages share a timestamp, so pages must be cut on (timestamp, id)
+        start = timezone.now() - timedelta(hours=1)
+        for i, message in enumerate(ChatMessage.objects.filter(user=cls.user).order_by('pk')):
+            message.timestamp = start + timedelta(seconds=i // 3)
+            message.save(update_fields=['timestamp'])
+        cls.messages = [f'message {i}' for i in range(11)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cursor_round_trip(self):
+        message = ChatMessage.objects.filter(user=self.user).first()
+        self.assertEqual(decode_cursor(encode_cursor(message)), (message.timestamp, message.pk))
+        with self.assertRaises(ValidationError):
+            decode_cursor('not-a-cursor')
+
+    def test_latest_page_first(self):
+        page = self.get('/api/chat/history/?persona=dani&limit=4')
+        self.assertEqual([row['message'] for row in page['results']], self.messages[-4:])
+        self.assertIsNone(page['next'])
+        self.assertIsNotNone(page['previous'])
+
+    def test_walk_back_and_forth_through_history(self):
+        pages = [self.get('/api/chat/history/?persona=dani&limit=4')]
+        while pages[-1]['previous']:
+            pages.append(self.get(pages[-1]['previous']))
+        older_first = [row['message'] for page in reversed(pages) for row in page['results']]
+        self.assertEqual(older_first, self.messages)
+        self.assertEqual(len(pages), 3)
+
+        forward = [pages[-1]]
+        while forward[-1]['next']:
+            forward.append(self.get(forward[-1]['next']))
+        self.assertEqual([row['message'] for page in forward for row in page['results']], self.messages)
+
+    def test_invalid_cursor(self):
+        for param in ['before', 'after']:
+            response = self.client.get(f'/api/chat/history/?persona=dani&{param}=garbage')
+            self.assertEqual(response.status_code, 400)
+
+    def test_links_survive_a_deleted_cursor_message(self):
+        first = self.get('/api/chat/history/?persona=dani&limit=4')
+        message = ChatMessage.objects.filter(user=self.user, message='message 7').get()
+        cursor = encode_cursor(message)
+        message.delete()
+        older = self.get(first['previous'])
+        self.assertEqual([row['message'] for row in older['results']], self.messages[3:7])
+        self.assertIsNotNone(older['next'])
+
+        ChatMessage.objects.filter(user=self.user, message__in=self.messages[:7]).delete()
+        page = self.get(f'/api/chat/history/?persona=dani&after={cursor}')
+        self.assertEqual([row['message'] for row in page['results']], self.messages[8:])
+        self.assertIsNone(page['previous'])
+
+    def test_cursor_seeks_the_index(self):
+        message = ChatMessage.objects.filter(user=self.user).order_by('pk')[5]
+        queryset = ChatMessage.objects.filter(user=self.user, ai_persona=self.persona)
+        plan = older_than(queryset, message.timestamp, message.pk).order_by('-timestamp', '-pk').explain()
+        self.assertRegex(plan, r'USING INDEX \S+ \(user_id=\? AND ai_persona_id=\? AND timestamp<\?\)')
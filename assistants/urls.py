@@ -1,9 +1,11 @@
 from django.urls import path
-from .views import ChatView
+from .views import ChatCacheStatsView, ChatHistoryView, ChatView
 
 app_name = 'assistants'
 
 urlpatterns = [
     path('chat/', ChatView.as_view(), name='chat'),
+    path('chat/history/', ChatHistoryView.as_view(), name='chat-history'),
+    path('chat/cache/stats/', ChatCacheStatsView.as_view(), name='chat-cache-stats'),
 ]
 
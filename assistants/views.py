@@ -1,14 +1,25 @@
+import contextlib
+import json
+
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework import generics, status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.shortcuts import get_object_or_404
-from django.conf import settings
-from openai import OpenAI
+from django.http import StreamingHttpResponse
+from .cache import response_cache
+from .context import build_context, schedule_fold
 from .models import AI_Persona, ChatMessage
+from .pagination import ChatHistoryPagination
+from .providers import ProviderError, ProviderUnavailable, get_provider
 from .serializers import ChatMessageSerializer
 
 
+def _sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
 class ChatView(APIView):
     """
     API view to handle chat messages with AI personas.
@@ -24,20 +35,22 @@ class ChatView(APIView):
         Expected payload:
         {
             "message": "User's message text",
-            "persona_name": "DANI" or "LUCAS"
+            "persona_name": "DANI" or "LUCAS",
+            "stream": false
         }
         
-        Returns the bot's response message.
+        Returns the bot's response message. With "stream": true the reply is
+        sent as server-sent events instead (see stream_reply).
         """
-        # Initialize OpenAI client
-        if not settings.OPENAI_API_KEY:
+        # Get this worker's chat provider (see ASSISTANT_PROVIDER)
+        provider = get_provider()
+        configuration_error = provider.configuration_error()
+        if configuration_error:
             return Response(
-                {'error': 'OpenAI API key is not configured'},
+                {'error': configuration_error},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        
         # Get message and persona_name from request
         serializer = ChatMessageSerializer(data=request.data)
         
@@ -61,25 +74,50 @@ class ChatView(APIView):
             is_from_bot=False
         )
         
-        # Call OpenAI API
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": ai_persona.system_prompt},
-                    {"role": "user", "content": message_text}
-                ]
+        # System prompt, conversation summary and the recent turns that fit the budget
+        context = build_context(request.user, ai_persona, user_message)
+        
+        # Repeated prompts that open a session can be answered from the
+        # response cache. They are answered without the earlier conversation,
+        # so the same reply suits every student; later replies depend on the
+        # session so far
+        cache_key = cached_reply = None
+        if response_cache.enabled() and context.opens_session:
+            context = context.without_history()
+            cache_key = response_cache.key(provider, ai_persona, message_text)
+            cached_reply = response_cache.get(ai_persona.name, cache_key)
+        
+        if serializer.validated_data['stream']:
+            response = StreamingHttpResponse(
+                self.stream_reply(provider, request.user, ai_persona, context, cache_key, cached_reply),
+                content_type='text/event-stream'
             )
+            response['Cache-Control'] = 'no-cache'
+            # Stop nginx-style proxies from buffering the stream
+            response['X-Accel-Buffering'] = 'no'
+            return response
+        
+        if cached_reply is not None:
+            bot_response_text = cached_reply
+        else:
+            # Call the provider (retries and circuit breaking happen inside)
+            try:
+                bot_response_text = provider.complete(context.messages)
+                
+            except ProviderUnavailable as e:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+            except ProviderError as e:
+                # Handle API errors gracefully
+                return Response(
+                    {'error': f'OpenAI API error: {str(e)}'},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
             
-            # Extract the response content
-            bot_response_text = response.choices[0].message.content
-            
-        except Exception as e:
-            # Handle API errors gracefully
-            return Response(
-                {'error': f'OpenAI API error: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+            if cache_key is not None:
+                response_cache.put(ai_persona.name, cache_key, bot_response_text)
         
         # Save the Bot's message to the database
         bot_message = ChatMessage.objects.create(
@@ -89,6 +127,10 @@ class ChatView(APIView):
             is_from_bot=True
         )
         
+        # Summarize turns that fell out of the context, off the request path
+        if context.fold_until is not None:
+            schedule_fold(provider, request.user.pk, ai_persona.pk, context.fold_until.pk)
+        
         # Return the Bot's message as the response
         return Response(
             {
@@ -99,3 +141,113 @@ class ChatView(APIView):
             },
             status=status.HTTP_201_CREATED
         )
+    
+    @staticmethod
+    async def stream_reply(provider, user, ai_persona, context, cache_key=None, cached_reply=None):
+        """
+        Stream a reply as server-sent events:
+        
+            event: start   {"persona": "DANI", "persona_full_name": "..."}
+            event: token   {"delta": "Let's "}          (repeated)
+            event: done    {"message": "...", "persona": ..., "timestamp": ...}
+        
+        or ``event: error {"error": "..."}`` if the provider fails.
+        The start event goes out before the upstream call, so the client gets
+        its first byte immediately. The bot's ChatMessage is saved once, when
+        the reply is complete. If the client disconnects, the server cancels
+        this generator and the provider closes the upstream stream, so
+        generation stops; the partial reply is not saved.
+        
+        A ``cached_reply`` is sent as a single token event without calling
+        the provider; otherwise a complete reply is cached under ``cache_key``.
+        """
+        yield _sse_event('start', {
+            'persona': ai_persona.name,
+            'persona_full_name': ai_persona.full_name,
+        })
+        
+        parts = []
+        if cached_reply is not None:
+            parts.append(cached_reply)
+            yield _sse_event('token', {'delta': cached_reply})
+        else:
+            try:
+                async with contextlib.aclosing(provider.stream(context.messages)) as deltas:
+                    async for delta in deltas:
+                        parts.append(delta)
+                        yield _sse_event('token', {'delta': delta})
+            except ProviderUnavailable as e:
+                yield _sse_event('error', {'error': str(e)})
+                return
+            except ProviderError as e:
+                yield _sse_event('error', {'error': f'OpenAI API error: {str(e)}'})
+                return
+        
+        bot_response_text = ''.join(parts)
+        if cached_reply is None and cache_key is not None:
+            response_cache.put(ai_persona.name, cache_key, bot_response_text)
+        bot_message = await ChatMessage.objects.acreate(
+            user=user,
+            ai_persona=ai_persona,
+            message=bot_response_text,
+            is_from_bot=True
+        )
+        if context.fold_until is not None:
+            schedule_fold(provider, user.pk, ai_persona.pk, context.fold_until.pk)
+        
+        yield _sse_event('done', {
+            'message': bot_response_text,
+            'persona': ai_persona.name,
+            'persona_full_name': ai_persona.full_name,
+            'timestamp': bot_message.timestamp.isoformat()
+        })
+
+
+class ChatCacheStatsView(APIView):
+    """
+    API view exposing the assistant response cache counters.
+    GET /api/chat/cache/stats/
+    Requires staff access.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        """
+        Return whether the cache is enabled and its counters per persona:
+        {
+            "enabled": true,
+            "personas": {
+                "LUCAS": {"entries": 120, "hits": 340, "misses": 180,
+                          "hit_rate": 0.6538, "evictions": 0, "expirations": 12}
+            }
+        }
+        
+        The cache lives in each worker process, so this reports the worker
+        that served the request.
+        """
+        return Response({
+            'enabled': response_cache.enabled(),
+            'personas': response_cache.stats(),
+        })
+
+
+class ChatHistoryView(generics.ListAPIView):
+    """
+    API view listing the authenticated user's past messages with a persona.
+    GET /api/chat/history/?persona=LUCAS[&before=<cursor>|&after=<cursor>][&limit=50]
+    
+    Without a cursor the latest messages are returned. Follow "previous"
+    to load older messages and "next" to load newer ones; pages are cut by
+    (timestamp, id) cursors, so every page costs the same to load
+    (see assistants.pagination).
+    """
+    serializer_class = ChatMessageSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ChatHistoryPagination
+    
+    def get_queryset(self):
+        persona_name = self.request.query_params.get('persona')
+        if not persona_name:
+            raise ValidationError({'persona': ['This query parameter is required.']})
+        ai_persona = get_object_or_404(AI_Persona, name=persona_name.upper())
+        return ChatMessage.objects.filter(user=self.request.user, ai_persona=ai_persona)
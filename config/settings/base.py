@@ -80,6 +80,12 @@ DATABASES = {
     }
 }
 
+# Point development at another database (e.g. a local PostgreSQL for
+# benchmarks) by setting DATABASE_URL
+if os.getenv('DATABASE_URL'):
+    import dj_database_url
+    DATABASES['default'] = dj_database_url.parse(os.environ['DATABASE_URL'])
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -142,4 +148,90 @@ SIMPLE_JWT = {
 }
 
 # OpenAI API Settings
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
\ No newline at end of file
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+
+# Assistant chat provider (assistants.providers): 'openai', or 'stub' for
+# deterministic local replies in load tests and CI (no network or API key)
+ASSISTANT_PROVIDER = os.getenv('ASSISTANT_PROVIDER', 'openai')
+ASSISTANT_MODEL = 'gpt-4o-mini'
+ASSISTANT_TIMEOUT_SECONDS = 30.0
+ASSISTANT_CONNECT_TIMEOUT_SECONDS = 5.0
+ASSISTANT_MAX_RETRIES = 2
+ASSISTANT_RETRY_BASE_DELAY_SECONDS = 0.5
+# Consecutive upstream failures before calls are rejected for the reset period
+ASSISTANT_CIRCUIT_FAILURE_THRESHOLD = 5
+ASSISTANT_CIRCUIT_RESET_SECONDS = 30.0
+ASSISTANT_STUB_LATENCY_SECONDS = float(os.getenv('ASSISTANT_STUB_LATENCY_SECONDS', '0'))
+ASSISTANT_STUB_TOKEN_DELAY_SECONDS = float(os.getenv('ASSISTANT_STUB_TOKEN_DELAY_SECONDS', '0'))
+
+# Opt-in per-process cache of replies to repeated prompts (assistants.cache)
+ASSISTANT_RESPONSE_CACHE_ENABLED = os.getenv('ASSISTANT_RESPONSE_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+ASSISTANT_RESPONSE_CACHE_TTL_SECONDS = 24 * 60 * 60
+# Entries kept per persona before the least recently used are evicted
+ASSISTANT_RESPONSE_CACHE_MAX_ENTRIES = 1000
+# A message opens a new session (and may be answered from the cache) when
+# the student sent the persona nothing in this many seconds
+ASSISTANT_SESSION_GAP_SECONDS = 30 * 60
+
+# Conversation context (assistants.context): estimated tokens for the system
+# prompt, summary, recent turns and the new message together
+ASSISTANT_CONTEXT_TOKEN_BUDGET = 3000
+# Most recent messages read per request
+ASSISTANT_CONTEXT_MAX_MESSAGES = 40
+# Out-of-context turns are folded into the rolling summary once this many
+# have accumulated, at most ASSISTANT_SUMMARY_FOLD_MAX_MESSAGES per fold
+ASSISTANT_SUMMARY_FOLD_MESSAGES = 6
+ASSISTANT_SUMMARY_FOLD_MAX_MESSAGES = 40
+ASSISTANT_SUMMARY_MAX_TOKENS = 400
+
+# Messages per page of GET /api/chat/history/ (clients may ask for up to 200)
+ASSISTANT_HISTORY_PAGE_SIZE = 50
+
+# Adaptive engine settings
+# How often (seconds) a worker re-checks the rule set version outside of requests
+ADAPTIVE_RULES_VERSION_CHECK_SECONDS = 5.0
+
+# Rolling signal aggregates (adaptive_engine.models.UserSignalState)
+ADAPTIVE_IDLE_RATIO_EWMA_ALPHA = 0.3
+ADAPTIVE_MOOD_MEAN_ALPHA = 0.2
+ADAPTIVE_OVERLOAD_HALF_LIFE_SECONDS = 600
+
+# Engagement detectors switch from fixed thresholds to z-scores against the
+# user's own running baseline once it has this many samples
+ADAPTIVE_BASELINE_MIN_SAMPLES = 20
+ADAPTIVE_BASELINE_ZSCORE_THRESHOLD = 2.0
+
+# Raw EngagementMetric/SensoryLog rows older than this are purged by compact_signals
+# once they are folded into rollups (0 keeps raw rows forever)
+ADAPTIVE_RAW_SIGNAL_RETENTION_DAYS = 90
+
+# compact_signals only folds raw rows at least this old, so rows of ingestion
+# transactions still in flight (which may commit below visible ids) are not skipped
+ADAPTIVE_ROLLUP_SETTLE_SECONDS = 300
+
+# Rule firings (adaptive_engine.models.TriggerEvent) are buffered in-process
+# and written in one bulk insert once this many are pending or this old
+ADAPTIVE_TRIGGER_FLUSH_SIZE = 100
+ADAPTIVE_TRIGGER_FLUSH_SECONDS = 5.0
+
+# When enabled, rule evaluation is queued as RuleEvaluationJob rows after the
+# ingesting transaction commits and run by `python manage.py process_rule_jobs`
+ADAPTIVE_ENGINE_QUEUE_EVALUATION = os.getenv('ADAPTIVE_ENGINE_QUEUE_EVALUATION', 'false').lower() in ('1', 'true', 'yes')
+
+# Per-rule evaluation counters are aggregated in-process and added to
+# adaptive_engine.models.RuleStats at most this often
+ADAPTIVE_RULE_METRICS_FLUSH_SECONDS = 30.0
+
+# Server-sent adaptation stream (GET /api/adaptive/adaptations/stream/, ASGI only):
+# how often each process polls for changes made by other processes, how often
+# an idle stream sends a keepalive comment, and how many streams one user may
+# hold open per process
+ADAPTIVE_STREAM_POLL_SECONDS = 5.0
+ADAPTIVE_STREAM_HEARTBEAT_SECONDS = 15.0
+ADAPTIVE_STREAM_MAX_CONNECTIONS_PER_USER = 5
+
+# Adaptation streams are opened with a signed ticket rather than the access
+# token: how long a ticket can be used to open a stream, and how long a
+# stream stays open before the client has to fetch a new ticket
+ADAPTIVE_STREAM_TICKET_SECONDS = 30
+ADAPTIVE_STREAM_MAX_SECONDS = 1800
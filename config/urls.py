@@ -34,6 +34,9 @@ urlpatterns = [
     
     # Assistant/chat endpoints
     path('api/', include('assistants.urls')),
+    
+    # Adaptive engine endpoints (signal ingestion, active adaptations)
+    path('api/adaptive/', include('adaptive_engine.urls')),
 ]
 
 # Serve static files
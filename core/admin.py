@@ -1,6 +1,7 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, NeuroProfile, Course, Progress
+from .models import User, NeuroProfile, Course, Progress, PROFILE_TAGS
 
 
 @admin.register(User)
@@ -29,13 +30,50 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class NeuroProfileForm(forms.ModelForm):
+    """
+    Edits the profile_tags bitmask as a list of tag checkboxes.
+    """
+    tags = forms.MultipleChoiceField(
+        choices=[(tag, tag) for tag in PROFILE_TAGS],
+        widget=forms.CheckboxSelectMultiple,
+        required=False
+    )
+    
+    class Meta:
+        model = NeuroProfile
+        exclude = ['profile_tags']
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initial['tags'] = self.instance.tags
+    
+    def save(self, commit=True):
+        self.instance.tags = self.cleaned_data['tags']
+        return super().save(commit)
+
+
+class ProfileTagFilter(admin.SimpleListFilter):
+    title = 'profile tag'
+    parameter_name = 'tag'
+    
+    def lookups(self, request, model_admin):
+        return [(tag, tag) for tag in PROFILE_TAGS]
+    
+    def queryset(self, request, queryset):
+        if self.value() in PROFILE_TAGS:
+            return queryset.with_tag(self.value())
+        return queryset
+
+
 @admin.register(NeuroProfile)
 class NeuroProfileAdmin(admin.ModelAdmin):
     """
     Admin interface for NeuroProfile model.
     """
-    list_display = ['user', 'learning_style', 'created_at', 'updated_at']
-    list_filter = ['learning_style', 'created_at']
+    form = NeuroProfileForm
+    list_display = ['user', 'learning_style', 'profile_tag_list', 'created_at', 'updated_at']
+    list_filter = [ProfileTagFilter, 'learning_style', 'created_at']
     search_fields = ['user__email', 'learning_style']
     readonly_fields = ['created_at', 'updated_at']
     
@@ -44,13 +82,17 @@ class NeuroProfileAdmin(admin.ModelAdmin):
             'fields': ('user',)
         }),
         ('Learning Preferences', {
-            'fields': ('sensory_preferences', 'learning_style', 'ef_needs')
+            'fields': ('sensory_preferences', 'learning_style', 'ef_needs', 'tags')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
+    
+    @admin.display(description='Profile tags')
+    def profile_tag_list(self, obj):
+        return ', '.join(obj.tags)
 
 
 @admin.register(Course)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_user_first_name_user_last_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='neuroprofile',
+            name='profile_tags',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, help_text='Bitmask of learner profile tags (see PROFILE_TAGS)'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:43
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_neuroprofile_profile_tags'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='neuroprofile',
+            name='profile_tags',
+            field=models.PositiveBigIntegerField(default=0, help_text='Bitmask of learner profile tags (see PROFILE_TAGS)'),
+        ),
+        migrations.AddIndex(
+            model_name='neuroprofile',
+            index=models.Index(core.models.ProfileTagBit(1), name='neuroprofile_adhd_tag'),
+        ),
+        migrations.AddIndex(
+            model_name='neuroprofile',
+            index=models.Index(core.models.ProfileTagBit(2), name='neuroprofile_autistic_tag'),
+        ),
+        migrations.AddIndex(
+            model_name='neuroprofile',
+            index=models.Index(core.models.ProfileTagBit(4), name='neuroprofile_dyscalculia_tag'),
+        ),
+        migrations.AddIndex(
+            model_name='neuroprofile',
+            index=models.Index(core.models.ProfileTagBit(8), name='neuroprofile_dyslexic_tag'),
+        ),
+        migrations.AddIndex(
+            model_name='neuroprofile',
+            index=models.Index(core.models.ProfileTagBit(16), name='neuroprofile_dyspraxia_tag'),
+        ),
+    ]
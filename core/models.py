@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F, Func
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.conf import settings
 from datetime import timedelta
@@ -105,6 +106,59 @@ class User(AbstractBaseUser, PermissionsMixin):
         return f"{self.email} ({self.get_role_display()})"
 
 
+# Learner profile tags, stored as bits of NeuroProfile.profile_tags.
+# A tag's position is its bit, so new tags must only ever be appended.
+PROFILE_TAGS = (
+    'adhd_profile',
+    'autistic_profile',
+    'dyscalculia_profile',
+    'dyslexic_profile',
+    'dyspraxia_profile',
+)
+
+PROFILE_TAG_BITS = {tag: 1 << position for position, tag in enumerate(PROFILE_TAGS)}
+
+
+def profile_tag_mask(tags):
+    """Return the bitmask for an iterable of tag names; unknown tags raise ValueError."""
+    mask = 0
+    for tag in tags:
+        if tag not in PROFILE_TAG_BITS:
+            raise ValueError(f"Unknown profile tag: {tag}")
+        mask |= PROFILE_TAG_BITS[tag]
+    return mask
+
+
+def profile_tag_names(mask):
+    """Return the tag names set in a bitmask, in PROFILE_TAGS order."""
+    return [tag for tag, bit in PROFILE_TAG_BITS.items() if mask & bit]
+
+
+class ProfileTagBit(Func):
+    """
+    ``profile_tags & <bit>``, with the bit written into the SQL rather than
+    bound, so the expression is the same as in the tag's index and the
+    database can seek it.
+    """
+    template = '(%(expressions)s & %(bit)d)'
+    output_field = models.PositiveBigIntegerField()
+    
+    def __init__(self, bit, **extra):
+        super().__init__(F('profile_tags'), bit=bit, **extra)
+
+
+class NeuroProfileQuerySet(models.QuerySet):
+    
+    def with_tag(self, tag):
+        """
+        Profiles carrying a tag: a bitwise test of the tag's bit on
+        profile_tags, served by the tag's expression index (see
+        NeuroProfile.Meta), one bound parameter however many tags exist.
+        """
+        bit = PROFILE_TAG_BITS[tag]
+        return self.alias(tag_bit=ProfileTagBit(bit)).filter(tag_bit=bit)
+
+
 class NeuroProfile(models.Model):
     """
     NeuroProfile model stores neurodivergent learning preferences and needs.
@@ -134,11 +188,37 @@ class NeuroProfile(models.Model):
         help_text='Executive function needs and accommodations'
     )
     
+    profile_tags = models.PositiveBigIntegerField(
+        default=0,
+        help_text='Bitmask of learner profile tags (see PROFILE_TAGS)'
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = NeuroProfileQuerySet.as_manager()
+    
+    class Meta:
+        # One index per tag on the exact expression with_tag filters on
+        indexes = [
+            models.Index(ProfileTagBit(bit), name=f"neuroprofile_{tag.removesuffix('_profile')}_tag")
+            for tag, bit in PROFILE_TAG_BITS.items()
+        ]
+    
     def __str__(self):
         return f"NeuroProfile for {self.user.email}"
+    
+    @property
+    def tags(self):
+        """Names of the learner profile tags set on this profile."""
+        return profile_tag_names(self.profile_tags)
+    
+    @tags.setter
+    def tags(self, tags):
+        self.profile_tags = profile_tag_mask(tags)
+    
+    def has_tag(self, tag):
+        return bool(self.profile_tags & PROFILE_TAG_BITS[tag])
 
 
 class Course(models.Model):
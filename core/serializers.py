@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
-from .models import User, NeuroProfile, Course, Progress, Message, PomodoroTimerModel, TaskChunkingModel, TaskStepModel
+from .models import User, NeuroProfile, Course, Progress, Message, PomodoroTimerModel, TaskChunkingModel, TaskStepModel, PROFILE_TAGS
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -56,11 +56,13 @@ class UserSerializer(serializers.ModelSerializer):
 class NeuroProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for NeuroProfile model.
-    Includes sensory_preferences, learning_style, and ef_needs.
+    Includes sensory_preferences, learning_style, ef_needs, and profile tag names.
     """
+    tags = serializers.MultipleChoiceField(choices=PROFILE_TAGS, required=False)
+    
     class Meta:
         model = NeuroProfile
-        fields = ['sensory_preferences', 'learning_style', 'ef_needs']
+        fields = ['sensory_preferences', 'learning_style', 'ef_needs', 'tags']
 
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -1,3 +1,66 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, skipUnlessDBFeature
 
-# Create your tests here.
+from .models import PROFILE_TAGS, NeuroProfile, User, profile_tag_mask, profile_tag_names
+
+
+class ProfileTagTests(SimpleTestCase):
+
+    def test_mask_round_trip(self):
+        self.assertEqual(profile_tag_mask([]), 0)
+        mask = profile_tag_mask(['dyslexic_profile', 'adhd_profile'])
+        self.assertEqual(profile_tag_names(mask), ['adhd_profile', 'dyslexic_profile'])
+        self.assertEqual(profile_tag_names(profile_tag_mask(PROFILE_TAGS)), list(PROFILE_TAGS))
+
+    def test_unknown_tag(self):
+        with self.assertRaises(ValueError):
+            profile_tag_mask(['adhd_profile', 'unknown_profile'])
+
+
+class NeuroProfileTagFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profiles = {}
+        for name, tags in [
+            ('none', []),
+            ('adhd', ['adhd_profile']),
+            ('autistic', ['autistic_profile']),
+            ('both', ['adhd_profile', 'autistic_profile']),
+            ('all', PROFILE_TAGS),
+        ]:
+            user = User.objects.create_user(email=f'{name}@example.com', password='pass', role='student')
+            profile = NeuroProfile(user=user)
+            profile.tags = tags
+            profile.save()
+            cls.profiles[name] = profile
+
+    def names(self, queryset):
+        return sorted(profile.user.email.split('@')[0] for profile in queryset)
+
+    def test_with_tag(self):
+        self.assertEqual(self.names(NeuroProfile.objects.with_tag('adhd_profile')), ['adhd', 'all', 'both'])
+        self.assertEqual(self.names(NeuroProfile.objects.with_tag('autistic_profile')), ['all', 'autistic', 'both'])
+        self.assertEqual(self.names(NeuroProfile.objects.with_tag(PROFILE_TAGS[-1])), ['all'])
+
+    def test_with_tag_chains(self):
+        both = NeuroProfile.objects.with_tag('adhd_profile').with_tag('autistic_profile')
+        self.assertEqual(self.names(both), ['all', 'both'])
+
+    def test_with_tag_binds_one_parameter(self):
+        sql, params = NeuroProfile.objects.with_tag(PROFILE_TAGS[-1]).query.sql_with_params()
+        self.assertEqual(params, (1 << (len(PROFILE_TAGS) - 1),))
+
+    @skipUnlessDBFeature('supports_expression_indexes')
+    def test_with_tag_uses_the_tag_index(self):
+        for tag in PROFILE_TAGS:
+            plan = NeuroProfile.objects.with_tag(tag).explain()
+            self.assertIn(f"neuroprofile_{tag.removesuffix('_profile')}_tag", plan)
+        plan = NeuroProfile.objects.with_tag('adhd_profile').with_tag('dyslexic_profile').explain()
+        self.assertRegex(plan, r'neuroprofile_(adhd|dyslexic)_tag')
+
+    def test_tags_property(self):
+        profile = self.profiles['both']
+        profile.refresh_from_db()
+        self.assertEqual(profile.tags, ['adhd_profile', 'autistic_profile'])
+        self.assertTrue(profile.has_tag('adhd_profile'))
+        self.assertFalse(profile.has_tag('dyslexic_profile'))